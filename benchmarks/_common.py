@@ -0,0 +1,126 @@
+"""Shared helpers for the benchmark scripts.
+
+Benchmarks are plain scripts (``python benchmarks/bench_xxx.py``); they put
+the repository root on ``sys.path`` so ``scripts.context_manager`` imports
+the same way it does in the test suite.
+"""
+
+from __future__ import annotations
+
+import statistics
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+
+# 合成文件的格式：融合版 / 旧版 frontmatter / 没有 frontmatter
+FORMATS = ("v2", "v1", "mixed")
+
+
+def make_context(index: int, sessions: int = 5, todos: int = 5, fmt: str = "v2") -> str:
+    """生成一个 context.md（fmt 为 v2 融合版、v1 旧版 frontmatter 或 mixed 无 frontmatter）"""
+    status = ("active", "paused", "completed")[index % 3]
+    if fmt == "v1":
+        lines = [
+            "---",
+            f"project: project-{index}",
+            "project_type: 后端服务",
+            f"session_count: {sessions}",
+            "branch: main",
+            "stack:",
+            "  - Python",
+            "---",
+            "",
+            f"# project-{index}",
+            "",
+            "## 📋 待办事项",
+        ]
+    elif fmt == "mixed":
+        lines = [
+            f"# project-{index}",
+            "",
+            "## 当前状态",
+            f"- 焦点: 项目 {index}",
+            "",
+            "## 📋 待办事项",
+        ]
+    else:
+        lines = _v2_header(index, sessions, status)
+    lines += [f"- [ ] 任务 {index}-{t}" for t in range(todos)]
+    lines += ["", "## 📝 会话记录", ""]
+    for n in range(sessions, 0, -1):
+        lines += [
+            f"### 2026-01-{n % 28 + 1:02d} (会话 #{n})",
+            f"**主题**: 第 {n} 次会话",
+            "**完成**:",
+            "- ✅ 实现了一些功能，修复了一些问题，并记录了后续计划",
+            "",
+        ]
+    lines += ["## 📝 笔记/决策", "<!-- 重要决策、问题记录 -->", ""]
+    return "\n".join(lines)
+
+
+def _v2_header(index: int, sessions: int, status: str) -> list[str]:
+    return [
+        "---",
+        "# ============ 基本信息 ============",
+        f"project: project-{index}",
+        "created: 2025-01-01",
+        f"last_session: 2026-{index % 12 + 1:02d}-{index % 28 + 1:02d}",
+        f"session_count: {sessions}",
+        "",
+        "# ============ 状态分类 ============",
+        f"status: {status}                 # active | paused | completed",
+        "category: 探索性               # 探索性 | 产品 | 临时 | 学习",
+        "",
+        "# ============ 工作追踪 ============",
+        f'current_focus: "项目 {index} 的当前焦点"',
+        'next_steps: "继续推进"',
+        "branch: main",
+        "",
+        f'brief: "第 {index} 个合成项目"',
+        "stack:",
+        "  - Python",
+        "  - SQLite",
+        "---",
+        "",
+        "## 📋 待办事项",
+        "",
+        "### P0 [本周]",
+    ]
+
+
+def make_workspace(
+    root: Path,
+    projects: int,
+    sessions: int = 5,
+    todos: int = 5,
+    formats: tuple[str, ...] = ("v2",),
+) -> Path:
+    """在 root 下创建名为 workspace 的合成工作区（按顺序轮流使用 formats 中的格式）"""
+    workspace = root / "workspace"
+    for i in range(projects):
+        claude_dir = workspace / f"project-{i:04d}" / ".claude"
+        claude_dir.mkdir(parents=True)
+        content = make_context(i, sessions=sessions, todos=todos, fmt=formats[i % len(formats)])
+        (claude_dir / "context.md").write_text(content, encoding="utf-8")
+    return workspace
+
+
+def measure(func, repeat: int = 5, setup=None, reduce=statistics.median) -> float:
+    """返回多次运行的中位耗时（毫秒）；setup 在每次运行前调用，不计入耗时
+
+    reduce 可换成 min（取最快一次，受其他进程干扰最小，适合与基线比较）。
+    """
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return reduce(samples)
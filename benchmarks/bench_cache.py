@@ -0,0 +1,62 @@
+"""Benchmark: ``ctx status`` with and without the ``.claude/.context.cache`` sidecar.
+
+The context.md is grown by session history, the part of the file that keeps
+getting longer over a project's life. "cached" is a warm sidecar hit,
+"uncached" runs with ``CTX_NO_CACHE=1``.
+
+Usage: python benchmarks/bench_cache.py [--sessions 10 1000 20000] [--repeat 20]
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from _common import make_context, measure
+
+from scripts import context_manager as cm
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[10, 1000, 20000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    def status():
+        with contextlib.redirect_stdout(io.StringIO()):
+            cm.show_status()
+
+    print(f"{'sessions':>9} {'bytes':>11} {'uncached ms':>12} {'cached ms':>10} {'speedup':>8}")
+    for sessions in args.sessions:
+        with tempfile.TemporaryDirectory() as tmp:
+            claude_dir = Path(tmp) / ".claude"
+            claude_dir.mkdir()
+            context_file = claude_dir / "context.md"
+            context_file.write_text(make_context(0, sessions=sessions), encoding="utf-8")
+            # 让 mtime 落在不可信窗口之外，模拟日常读取
+            old_ns = time.time_ns() - 3600 * 10**9
+            os.utime(context_file, ns=(old_ns, old_ns))
+            os.chdir(tmp)
+
+            os.environ["CTX_NO_CACHE"] = "1"
+            uncached_ms = measure(status, args.repeat)
+            os.environ["CTX_NO_CACHE"] = ""
+            status()
+            cached_ms = measure(status, args.repeat)
+            size = context_file.stat().st_size
+            os.chdir("/")
+
+        print(
+            f"{sessions:>9} {size:>11,} {uncached_ms:>12.3f} {cached_ms:>10.3f} "
+            f"{uncached_ms / cached_ms:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark: ``ctx status`` / ``ctx ls`` through ``ctxd`` vs direct mode.
+
+Starts ``ctx daemon run`` on a synthetic workspace and reports
+
+* the socket round trip as seen by an in-process client (daemon cost only),
+* end-to-end CLI invocations with the daemon warm and with ``CTX_NO_DAEMON=1``,
+* the bare interpreter start-up, which is the floor for any Python client.
+
+Only the warm ``status`` round trip is held to ``--target-ms`` (exit status 1
+when it is slower): that is the part ctxd controls. End-to-end CLI numbers are
+reported together with their overhead above the interpreter floor; they are
+bounded by interpreter start-up and stdlib imports, not by the daemon.
+
+CLI numbers assume cached bytecode, so run it without PYTHONDONTWRITEBYTECODE.
+
+Usage: python benchmarks/bench_daemon.py [--projects 400] [--repeat 20] [--target-ms 10]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from _common import REPO_ROOT, make_workspace, measure
+
+from scripts import context_manager as cm
+
+CLI = [sys.executable, str(REPO_ROOT / "ctx.py")]
+
+
+def run_cli(*args, **env):
+    subprocess.run(
+        [*CLI, *args], check=True, stdout=subprocess.DEVNULL, env={**os.environ, **env}
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--projects", type=int, default=400)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--target-ms", type=float, default=10.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workspace = make_workspace(Path(tmp), args.projects)
+        project = workspace / "project-0000"
+        os.chdir(project)
+        daemon = subprocess.Popen([*CLI, "daemon", "run"])
+        sock_path = cm.get_daemon_socket(workspace)
+        try:
+            deadline = time.monotonic() + 10
+            while cm._daemon_call(sock_path, {"cmd": "ping"}) is None:
+                if time.monotonic() > deadline:
+                    raise SystemExit("ctxd 未能启动")
+                time.sleep(0.02)
+            cm.daemon_request("ls")
+
+            floor = measure(
+                lambda: subprocess.run([sys.executable, "-I", "-S", "-c", "pass"], check=True),
+                args.repeat,
+            )
+            round_trip = measure(lambda: cm.daemon_request("status"), args.repeat)
+            ls_round_trip = measure(lambda: cm.daemon_request("ls"), args.repeat)
+            print(f"projects={args.projects} target={args.target_ms:.0f} ms (status round trip)")
+            print(f"{'interpreter floor (-I -S)':<26} {floor:9.2f} ms")
+            print(f"{'status round trip':<26} {round_trip:9.2f} ms")
+            print(f"{'ls round trip':<26} {ls_round_trip:9.2f} ms")
+
+            rows = [
+                ("ctx status (ctxd)", lambda: run_cli("status")),
+                ("ctx status (direct)", lambda: run_cli("status", CTX_NO_DAEMON="1")),
+                ("ctx ls (ctxd)", lambda: run_cli("ls")),
+                ("ctx ls (direct)", lambda: run_cli("ls", CTX_NO_DAEMON="1")),
+            ]
+            for label, func in rows:
+                elapsed = measure(func, args.repeat)
+                print(f"{label:<26} {elapsed:9.2f} ms  (+{elapsed - floor:.2f} ms over floor)")
+        finally:
+            cm._daemon_call(sock_path, {"cmd": "shutdown"})
+            daemon.wait(5)
+
+    if round_trip > args.target_ms:
+        print(f"\n❌ status 往返 {round_trip:.2f} ms 超过目标 {args.target_ms:.0f} ms")
+        sys.exit(1)
+    print(f"\n✅ status 往返在 {args.target_ms:.0f} ms 以内")
+
+
+if __name__ == "__main__":
+    main()
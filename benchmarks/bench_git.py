@@ -0,0 +1,73 @@
+"""Benchmark: cost of live git branch detection in ``ctx ls``.
+
+Every synthetic project gets a minimal ``.git`` directory (HEAD, a loose
+branch ref, packed-refs and a reflog) written by hand, so no ``git`` binary
+is needed. Reports ``cmd_ls`` without git detection (``CTX_NO_GIT=1``),
+with a cold ``workspace/.ctx/git.json`` cache and with a warm one.
+
+Usage: python benchmarks/bench_git.py [--projects 400] [--repeat 10]
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+from pathlib import Path
+
+from _common import make_workspace, measure
+
+from scripts import context_manager as cm
+
+
+def make_git_dir(project: Path, index: int):
+    """写入一个最小的 .git：HEAD 指向分支，分支引用为松散文件，reflog 记录一次提交"""
+    git_dir = project / ".git"
+    sha = f"{index:040x}"
+    (git_dir / "refs" / "heads").mkdir(parents=True)
+    (git_dir / "logs" / "refs" / "heads").mkdir(parents=True)
+    (git_dir / "HEAD").write_text("ref: refs/heads/main\n")
+    (git_dir / "refs" / "heads" / "main").write_text(f"{sha}\n")
+    (git_dir / "packed-refs").write_text(f"# pack-refs with: peeled\n{sha} refs/tags/v1\n")
+    entry = f"{'0' * 40} {sha} Bench <bench@example.com> {1_700_000_000 + index} +0000\tcommit\n"
+    (git_dir / "logs" / "refs" / "heads" / "main").write_text(entry)
+    (git_dir / "logs" / "HEAD").write_text(entry)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--projects", type=int, default=400)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    os.environ["CTX_NO_DAEMON"] = "1"
+    with tempfile.TemporaryDirectory() as tmp:
+        workspace = make_workspace(Path(tmp), args.projects, sessions=args.sessions)
+        for index, project in enumerate(sorted(workspace.iterdir())):
+            make_git_dir(project, index)
+        os.chdir(workspace)
+        cache_file = cm.get_git_cache_file(workspace)
+
+        def ls():
+            with contextlib.redirect_stdout(io.StringIO()):
+                cm.cmd_ls(argparse.Namespace())
+
+        ls()  # 预热工作区索引
+        os.environ["CTX_NO_GIT"] = "1"
+        base_ms = measure(ls, args.repeat)
+        del os.environ["CTX_NO_GIT"]
+        cold_ms = measure(ls, args.repeat, setup=lambda: cache_file.unlink(missing_ok=True))
+        ls()
+        warm_ms = measure(ls, args.repeat)
+
+        print(f"projects={args.projects} (all git repositories)")
+        print(f"ctx ls, CTX_NO_GIT=1:   {base_ms:8.2f} ms")
+        print(f"ctx ls, cold git cache: {cold_ms:8.2f} ms  ({cold_ms - base_ms:+.2f})")
+        print(f"ctx ls, warm git cache: {warm_ms:8.2f} ms  ({warm_ms - base_ms:+.2f})")
+
+
+if __name__ == "__main__":
+    main()
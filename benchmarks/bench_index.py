@@ -0,0 +1,45 @@
+"""Benchmark: cold vs warm workspace index for ``list_projects``.
+
+Usage: python benchmarks/bench_index.py [--projects 400] [--sessions 50]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+from pathlib import Path
+
+from _common import make_workspace, measure
+
+from scripts import context_manager as cm
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--projects", type=int, default=400)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workspace = make_workspace(Path(tmp), args.projects, sessions=args.sessions)
+        os.chdir(workspace)
+        index_file = cm.get_index_file(workspace)
+
+        def cold():
+            index_file.unlink(missing_ok=True)
+            cm.list_projects()
+
+        cold_ms = measure(cold, args.repeat)
+        cm.list_projects()
+        warm_ms = measure(cm.list_projects, args.repeat)
+
+        print(f"projects={args.projects} sessions/file={args.sessions}")
+        print(f"cold (no index):  {cold_ms:8.2f} ms")
+        print(f"warm (index hit): {warm_ms:8.2f} ms")
+        print(f"speedup:          {cold_ms / warm_ms:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Benchmark: serial vs parallel ``list_projects`` under simulated slow storage.
+
+Each ``stat`` and ``read_bytes`` on a context.md sleeps for ``--latency`` ms,
+which approximates a networked home directory. Sleeping releases the GIL the
+same way blocking file I/O does.
+
+Usage: python benchmarks/bench_parallel.py [--projects 400] [--latency 2] [--jobs 1 4 16]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from _common import make_workspace, measure
+
+from scripts import context_manager as cm
+
+
+def simulate_latency(seconds: float):
+    """给 context.md 的 stat/read_bytes 注入固定延迟"""
+    real_stat = Path.stat
+    real_read_bytes = Path.read_bytes
+
+    def slow_stat(self, *args, **kwargs):
+        if self.name == "context.md":
+            time.sleep(seconds)
+        return real_stat(self, *args, **kwargs)
+
+    def slow_read_bytes(self):
+        time.sleep(seconds)
+        return real_read_bytes(self)
+
+    Path.stat = slow_stat
+    Path.read_bytes = slow_read_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--projects", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=2.0, help="每次 I/O 的延迟 (ms)")
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workspace = make_workspace(Path(tmp), args.projects)
+        os.chdir(workspace)
+        simulate_latency(args.latency / 1000)
+
+        print(f"projects={args.projects} latency={args.latency} ms/op")
+        for mode, no_index in (("cold (read+parse)", "1"), ("warm (stat only)", "")):
+            os.environ["CTX_NO_INDEX"] = no_index
+            cm.list_projects()
+            baseline = None
+            for jobs in args.jobs:
+                elapsed = measure(lambda j=jobs: cm.list_projects(jobs=j), args.repeat)
+                baseline = baseline or elapsed
+                print(f"{mode:<18} jobs={jobs:<3} {elapsed:9.2f} ms  {baseline / elapsed:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
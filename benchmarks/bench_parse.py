@@ -0,0 +1,53 @@
+"""Micro-benchmark: table-driven ``parse_context`` vs the original implementation.
+
+Inputs of roughly 1 KB, 100 KB and 10 MB are built by growing the session
+history of a synthetic context.md, which is how real files get large.
+
+Usage: python benchmarks/bench_parse.py [--repeat 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+
+from _common import make_context, measure
+
+from scripts.context_manager import parse_context
+from tests.legacy_parse import legacy_parse_context
+
+SIZES = (("1 KB", 1_000), ("100 KB", 100_000), ("10 MB", 10_000_000))
+
+
+def build_content(target_bytes: int) -> str:
+    """按目标大小生成 context.md（通过增加会话记录数量）"""
+    sessions = 1
+    content = make_context(0, sessions=sessions)
+    while len(content.encode("utf-8")) < target_bytes:
+        per_session = max(1, len(content.encode("utf-8")) // sessions)
+        sessions = max(sessions + 1, target_bytes // per_session)
+        content = make_context(0, sessions=sessions)
+    return content
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'input':<8} {'bytes':>11} {'legacy ms':>11} {'table ms':>10} {'MB/s':>8} {'speedup':>8}")
+    for label, target in SIZES:
+        content = build_content(target)
+        assert parse_context(content) == legacy_parse_context(content)
+        repeat = args.repeat if target < 1_000_000 else max(1, args.repeat // 2)
+        legacy_ms = measure(lambda c=content: legacy_parse_context(c), repeat)
+        table_ms = measure(lambda c=content: parse_context(c), repeat)
+        size = len(content.encode("utf-8"))
+        throughput = size / 1e6 / (table_ms / 1000)
+        print(
+            f"{label:<8} {size:>11,} {legacy_ms:>11.3f} {table_ms:>10.3f} "
+            f"{throughput:>8.1f} {legacy_ms / table_ms:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
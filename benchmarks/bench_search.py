@@ -0,0 +1,77 @@
+"""Benchmark: ``ctx search`` on a synthetic workspace.
+
+Reports the one-off cost of building ``workspace/.ctx/search.db`` and the
+per-query latency once the index is warm: the full ``cmd_search`` path
+(open + BM25 query + stat of the hit files), the query alone, and the
+``--refresh`` path that rescans the workspace first. Exits with status 1 when
+a full-path median exceeds ``--target-ms``.
+
+Usage: python benchmarks/bench_search.py [--projects 1000] [--sessions 20] [--repeat 10]
+       [--target-ms 50]
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from _common import make_workspace, measure
+
+from scripts import context_manager as cm
+
+QUERIES = ("会话", "项目 42 的当前焦点", "修复问题 计划", "python", "焦")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--projects", type=int, default=1000)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--target-ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workspace = make_workspace(Path(tmp), args.projects, sessions=args.sessions)
+        os.chdir(workspace)
+
+        start = time.perf_counter()
+        conn = cm.open_search_index(workspace)
+        cm.refresh_search_index(conn, workspace)
+        conn.close()
+        build_s = time.perf_counter() - start
+        db_size = cm.get_search_db(workspace).stat().st_size
+        print(f"projects={args.projects} sessions={args.sessions}")
+        print(f"build: {build_s:.2f} s, index {db_size / 1e6:.1f} MB\n")
+
+        def command(query, refresh=False):
+            ns = argparse.Namespace(terms=[query], limit=10, rebuild=False, refresh=refresh)
+            with contextlib.redirect_stdout(io.StringIO()):
+                cm.cmd_search(ns)
+
+        conn = cm.open_search_index(workspace)
+        print(f"{'query':<20} {'full ms':>9} {'query ms':>9} {'refresh ms':>11} {'hits':>5}")
+        slow = []
+        for query in QUERIES:
+            full_ms = measure(lambda q=query: command(q), args.repeat)
+            query_ms = measure(lambda q=query: cm.search_index(conn, q), args.repeat)
+            refresh_ms = measure(lambda q=query: command(q, refresh=True), args.repeat)
+            hits = len(cm.search_index(conn, query))
+            print(f"{query:<20} {full_ms:>9.2f} {query_ms:>9.2f} {refresh_ms:>11.2f} {hits:>5}")
+            if full_ms > args.target_ms:
+                slow.append(query)
+        conn.close()
+
+    if slow:
+        print(f"\n❌ 超过目标 {args.target_ms:.0f} ms: {', '.join(slow)}")
+        sys.exit(1)
+    print(f"\n✅ 全部查询在 {args.target_ms:.0f} ms 以内")
+
+
+if __name__ == "__main__":
+    main()
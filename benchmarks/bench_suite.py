@@ -0,0 +1,189 @@
+"""Benchmark suite over synthetic workspaces, with a committed baseline.
+
+Each scale builds a workspace of N projects (M sessions and K todos per file,
+formats rotating v2 / v1 / mixed) in a temp dir and times:
+
+- ``parse_context``        one context.md of M sessions, already in memory
+- ``list_projects``        warm workspace index
+- ``list_projects_cold``   ``CTX_NO_INDEX=1``, every file read and parsed
+- ``cmd_ls``               ``ctx ls`` with output discarded
+- ``cmd_update``           ``ctx update current_focus=...`` on one project
+- ``cmd_migrate``          ``ctx migrate`` of one v1 file (restored between runs)
+- ``cli_cold_start``       ``python ctx.py status`` in a fresh interpreter
+
+Results (best of ``--repeat`` runs, in ms) are written as JSON. With ``--baseline`` every metric is
+compared against the baseline file, and the run exits 1 when one is slower by
+more than ``--threshold`` percent (and by at least ``--min-delta-ms``, so
+sub-millisecond noise does not fail the run). Everything runs offline.
+
+Usage:
+    python benchmarks/bench_suite.py [--scales small medium] [--output results.json]
+    python benchmarks/bench_suite.py --baseline benchmarks/baseline.json [--threshold 30]
+    python benchmarks/bench_suite.py --update-baseline
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from _common import REPO_ROOT, make_context, make_workspace, measure
+
+from scripts import context_manager as cm
+
+BASELINE_FILE = Path(__file__).resolve().parent / "baseline.json"
+
+# 规模名 -> (项目数 N, 每个文件的会话数 M, 待办数 K)
+SCALES = {
+    "small": (20, 10, 5),
+    "medium": (200, 50, 10),
+    "large": (1000, 200, 20),
+}
+
+
+def run_scale(name: str, repeat: int) -> dict[str, float]:
+    """在一个合成工作区上运行所有基准，返回 {指标名: 最快耗时 ms}"""
+    projects, sessions, todos = SCALES[name]
+    results = {}
+    cwd = os.getcwd()
+    env = dict(os.environ)
+    os.environ["CTX_NO_DAEMON"] = "1"
+    os.environ["CTX_NO_CACHE"] = "1"
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            workspace = make_workspace(
+                Path(tmp), projects, sessions=sessions, todos=todos, formats=("v2", "v1", "mixed")
+            )
+            project = workspace / "project-0000"
+            os.chdir(project)
+
+            content = make_context(0, sessions=sessions, todos=todos)
+            results["parse_context"] = best(lambda: cm.parse_context(content), repeat)
+
+            cm.list_projects()  # 预热索引
+            results["list_projects"] = best(cm.list_projects, repeat)
+            os.environ["CTX_NO_INDEX"] = "1"
+            results["list_projects_cold"] = best(cm.list_projects, repeat)
+            del os.environ["CTX_NO_INDEX"]
+            results["cmd_ls"] = best(lambda: quiet(cm.cmd_ls, argparse.Namespace()), repeat)
+
+            update_args = argparse.Namespace(assignments=["current_focus=基准测试"], fsync=False)
+            results["cmd_update"] = best(lambda: quiet(cm.cmd_update, update_args), repeat)
+
+            legacy = make_context(1, sessions=sessions, todos=todos, fmt="v1")
+            legacy_file = workspace / "project-0001" / ".claude" / "context.md"
+            os.chdir(legacy_file.parent.parent)
+            results["cmd_migrate"] = best(
+                lambda: quiet(cm.cmd_migrate, argparse.Namespace()),
+                repeat,
+                setup=lambda: legacy_file.write_text(legacy, encoding="utf-8"),
+            )
+
+            pycache = Path(tmp) / "pycache"
+            run_cli(project, pycache, "status")  # 写入字节码缓存
+            results["cli_cold_start"] = best(lambda: run_cli(project, pycache, "status"), repeat)
+    finally:
+        os.chdir(cwd)
+        os.environ.clear()
+        os.environ.update(env)
+    return {f"{name}/{metric}": round(ms, 3) for metric, ms in results.items()}
+
+
+def best(func, repeat: int, setup=None) -> float:
+    """取多次运行中最快的一次：共享机器上的干扰只会让耗时变长，最小值比中位数稳定"""
+    return measure(func, repeat, setup, reduce=min)
+
+
+def quiet(func, args):
+    """运行命令函数并丢弃输出"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        func(args)
+
+
+def run_cli(cwd: Path, pycache: Path, *argv: str):
+    """在新的解释器中运行 ctx（字节码缓存在 pycache，与安装后的情况一致）"""
+    env = {**os.environ, "PYTHONPYCACHEPREFIX": str(pycache)}
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    subprocess.run(
+        [sys.executable, str(REPO_ROOT / "ctx.py"), *argv],
+        cwd=cwd,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        check=True,
+    )
+
+
+def compare(results: dict, baseline: dict, threshold: float, min_delta_ms: float) -> list[str]:
+    """返回超过阈值的回归（只比较两边都有的指标）"""
+    regressions = []
+    for metric, ms in results.items():
+        base = baseline.get(metric)
+        if base is None:
+            continue
+        change = (ms - base) / base * 100 if base > 0 else 0.0
+        print(f"{metric:<32} {base:>10.3f} {ms:>10.3f} {change:>+8.1f}%")
+        if change > threshold and ms - base >= min_delta_ms:
+            regressions.append(f"{metric}: {base:.3f} ms -> {ms:.3f} ms ({change:+.1f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=["small", "medium"])
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--output", type=Path, help="结果 JSON 路径（默认输出到 stdout）")
+    parser.add_argument("--baseline", type=Path, help="与基线 JSON 比较")
+    parser.add_argument("--threshold", type=float, default=30.0, help="回归阈值（百分比）")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5, help="小于该差值的变化不算回归")
+    parser.add_argument("--update-baseline", action="store_true", help=f"写入 {BASELINE_FILE.name}")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.scales:
+        print(
+            f"⏱️  {name}: N={SCALES[name][0]} M={SCALES[name][1]} K={SCALES[name][2]}",
+            file=sys.stderr,
+        )
+        results.update(run_scale(name, args.repeat))
+
+    report = {
+        "version": 1,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    payload = json.dumps(report, indent=2, ensure_ascii=False) + "\n"
+    if args.update_baseline:
+        BASELINE_FILE.write_text(payload, encoding="utf-8")
+        print(f"✅ 已写入 {BASELINE_FILE}", file=sys.stderr)
+    elif args.output:
+        args.output.write_text(payload, encoding="utf-8")
+    elif not args.baseline:
+        print(payload, end="")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))["results"]
+        print(f"{'metric':<32} {'baseline':>10} {'current':>10} {'change':>9}")
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"\n❌ {len(regressions)} 项回归超过 {args.threshold:g}%:")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print(f"\n✅ 没有超过 {args.threshold:g}% 的回归")
+
+
+if __name__ == "__main__":
+    main()
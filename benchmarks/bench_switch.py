@@ -0,0 +1,58 @@
+"""Benchmark: fuzzy ``ctx switch`` resolution over a trigram index.
+
+Compares ``resolve_project`` (workspace index + trigram index on disk) with
+a naive ``difflib`` scan over every project name. Synthetic project names
+all share the ``project-`` prefix, so every query touches most postings.
+
+Usage: python benchmarks/bench_switch.py [--projects 5000] [--repeat 10]
+"""
+
+from __future__ import annotations
+
+import argparse
+import difflib
+import os
+import tempfile
+from pathlib import Path
+
+from _common import make_workspace, measure
+
+from scripts import context_manager as cm
+
+QUERIES = ("project-1234", "proj 42", "第 7 个合成", "4999")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--projects", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workspace = make_workspace(Path(tmp), args.projects, sessions=1, todos=1)
+        os.chdir(workspace)
+        cm.list_projects()
+        names = sorted(cm.load_index(workspace)["entries"])
+
+        cm.get_trigram_file(workspace).unlink(missing_ok=True)
+        build_ms = measure(
+            lambda: cm.resolve_project(QUERIES[0], workspace),
+            1,
+            setup=lambda: cm.get_trigram_file(workspace).unlink(missing_ok=True),
+        )
+        print(f"projects={args.projects}")
+        print(f"first lookup (builds trigram index): {build_ms:8.2f} ms\n")
+
+        print(f"{'query':<16} {'trigram ms':>11} {'difflib ms':>11}  match")
+        for query in QUERIES:
+            trigram_ms = measure(lambda q=query: cm.resolve_project(q, workspace), args.repeat)
+            difflib_ms = measure(
+                lambda q=query: difflib.get_close_matches(q, names, n=5, cutoff=0.3), args.repeat
+            )
+            match, ranked = cm.resolve_project(query, workspace)
+            shown = match or f"{len(ranked)} candidates"
+            print(f"{query:<16} {trigram_ms:>11.2f} {difflib_ms:>11.2f}  {shown}")
+
+
+if __name__ == "__main__":
+    main()
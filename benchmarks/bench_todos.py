@@ -0,0 +1,51 @@
+"""Benchmark: cold vs warm todo index for ``ctx todos`` / ``ctx next``.
+
+Usage: python benchmarks/bench_todos.py [--projects 1000] [--sessions 50] [--todos 20]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+from pathlib import Path
+
+from _common import make_workspace, measure
+
+from scripts import context_manager as cm
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--projects", type=int, default=1000)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--todos", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workspace = make_workspace(
+            Path(tmp), args.projects, sessions=args.sessions, todos=args.todos
+        )
+        os.chdir(workspace)
+        index_file = cm.get_todos_index_file(workspace)
+
+        def cold():
+            index_file.unlink(missing_ok=True)
+            cm.load_todos()
+
+        cold_ms = measure(cold, args.repeat)
+        todos = cm.load_todos()
+        warm_ms = measure(cm.load_todos, args.repeat)
+        next_ms = measure(lambda: cm.next_todos(todos, 10), args.repeat)
+        sort_ms = measure(lambda: sorted(todos, key=cm._todo_rank)[:10], args.repeat)
+
+        print(f"projects={args.projects} sessions/file={args.sessions} todos={len(todos)}")
+        print(f"cold (no index):    {cold_ms:8.2f} ms")
+        print(f"warm (index hit):   {warm_ms:8.2f} ms")
+        print(f"next 10 (heap):     {next_ms:8.2f} ms")
+        print(f"next 10 (full sort):{sort_ms:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Benchmark: ``ctx update`` field edit, whole-file rewrite vs in-place splice.
+
+"legacy" is the original read_text + str.replace + re.sub + write_text over
+the entire file; "splice" is ``edit_frontmatter``, which scans only the
+frontmatter and streams the body into a temp file. Both make the same three
+edits (one field, last_session, session_count).
+
+Usage: python benchmarks/bench_update.py [--repeat 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+import tempfile
+from pathlib import Path
+
+from _common import measure
+from bench_parse import build_content
+
+from scripts.context_manager import edit_frontmatter
+
+SIZES = (("1 MB", 1_000_000), ("10 MB", 10_000_000))
+
+
+def legacy_update(context_file: Path, field: str, value: str):
+    """原 cmd_update 的做法：全文读入、查找替换、整体写回"""
+    content = context_file.read_text(encoding="utf-8")
+    content = content.replace(f"{field}:", f"{field}: {value}", 1)
+    content = re.sub(r"last_session:.*", "last_session: 2026-01-01", content)
+    content = re.sub(
+        r"session_count: (\d+)", lambda m: f"session_count: {int(m.group(1)) + 1}", content
+    )
+    context_file.write_text(content, encoding="utf-8")
+
+
+def splice_update(context_file: Path, field: str, value: str):
+    edit_frontmatter(
+        context_file,
+        {
+            field: value,
+            "last_session": lambda _old: "2026-01-01",
+            "session_count": lambda old: str(int(old) + 1),
+        },
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'input':<8} {'bytes':>11} {'legacy ms':>11} {'splice ms':>10} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        context_file = Path(tmp) / "context.md"
+        for label, target in SIZES:
+            context_file.write_text(build_content(target), encoding="utf-8")
+            size = context_file.stat().st_size
+            legacy_ms = measure(
+                lambda: legacy_update(context_file, "status", "paused"), args.repeat
+            )
+            splice_ms = measure(
+                lambda: splice_update(context_file, "status", "paused"), args.repeat
+            )
+            print(
+                f"{label:<8} {size:>11,} {legacy_ms:>11.3f} {splice_ms:>10.3f} {legacy_ms / splice_ms:>7.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+"""ctx 的启动入口（由 ./ctx 调用）
+
+直接运行 scripts/context_manager.py 时，解释器每次都要重新编译整个脚本，而且会把
+scripts/ 加入 sys.path（scripts/types.py 会遮蔽标准库 types）。这里以仓库根目录为
+sys.path[0] 按包导入，context_manager 可以直接从 __pycache__ 加载字节码。
+"""
+
+from scripts.context_manager import main
+
+if __name__ == "__main__":
+    main()
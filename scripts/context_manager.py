@@ -6,16 +6,96 @@ Context Manager Enhanced v2.0 - 工作区上下文管理（融合版）
 
 from __future__ import annotations
 
-import argparse
+# 启动耗时敏感（shell 钩子每次 cd / 提示符都会调用）：argparse、datetime、hashlib、
+# contextlib 等只在需要的命令中导入，模块级只保留快速路径用到的模块
+import io
+import json
 import os
 import re
 import sys
-from datetime import datetime
+import time
+from collections import namedtuple
+from collections.abc import Iterable, Iterator
 from pathlib import Path
 
 # ============ 配置 ============
 WORKSPACE_ROOT = Path.home() / "workspace"
 
+# 工作区索引（位于 workspace 根目录，缓存每个项目解析后的 context.md）
+INDEX_DIR_NAME = ".ctx"
+INDEX_FILE_NAME = "index.json"
+# 解析逻辑或索引结构变化时需递增，旧索引会被自动丢弃
+INDEX_VERSION = 2
+# ctx switch 模糊匹配用的三字组倒排表，与工作区索引放在一起
+TRIGRAM_FILE_NAME = "trigrams.json"
+TRIGRAM_INDEX_VERSION = 1
+
+# 项目发现：默认递归深度（1 = 只看 workspace 的直接子目录）和剪枝规则
+DEFAULT_MAX_DEPTH = 3
+IGNORE_FILE_NAME = ".ctxignore"
+DEFAULT_PRUNE_DIRS = frozenset(
+    {
+        "node_modules",
+        ".venv",
+        "venv",
+        "target",
+        ".git",
+        "__pycache__",
+        "dist",
+        "build",
+        ".tox",
+        ".mypy_cache",
+        ".pytest_cache",
+        "vendor",
+    }
+)
+
+# 会话归档：.claude/sessions/<年份>.md[.gz] + 偏移索引
+SESSIONS_DIR_NAME = "sessions"
+SESSIONS_INDEX_NAME = "index.json"
+
+# 单项目解析缓存：.claude/.context.cache
+CONTEXT_CACHE_NAME = ".context.cache"
+CONTEXT_CACHE_VERSION = 2
+# mtime 距缓存写入时间在此窗口内（或晚于写入时间）时视为不可信，需校验哈希
+CONTEXT_CACHE_RACY_NS = 2_000_000_000
+
+# 状态图标（ctx status / ctx prompt）
+STATUS_ICONS = {"active": "🟢", "paused": "🟡", "completed": "✅", "unknown": "⚪"}
+
+# 后台守护进程：workspace/.ctx/ctxd.sock
+DAEMON_SOCKET_NAME = "ctxd.sock"
+DAEMON_LOG_NAME = "ctxd.log"
+DAEMON_POLL_INTERVAL = 1.0
+
+# 全文搜索索引：workspace/.ctx/search.db（SQLite 倒排索引）；切分或表结构变化时需递增
+SEARCH_DB_NAME = "search.db"
+SEARCH_INDEX_VERSION = 2
+# 搜索时信任索引中的记录，超过这个间隔（秒）才在查询前重新扫描工作区
+SEARCH_REFRESH_INTERVAL = 300
+
+# Git 信息缓存：workspace/.ctx/git.json（按读取过的 .git 文件的 mtime 校验）
+GIT_CACHE_NAME = "git.json"
+GIT_CACHE_VERSION = 1
+
+# 待办索引：workspace/.ctx/todos.json（结构化待办，按文件缓存）
+TODOS_INDEX_NAME = "todos.json"
+TODOS_INDEX_VERSION = 1
+
+# 访问记录（frecency）：~/.cache/ctx/frecency.log 追加写入，超过上限时压缩进 frecency.json
+FRECENCY_FILE_NAME = "frecency.json"
+FRECENCY_LOG_NAME = "frecency.log"
+FRECENCY_VERSION = 1
+FRECENCY_HALF_LIFE = 7 * 86400  # 秒：一次访问的权重每 7 天减半
+FRECENCY_LOG_MAX_BYTES = 65_536
+FRECENCY_MIN_SCORE = 0.02  # 压缩时丢弃低于该得分的路径（单次访问约 40 天后）
+FRECENCY_MAX_ENTRIES = 1000
+
+# 本地遥测（CTX_TELEMETRY=1 开启）：~/.cache/ctx/telemetry.jsonl，超过大小上限时轮转
+TELEMETRY_FILE_NAME = "telemetry.jsonl"
+TELEMETRY_MAX_BYTES = 1_048_576
+TELEMETRY_BACKUPS = 2
+
 
 # ============ 工具函数 ============
 
@@ -42,35 +122,614 @@ def get_context_dir() -> Path:
 
 def get_context_file() -> Path | None:
     """获取当前项目的 context.md 路径"""
+    started = time.perf_counter()
     context_file = get_context_dir() / "context.md"
-    return context_file if context_file.exists() else None
-
-
-def list_projects() -> list[dict]:
-    """列出 workspace 下所有有 context.md 的项目"""
+    exists = context_file.exists()
+    profile_add("discover", started)
+    return context_file if exists else None
+
+
+def list_projects(
+    jobs: int | None = None, max_depth: int | None = None, stats: dict | None = None
+) -> list[dict]:
+    """列出 workspace 下所有有 context.md 的项目
+
+    项目由 discover_projects 递归发现，path 为相对 workspace 的路径（如 clients/foo）。
+    解析结果缓存在工作区索引中，未变化的文件只需 stat 一次；
+    设置环境变量 CTX_NO_INDEX=1 可跳过索引。
+    jobs > 1（或环境变量 CTX_JOBS）时使用线程池并发 stat/读取/解析，结果按路径排序。
+    传入 stats 字典时会填充发现阶段的统计信息。
+    """
+    started = time.perf_counter()
     workspace = get_workspace_root()
-    projects = []
+    names, discover_stats = discover_projects(workspace, max_depth)
+    profile_add("discover", started, discover_stats["visited"])
+    telemetry_set(projects=len(names))
+    if stats is not None:
+        stats.update(discover_stats)
+
+    started = time.perf_counter()
+    use_index = not os.environ.get("CTX_NO_INDEX")
+    index = load_index(workspace) if use_index else _new_index()
+    profile_add("index", started)
+
+    def load(name):
+        context_file = workspace / name / ".claude" / "context.md"
+        try:
+            return _read_indexed_context(index, name, context_file)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            return e
 
-    for item in workspace.iterdir():
-        if not item.is_dir() or item.name.startswith("."):
+    projects = []
+    seen = set()
+    for name, result in zip(names, _map_jobs(load, names, resolve_jobs(jobs))):
+        if result is None:
+            continue
+        if isinstance(result, Exception):
+            print(f"⚠️  警告: 无法读取 {name}/.claude/context.md: {result}", file=sys.stderr)
             continue
 
-        context_file = item / ".claude" / "context.md"
-        if context_file.exists():
-            try:
-                content = context_file.read_text(encoding="utf-8")
-                info = parse_context(content)
-                info["path"] = item.name
-                projects.append(info)
-            except Exception as e:
-                print(f"⚠️  警告: 无法读取 {item.name}/.claude/context.md: {e}", file=sys.stderr)
+        info, entry = result
+        if entry is not None:
+            index["entries"][name] = entry
+            index["dirty"] = True
+        info["path"] = name
+        projects.append(info)
+        seen.add(name)
+
+    if use_index:
+        started = time.perf_counter()
+        _prune_index(index, seen)
+        save_index(workspace, index)
+        profile_add("index", started)
 
     return projects
 
 
+def discover_projects(
+    workspace: Path, max_depth: int | None = None, dirs: list | None = None
+) -> tuple[list[str], dict]:
+    """基于 os.scandir 递归发现项目（含 .claude/context.md 的目录）
+
+    - 找到项目后不再向下递归
+    - 跳过隐藏目录、DEFAULT_PRUNE_DIRS 以及 workspace/.ctxignore 中的规则
+    - max_depth 为 None 时取 CTX_MAX_DEPTH 环境变量，否则为 DEFAULT_MAX_DEPTH
+    - 传入 dirs 列表时收集所有扫描过的目录，以及还没有 context.md 的 .claude 目录
+      （ctxd / ctx watch 用于添加监视，之后创建 context.md 才会产生事件）
+
+    返回 (按路径排序的相对路径列表, 统计信息)。
+    """
+    max_depth = resolve_max_depth(max_depth)
+    patterns = load_ignore_patterns(workspace)
+    stats = {"visited": 0, "pruned": 0, "projects": 0, "max_depth": max_depth}
+    found = []
+    stack = [(str(workspace), "", 0)]
+
+    while stack:
+        path, rel, depth = stack.pop()
+        try:
+            with os.scandir(path) as it:
+                entries = [entry for entry in it if entry.is_dir()]
+        except OSError:
+            continue
+        stats["visited"] += 1
+        if dirs is not None:
+            dirs.append(path)
+
+        has_claude = depth > 0 and any(entry.name == ".claude" for entry in entries)
+        if has_claude and os.path.isfile(os.path.join(path, ".claude", "context.md")):
+            found.append(rel)
+            continue
+        if has_claude and dirs is not None:
+            dirs.append(os.path.join(path, ".claude"))
+
+        if depth >= max_depth:
+            continue
+
+        for entry in entries:
+            child_rel = f"{rel}/{entry.name}" if rel else entry.name
+            if entry.name.startswith(".") or _is_pruned(entry.name, child_rel, patterns):
+                stats["pruned"] += 1
+                continue
+            stack.append((entry.path, child_rel, depth + 1))
+
+    stats["projects"] = len(found)
+    return sorted(found), stats
+
+
+def resolve_max_depth(max_depth: int | None = None) -> int:
+    """确定递归深度：显式参数 > CTX_MAX_DEPTH 环境变量 > DEFAULT_MAX_DEPTH"""
+    if max_depth is None:
+        try:
+            max_depth = int(os.environ.get("CTX_MAX_DEPTH", DEFAULT_MAX_DEPTH))
+        except ValueError:
+            max_depth = DEFAULT_MAX_DEPTH
+    return max(1, max_depth)
+
+
+def load_ignore_patterns(workspace: Path) -> list[str]:
+    """读取 workspace/.ctxignore（每行一个 fnmatch 模式，# 开头为注释）"""
+    try:
+        lines = (workspace / IGNORE_FILE_NAME).read_text(encoding="utf-8").splitlines()
+    except OSError:
+        return []
+    return [line.strip().rstrip("/") for line in lines if line.strip() and not line.startswith("#")]
+
+
+def _is_pruned(name: str, rel: str, patterns: list[str]) -> bool:
+    """目录名命中默认规则，或目录名/相对路径命中 .ctxignore 中的模式"""
+    if name in DEFAULT_PRUNE_DIRS:
+        return True
+    if not patterns:
+        return False
+
+    from fnmatch import fnmatch
+
+    return any(fnmatch(rel if "/" in pattern else name, pattern) for pattern in patterns)
+
+
+def resolve_jobs(jobs: int | None = None) -> int:
+    """确定并发数：显式参数 > CTX_JOBS 环境变量 > 1（串行）；0 表示按 CPU 自动选择"""
+    if jobs is None:
+        try:
+            jobs = int(os.environ.get("CTX_JOBS", "1"))
+        except ValueError:
+            jobs = 1
+    if jobs <= 0:
+        jobs = min(32, (os.cpu_count() or 1) + 4)
+    return jobs
+
+
+def _map_jobs(func, items: list, jobs: int) -> list:
+    """按顺序返回 func(item) 的结果，jobs > 1 时使用有界线程池"""
+    if jobs <= 1 or len(items) < 2:
+        return [func(item) for item in items]
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=min(jobs, len(items))) as pool:
+        return list(pool.map(func, items))
+
+
+# ============ 工作区索引 ============
+
+
+def get_index_file(workspace: Path) -> Path:
+    """获取工作区索引文件路径"""
+    return workspace / INDEX_DIR_NAME / INDEX_FILE_NAME
+
+
+def _new_index() -> dict:
+    return {"version": INDEX_VERSION, "entries": {}, "dirty": False}
+
+
+def _content_hash(data: bytes) -> str:
+    """计算文件内容哈希（用于识别 mtime 变化但内容未变的情况）"""
+    import hashlib
+
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _decode_context(data: bytes) -> str:
+    """按 read_text 的语义解码（统一换行符）"""
+    return data.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+
+
+def load_index(workspace: Path) -> dict:
+    """读取工作区索引，文件缺失、损坏或版本不符时返回空索引"""
+    try:
+        raw = json.loads(get_index_file(workspace).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return _new_index()
+
+    if not isinstance(raw, dict) or raw.get("version") != INDEX_VERSION:
+        return _new_index()
+    entries = raw.get("entries")
+    if not isinstance(entries, dict):
+        return _new_index()
+    return {"version": INDEX_VERSION, "entries": entries, "dirty": False}
+
+
+def save_index(workspace: Path, index: dict):
+    """原子写入工作区索引（仅在有变化时写入，失败时静默跳过）"""
+    if not index["dirty"]:
+        return
+
+    index_file = get_index_file(workspace)
+    payload = {"version": INDEX_VERSION, "entries": index["entries"]}
+    tmp_file = index_file.with_name(f"{index_file.name}.{os.getpid()}.tmp")
+    try:
+        index_file.parent.mkdir(exist_ok=True)
+        tmp_file.write_text(
+            json.dumps(payload, ensure_ascii=False, separators=(",", ":")), encoding="utf-8"
+        )
+        os.replace(tmp_file, index_file)
+        index["dirty"] = False
+    except OSError:
+        tmp_file.unlink(missing_ok=True)
+
+
+def _read_indexed_context(index: dict, key: str, context_file: Path) -> tuple[dict, dict | None]:
+    """通过索引读取 context.md 的 frontmatter 解析结果
+
+    索引只缓存 frontmatter（ctx ls 只需要这些字段），哈希也只覆盖 frontmatter 部分。
+    mtime_ns 和 size 都未变化时直接使用缓存；否则增量读取 frontmatter 并比较哈希，
+    哈希一致（如 touch、git checkout、只追加了会话记录）只刷新 stat 信息，不一致才重新解析。
+    不修改索引（可在工作线程中调用），返回 (info, 需要写回的新条目或 None)。
+    """
+    started = time.perf_counter()
+    st = context_file.stat()
+    profile_add("stat", started, 1)
+    entry = index["entries"].get(key)
+    if entry and entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size:
+        telemetry_file(True, st.st_size)
+        return dict(entry["info"]), None
+
+    started = time.perf_counter()
+    header = read_header(context_file)
+    digest = _content_hash(header)
+    profile_add("read", started, 1)
+    if entry and entry["hash"] == digest:
+        info = entry["info"]
+        telemetry_file(True, st.st_size)
+    else:
+        started = time.perf_counter()
+        info = parse_frontmatter(_decode_context(header))
+        profile_add("parse", started, 1)
+        telemetry_file(False, st.st_size)
+
+    new_entry = {
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+        "hash": digest,
+        "info": info,
+    }
+    return dict(info), new_entry
+
+
+def _prune_index(index: dict, keep: set):
+    """移除已不存在的项目"""
+    stale = [key for key in index["entries"] if key not in keep]
+    for key in stale:
+        del index["entries"][key]
+    if stale:
+        index["dirty"] = True
+
+
 def parse_context(content: str) -> dict:
     """解析 context.md 内容（双格式兼容）"""
-    result = {
+    return _parse_sections(iter_sections(io.StringIO(content)))
+
+
+def parse_context_file(context_file: Path) -> dict:
+    """流式解析 context.md，峰值内存与文件长度无关"""
+    with open(context_file, encoding="utf-8") as fh:
+        return _parse_sections(iter_sections(fh))
+
+
+# ============ 解析缓存 ============
+
+
+def get_context_cache_file(context_file: Path) -> Path:
+    """获取 context.md 对应的解析缓存文件"""
+    return context_file.with_name(CONTEXT_CACHE_NAME)
+
+
+def _file_hash(path: Path, chunk_size: int = 1 << 20) -> str:
+    """分块计算整个文件的内容哈希"""
+    import hashlib
+
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as fh:
+        while chunk := fh.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _load_context_cache(cache_file: Path) -> dict | None:
+    try:
+        raw = json.loads(cache_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(raw, dict) or raw.get("version") != CONTEXT_CACHE_VERSION:
+        return None
+    return raw
+
+
+def _save_context_cache(cache_file: Path, st: os.stat_result, digest: str, info: dict):
+    """原子写入解析缓存（失败时静默跳过）"""
+    payload = {
+        "version": CONTEXT_CACHE_VERSION,
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+        "hash": digest,
+        "written_ns": time.time_ns(),
+        "info": info,
+    }
+    tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+    try:
+        tmp_file.write_text(
+            json.dumps(payload, ensure_ascii=False, separators=(",", ":")), encoding="utf-8"
+        )
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        tmp_file.unlink(missing_ok=True)
+
+
+def _parse_with_todo_count(context_file: Path) -> dict:
+    """解析 context.md，并附加 todo_count（未完成待办数，与 ctx todos 口径一致）
+
+    info["todos"] 保持旧解析器的结果（识别不到带 emoji 的待办标题，且包含 ### P0 标题），
+    状态、提示符等处显示的待办数统一使用 todo_count。
+    """
+    info = parse_context_file(context_file)
+    info["todo_count"] = count_open_todos(context_file)
+    return info
+
+
+def load_context(context_file: Path) -> dict:
+    """解析 context.md，优先使用 .claude/.context.cache
+
+    mtime_ns 和 size 都未变化，且 mtime 明显早于缓存写入时间时直接使用缓存；
+    mtime 落在写入时间附近或晚于写入时间（同一时间片内的修改、时钟偏差）时校验全文哈希。
+    stat 变化但哈希一致（touch、git checkout）只刷新缓存的 stat 信息，不重新解析。
+    设置 CTX_NO_CACHE=1 时直接解析。
+    """
+    if os.environ.get("CTX_NO_CACHE"):
+        started = time.perf_counter()
+        info = _parse_with_todo_count(context_file)
+        profile_add("parse", started, 1)
+        if _TELEMETRY is not None:
+            telemetry_file(False, context_file.stat().st_size)
+        return info
+
+    started = time.perf_counter()
+    cache_file = get_context_cache_file(context_file)
+    st = context_file.stat()
+    profile_add("stat", started, 1)
+    started = time.perf_counter()
+    cache = _load_context_cache(cache_file)
+    profile_add("read", started)
+    if (
+        cache
+        and cache["mtime_ns"] == st.st_mtime_ns
+        and cache["size"] == st.st_size
+        and st.st_mtime_ns < cache["written_ns"] - CONTEXT_CACHE_RACY_NS
+    ):
+        telemetry_file(True, st.st_size)
+        return cache["info"]
+
+    started = time.perf_counter()
+    digest = _file_hash(context_file)
+    profile_add("read", started, 1)
+    telemetry_file(bool(cache and cache["hash"] == digest), st.st_size)
+    if cache and cache["hash"] == digest:
+        info = cache["info"]
+        unchanged = cache["mtime_ns"] == st.st_mtime_ns and cache["size"] == st.st_size
+        if unchanged and time.time_ns() < st.st_mtime_ns + CONTEXT_CACHE_RACY_NS:
+            # 仍处于不可信窗口内，重写缓存也无法消除歧义
+            return info
+    else:
+        started = time.perf_counter()
+        info = _parse_with_todo_count(context_file)
+        profile_add("parse", started, 1)
+    _save_context_cache(cache_file, st, digest, info)
+    return info
+
+
+# ============ 流式章节读取 ============
+
+# 章节标题关键字 -> 章节类型（按顺序匹配）
+_SECTION_MARKER_KINDS = {
+    "## 待办": "todos",
+    "## 会话记录": "sessions",
+    "## 本次会话概览": "sessions",
+    "## 已完成工作": "sessions",
+}
+
+# 块边界：--- 行、"## " 二级标题、包含章节关键字的标题行（如 "### 待办"）
+_SECTION_BOUNDARY = re.compile(
+    r"\n(?:[^\S\n]*---[^\S\n]*(?=\n|\Z)|## |#[^\n]*(?:"
+    + "|".join(re.escape(marker) for marker in _SECTION_MARKER_KINDS)
+    + "))"
+)
+
+SECTION_CHUNK_SIZE = 1 << 16
+
+
+# iter_sections 产出的文本块（collections.namedtuple 避免在启动时导入 typing）
+# kind: frontmatter | todos | sessions | body
+# text: 原文（含换行），除续块外首行是边界行
+Section = namedtuple("Section", ["kind", "text"])
+
+
+def iter_sections(fh, chunk_size: int = SECTION_CHUNK_SIZE) -> Iterator[Section]:
+    """从文件句柄流式读取 context.md，按块产出 Section
+
+    - 文件开头的 frontmatter（含两端的 ---）是一个 frontmatter 块
+    - 其余内容在边界行（见 _SECTION_BOUNDARY）处切块，按所在章节标记为
+      todos / sessions / body
+    - 没有边界的长段落在行边界处切成不超过约 chunk_size 的同类续块
+
+    所有块按顺序拼接后与原文完全一致，且不产出空块；内存占用只取决于 chunk_size 和最长的一行。
+    """
+    buf = fh.read(chunk_size)
+    eof = not buf
+    while "\n" not in buf and not eof:
+        more = fh.read(chunk_size)
+        eof = not more
+        buf += more
+    if not buf:
+        return
+
+    first_end = buf.find("\n")
+    if first_end == -1:
+        first_end = len(buf)
+    first_line = buf[:first_end]
+    kind = "frontmatter" if first_line.strip() == "---" else _boundary_kind("body", first_line)
+    start = 0  # 当前块的起点
+    scan = first_end  # 从这个换行符开始查找下一个边界行
+
+    while True:
+        limit = len(buf) if eof else buf.rfind("\n") + 1
+        match = _SECTION_BOUNDARY.search(buf, scan, limit) if limit > scan else None
+        if match:
+            line_start = match.start() + 1
+            line_end = buf.find("\n", line_start)
+            if line_end == -1:
+                line_end = len(buf)
+            line = buf[line_start:line_end]
+
+            if kind == "frontmatter" and line.strip() == "---":
+                # 结束标记属于 frontmatter 块
+                end = min(line_end + 1, len(buf))
+                yield Section(kind, buf[start:end])
+                start = end
+                kind = "body"
+            else:
+                # 紧接在上一个边界之后（或块恰好在读取边界处结束）时没有内容，不产出空块
+                if line_start > start:
+                    yield Section(kind, buf[start:line_start])
+                start = line_start
+                kind = _boundary_kind(kind, line)
+            scan = line_end
+            continue
+
+        if eof:
+            if start < len(buf):
+                yield Section(kind, buf[start:])
+            return
+
+        # 缓冲区内没有边界：块过大时先在行边界处产出续块
+        if limit - start > chunk_size:
+            yield Section(kind, buf[start:limit])
+            start = limit
+        # limit 之前开始的行都已确认不是边界，保留其前一个换行符作为查找锚点
+        scan = max(scan, limit - 1)
+        drop = min(start, scan)
+        buf = buf[drop:]
+        start -= drop
+        scan -= drop
+
+        more = fh.read(chunk_size)
+        eof = not more
+        buf += more
+
+
+def _boundary_kind(kind: str, line: str) -> str:
+    """根据边界行确定后续内容所属的章节"""
+    if line.strip() == "---":
+        # 正文中的分隔线不改变章节
+        return kind
+    section = _section_kind(line) if line.startswith("#") else None
+    if section:
+        return section
+    if line.startswith("## "):
+        # 容忍标题前的 emoji（如模板中的 "## 📝 会话记录"）
+        title = line[3:].lstrip()
+        start = next((i for i, char in enumerate(title) if char.isalnum()), len(title))
+        return _section_kind(f"## {title[start:]}") or "body"
+    return kind
+
+
+def _section_kind(heading: str) -> str | None:
+    """识别标题行所属章节（todos / sessions），其他标题返回 None"""
+    for marker, kind in _SECTION_MARKER_KINDS.items():
+        if marker in heading:
+            return kind
+    return None
+
+
+def _parse_sections(sections: Iterable[Section]) -> dict:
+    """消费 iter_sections 的输出并解析
+
+    解析器是单遍状态机：frontmatter 字段通过 _FRONTMATTER_HANDLERS 查表分发，
+    只有以 # 开头的行才做章节标题检测。能改变状态的行都是块边界，因此不在
+    frontmatter 或待办区时只需处理每块的首行，其余内容（主要是会话记录）整块跳过。
+    """
+    parser = _ContextParser()
+    feed = parser.feed_line
+    for section in sections:
+        text = section.text
+        first_end = text.find("\n")
+        if first_end == -1:
+            feed(text)
+            continue
+
+        feed(text[:first_end])
+        if not parser.in_frontmatter and not parser.in_todos:
+            continue
+        rest = text[first_end + 1 :]
+        if rest.endswith("\n"):
+            rest = rest[:-1]
+        elif not rest:
+            continue
+        for line in rest.split("\n"):
+            feed(line)
+
+    result = parser.result
+    result["format_version"] = _detect_format_version(result)
+    return result
+
+
+class _ContextParser:
+    """parse_context 的逐行状态机"""
+
+    def __init__(self):
+        self.result = _new_context_info()
+        self.in_frontmatter = False
+        self.in_todos = False
+        self.in_stack = False
+        self.in_sessions = False
+
+    def feed_line(self, line: str):
+        # 解析 YAML frontmatter（先用 in 快速排除，绝大多数行不含 ---）
+        if "---" in line and line.strip() == "---":
+            self.in_frontmatter = not self.in_frontmatter
+            return
+
+        if self.in_frontmatter:
+            self.in_stack = _parse_frontmatter_line(self.result, line, self.in_stack)
+
+        # 章节检测（只针对标题行）
+        if line[:1] == "#":
+            section = _section_kind(line)
+            if section == "todos":
+                self.in_todos = True
+                self.in_sessions = False
+                return
+            if section == "sessions":
+                self.in_sessions = True
+                self.result["has_sessions"] = True
+                self.in_todos = False
+                return
+            if line.startswith("## "):
+                if self.in_todos and "待办" not in line:
+                    self.in_todos = False
+                    return
+                if self.in_sessions and "会话" not in line and "完成" not in line:
+                    self.in_sessions = False
+                    return
+
+        if not self.in_todos:
+            return
+
+        if "- [ ]" in line:
+            self.result["todos"].append(line.split("- [ ]")[1].strip()[:60])
+        elif "- [x]" in line:
+            # 已完成的待办，不加入待办列表
+            pass
+        else:
+            stripped = line.strip()
+            if stripped.startswith("### P"):
+                self.result["todos"].append(f"【{stripped.replace('### ', '')}】")
+
+
+def _new_context_info() -> dict:
+    """解析结果的默认值"""
+    return {
         "project": "Unknown",
         "created": "Unknown",
         "last_session": "Unknown",
@@ -88,97 +747,2879 @@ def parse_context(content: str) -> dict:
         "format_version": "unknown",
     }
 
-    lines = content.split("\n")
-    in_frontmatter = False
-    in_todos = False
+
+def _set_field(field: str, quoted: bool = False):
+    """生成把值写入 result[field] 的处理函数（quoted 时去掉两侧双引号）"""
+
+    def handler(result: dict, value: str):
+        value = value.strip()
+        result[field] = value.strip('"') if quoted else value
+
+    return handler
+
+
+def _set_session_count(result: dict, value: str):
+    result["session_count"] = int(value.strip())
+
+
+def _set_project_type(result: dict, value: str):
+    # 旧版字段兼容：project_type 作为 category 的后备
+    result["project_type"] = value.strip()
+    if result["category"] == "unknown":
+        result["category"] = result["project_type"]
+
+
+# frontmatter 字段名 -> 处理函数
+_FRONTMATTER_HANDLERS = {
+    "project": _set_field("project"),
+    "created": _set_field("created"),
+    "last_session": _set_field("last_session", quoted=True),
+    "status": _set_field("status"),
+    "category": _set_field("category"),
+    "current_focus": _set_field("current_focus", quoted=True),
+    "next_steps": _set_field("next_steps", quoted=True),
+    "brief": _set_field("brief", quoted=True),
+    "branch": _set_field("branch"),
+    "session_count": _set_session_count,
+    "project_type": _set_project_type,
+}
+
+
+def _parse_frontmatter_line(result: dict, line: str, in_stack: bool) -> bool:
+    """解析一行 frontmatter，返回新的 in_stack 状态"""
+    key, sep, value = line.partition(":")
+    if sep:
+        handler = _FRONTMATTER_HANDLERS.get(key)
+        if handler is not None:
+            handler(result, value)
+            return in_stack
+        if key == "stack":
+            return True
+
+    if in_stack:
+        if line.startswith("  - "):
+            result["stack"].append(line.replace("  - ", "").strip())
+        elif not line.startswith(" "):
+            return False
+    return in_stack
+
+
+def _detect_format_version(result: dict) -> str:
+    """检测格式版本（只依赖 frontmatter 字段）"""
+    if result["created"] != "Unknown" and result["status"] in ["active", "paused", "completed"]:
+        return "v2"
+    elif result["project_type"] or result["session_count"] > 0 or result["branch"]:
+        return "v1"
+    else:
+        return "mixed"
+
+
+def parse_frontmatter(content: str, fields: list[str] | None = None) -> dict:
+    """只解析 frontmatter（读到结束的 --- 即停止，不处理待办和会话记录）
+
+    返回与 parse_context 相同的字段（todos 为空、has_sessions 为 False）；
+    传入 fields 时只返回这些字段。
+    """
+    result = _new_context_info()
     in_stack = False
-    in_sessions = False
+    for line in _iter_frontmatter(io.StringIO(content), "---"):
+        in_stack = _parse_frontmatter_line(result, line.rstrip("\n"), in_stack)
+    result["format_version"] = _detect_format_version(result)
+
+    if fields is None:
+        return result
+    unknown = set(fields) - set(result)
+    if unknown:
+        raise ValueError(f"未知字段: {', '.join(sorted(unknown))}")
+    return {field: result[field] for field in fields}
+
+
+def read_frontmatter(context_file: Path, fields: list[str] | None = None) -> dict:
+    """增量读取 context.md 的 frontmatter 并解析，耗时与会话记录长度无关"""
+    return parse_frontmatter(_decode_context(read_header(context_file)), fields)
+
+
+def read_header(context_file: Path) -> bytes:
+    """读取文件开头到 frontmatter 结束标记（含）为止的字节"""
+    with open(context_file, "rb") as fh:
+        return b"".join(_iter_frontmatter(fh, b"---", keep_markers=True))
+
+
+def _iter_frontmatter(lines, marker, keep_markers: bool = False):
+    """逐行读取，产出第一对 --- 之间的行，读到结束标记即停止
 
+    开始标记之前遇到二级标题（正文开始）时视为没有 frontmatter。
+    """
+    heading = b"## " if isinstance(marker, bytes) else "## "
+    opened = False
     for line in lines:
-        # 解析 YAML frontmatter
-        if line.strip() == "---":
-            in_frontmatter = not in_frontmatter
+        if line.strip() == marker:
+            if keep_markers:
+                yield line
+            if opened:
+                return
+            opened = True
+        elif opened:
+            yield line
+        elif line.startswith(heading):
+            return
+        elif keep_markers:
+            yield line
+
+
+# ============ frontmatter 就地编辑 ============
+
+_FRONTMATTER_KEY = re.compile(rb"([A-Za-z_][\w-]*):")
+_INLINE_COMMENT = re.compile(rb"[ \t]#")
+# 新增字段时默认加双引号的字段（与模板一致）
+_QUOTED_FIELDS = frozenset({"current_focus", "next_steps", "brief"})
+
+
+# frontmatter 中一个键的值槽位：冒号之后、行尾注释或换行之前的字节范围 [start, end)
+# comment: 槽位之后是否有行尾注释（需要保持对齐）；quoted: 原值是否带双引号
+FrontmatterSlot = namedtuple("FrontmatterSlot", ["start", "end", "comment", "quoted"])
+
+
+def index_frontmatter(fh) -> dict | None:
+    """逐行扫描二进制文件的 frontmatter，记录每个键的值槽位（文件内字节偏移）
+
+    例如 ``status: active      # active | paused`` 的槽位是 `` active      ``。
+    重复的键以最后一次出现为准（与解析器一致）。只读取到结束标记为止。
+    返回 {"fields": {键: FrontmatterSlot}, "close": 结束标记行的偏移, "end": frontmatter 之后的偏移}，
+    没有 frontmatter 时返回 None。
+    """
+    fields = {}
+    offset = 0
+    opened = False
+    for line in fh:
+        if line.strip() == b"---":
+            if opened:
+                return {"fields": fields, "close": offset, "end": offset + len(line)}
+            opened = True
+        elif opened:
+            match = _FRONTMATTER_KEY.match(line)
+            if match:
+                fields[match.group(1).decode()] = _value_slot(line, match.end(), offset)
+        elif line.startswith(b"## "):
+            return None
+        offset += len(line)
+    return None
+
+
+def _value_slot(line: bytes, start: int, offset: int) -> FrontmatterSlot:
+    end = len(line.rstrip(b"\r\n"))
+    value_start = start + len(line[start:end]) - len(line[start:end].lstrip())
+    quoted = line.startswith(b'"', value_start)
+    # 从值之前的空白开始查找，值为空时（如 "project_type:     # 可选"）也能识别注释
+    search_from = value_start - 1
+    if quoted:
+        # 值内部可能含有引号（写入时不转义），以最后一个引号作为结束
+        closing = line.rfind(b'"', value_start + 1, end)
+        search_from = closing + 1 if closing >= 0 else end
+    comment = _INLINE_COMMENT.search(line, search_from, end)
+    slot_end = comment.end() - 1 if comment else end
+    return FrontmatterSlot(offset + start, offset + slot_end, comment is not None, quoted)
+
+
+def _display_width(text: str) -> int:
+    import unicodedata
+
+    return sum(2 if unicodedata.east_asian_width(char) in "WF" else 1 for char in text)
+
+
+def _render_slot(old: str, value: str, slot: FrontmatterSlot) -> str:
+    """生成新的值槽位：有行尾注释时补齐空格，使注释保持原来的列"""
+    new = f" {value}"
+    if slot.comment:
+        padding = _display_width(old) - _display_width(new)
+        new += " " * max(padding, 1)
+    return new
+
+
+def _format_value(value: str, quoted: bool) -> str:
+    value = " ".join(value.splitlines())
+    return f'"{value}"' if quoted else value
+
+
+def edit_frontmatter(context_file: Path, updates: dict, fsync: bool = False) -> dict[str, str]:
+    """只修改 frontmatter 中指定键的值，正文按字节原样复制
+
+    updates 的值为字符串时替换（键不存在则插入到结束标记之前）；为函数时接收旧值
+    并返回新值，键不存在时跳过。先扫描出每个键的字节范围，再按偏移拼接，
+    不对全文做查找替换，行尾注释和对齐保持不变。写入临时文件后原子替换（符号链接
+    替换其指向的文件，保留原权限），fsync=True 时在替换前将临时文件刷到磁盘。
+    返回实际写入的 {键: 新值}。
+    """
+    import shutil
+
+    context_file = context_file.resolve()
+    tmp_file = context_file.with_name(f"{context_file.name}.{os.getpid()}.tmp")
+    applied = {}
+    try:
+        with open(context_file, "rb") as src:
+            layout = index_frontmatter(src)
+            if layout is None:
+                raise ValueError("context.md 缺少 frontmatter，请先运行 ctx migrate")
+            src.seek(0)
+            raw = src.read(layout["end"])
+
+            splices = []
+            inserts = []
+            for key, value in updates.items():
+                slot = layout["fields"].get(key)
+                if slot is None:
+                    if callable(value):
+                        continue
+                    new_value = _format_value(value, key in _QUOTED_FIELDS)
+                    inserts.append(f"{key}: {new_value}\n")
+                    applied[key] = value
+                    continue
+
+                old = raw[slot.start : slot.end].decode("utf-8")
+                old_value = old.strip().strip('"') if slot.quoted else old.strip()
+                new_value = value(old_value) if callable(value) else value
+                rendered = _render_slot(old, _format_value(new_value, slot.quoted), slot)
+                splices.append((slot.start, slot.end, rendered.encode("utf-8")))
+                applied[key] = new_value
+            if inserts:
+                splices.append((layout["close"], layout["close"], "".join(inserts).encode("utf-8")))
+
+            for start, end, data in sorted(splices, reverse=True):
+                raw = raw[:start] + data + raw[end:]
+            with open(tmp_file, "wb") as dst:
+                dst.write(raw)
+                shutil.copyfileobj(src, dst, 1 << 20)
+                if fsync:
+                    dst.flush()
+                    os.fsync(dst.fileno())
+        _replace_keeping_mode(tmp_file, context_file)
+    finally:
+        tmp_file.unlink(missing_ok=True)
+    return applied
+
+
+# ============ 字段更新 ============
+
+# ctx update 支持的字段
+UPDATE_FIELDS = [
+    "project",
+    "status",
+    "category",
+    "project_type",
+    "current_focus",
+    "next_steps",
+    "brief",
+    "branch",
+]
+
+
+def parse_update_args(tokens: list[str]) -> dict[str, str]:
+    """解析 ctx update 的参数
+
+    支持旧写法 ``字段 值`` 和多字段写法 ``字段=值 字段=值 ...``（按出现顺序，
+    同一字段以最后一次为准）。格式错误或字段不受支持时抛出 ValueError。
+    """
+    if tokens and "=" not in tokens[0]:
+        if len(tokens) != 2:
+            raise ValueError("用法: ctx update <字段> <值> 或 ctx update <字段>=<值> ...")
+        fields = {tokens[0]: tokens[1]}
+    else:
+        fields = {}
+        for token in tokens:
+            field, sep, value = token.partition("=")
+            if not sep:
+                raise ValueError(f"参数缺少 '=': {token}")
+            fields[field] = value
+
+    unknown = [field for field in fields if field not in UPDATE_FIELDS]
+    if unknown:
+        raise ValueError(
+            f"不支持的字段: {', '.join(unknown)}\n   支持的字段: {', '.join(UPDATE_FIELDS)}"
+        )
+    return fields
+
+
+def update_context(
+    context_file: Path, fields: dict[str, str], fsync: bool = False, bump: bool = True
+) -> dict:
+    """一次读写更新多个字段（不存在时添加），并只刷新一次 last_session、递增一次 session_count
+
+    bump=False 时只写入 fields（批量维护不算一次工作会话）。
+    """
+    from datetime import datetime
+
+    updates = dict(fields)
+    if bump:
+        today = datetime.now().strftime("%Y-%m-%d")
+        updates["last_session"] = lambda _old: today
+        updates["session_count"] = lambda old: str(int(old) + 1) if old.isdigit() else old
+    return edit_frontmatter(context_file, updates, fsync=fsync)
+
+
+# --where 可以筛选的字段
+WHERE_FIELDS = UPDATE_FIELDS + ["created", "last_session", "session_count"]
+_WHERE_CONDITION = re.compile(r"([A-Za-z_]+)\s*(<=|>=|!=|=|<|>)\s*(.*)")
+_WHERE_OPERATORS = {
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
+
+
+def parse_where(conditions: list[str]) -> list[tuple[str, str, str]]:
+    """解析 --where 条件（如 status=active、last_session<2026-08-01），格式错误时抛出 ValueError"""
+    parsed = []
+    for condition in conditions:
+        match = _WHERE_CONDITION.fullmatch(condition.strip())
+        if not match:
+            raise ValueError(f"无法解析的条件: {condition}")
+        if match.group(1) not in WHERE_FIELDS:
+            raise ValueError(
+                f"不支持筛选的字段: {match.group(1)}\n   支持的字段: {', '.join(WHERE_FIELDS)}"
+            )
+        parsed.append(match.groups())
+    return parsed
+
+
+def _field_value(info: dict, field: str) -> str:
+    """取用于比较的字段值（去掉解析结果中保留的行尾注释）"""
+    return re.split(r"\s+#", str(info.get(field, "")), maxsplit=1)[0].strip()
+
+
+def match_where(info: dict, conditions: list[tuple[str, str, str]]) -> bool:
+    """所有条件都满足时返回 True；两边都是整数时按数值比较，否则按字符串比较（日期为 ISO 格式）"""
+    for field, op, expected in conditions:
+        actual = _field_value(info, field)
+        if actual.isdigit() and expected.isdigit():
+            actual, expected = int(actual), int(expected)
+        if not _WHERE_OPERATORS[op](actual, expected):
+            return False
+    return True
+
+
+def bulk_update(
+    fields: dict[str, str],
+    conditions: list[tuple[str, str, str]],
+    dry_run: bool = False,
+    jobs: int | None = None,
+    fsync: bool = False,
+) -> dict:
+    """对工作区中满足条件的项目批量写入字段
+
+    项目通过 list_projects 发现；已经是目标值的项目跳过，写入时使用有界线程池，
+    不刷新 last_session / session_count。
+    返回 {"updated": [(路径, {字段: 旧值})], "skipped": 数量, "failed": [(路径, 错误)]}。
+    """
+    workspace = get_workspace_root()
+    result = {"updated": [], "skipped": 0, "failed": []}
+    selected = []
+    for info in list_projects(jobs=jobs):
+        old = {field: _field_value(info, field) for field in fields}
+        if not match_where(info, conditions) or old == fields:
+            result["skipped"] += 1
+            continue
+        selected.append((info["path"], old))
+
+    def apply(item):
+        try:
+            if not dry_run:
+                context_file = workspace / item[0] / ".claude" / "context.md"
+                update_context(context_file, fields, fsync=fsync, bump=False)
+        except (OSError, ValueError) as e:
+            return e
+        return None
+
+    for item, error in zip(selected, _map_jobs(apply, selected, resolve_jobs(jobs))):
+        if error is None:
+            result["updated"].append(item)
+        else:
+            result["failed"].append((item[0], error))
+    return result
+
+
+# ============ 格式迁移 ============
+
+
+def build_migrated_frontmatter(info: dict) -> str:
+    """根据旧版解析结果生成融合版 frontmatter（含结束标记和空行）"""
+    from datetime import datetime
+
+    new_frontmatter = f"""---
+# ============ 基本信息 ============
+project: {info['project']}
+created: {info['created'] if info['created'] != 'Unknown' else datetime.now().strftime('%Y-%m-%d')}
+last_session: {datetime.now().strftime('%Y-%m-%d')}
+session_count: {info['session_count'] if info['session_count'] > 0 else 1}
+
+# ============ 状态分类 ============
+status: active                 # 请根据实际情况修改: active | paused | completed
+category: {info['category'] if info['category'] != 'unknown' else '探索性'}
+project_type: {info['project_type'] if info['project_type'] else ''}
+
+# ============ 工作追踪 ============
+current_focus: "{info['current_focus']}"
+next_steps: ""
+branch: {info['branch'] if info['branch'] else 'main'}
+
+# ============ 项目描述 ============
+brief: {info['brief'] if info['brief'] else '"请用一句话描述这个项目的目标"'}
+
+# ============ 技术栈 ============
+stack:
+"""
+
+    # 添加 stack
+    if info["stack"]:
+        for item in info["stack"]:
+            new_frontmatter += f"  - {item}\n"
+    else:
+        new_frontmatter += "  - 语言/框架\n"
+
+    new_frontmatter += "---\n\n"
+    return new_frontmatter
+
+
+def needs_migration(info: dict) -> bool:
+    """是否需要迁移到融合版
+
+    与 format_version 的 v2 判定一致，但忽略 status 的行尾注释：模板和迁移结果都带注释，
+    而 parse_context 为保持兼容会把注释保留在值里，否则刚迁移的文件仍会被判为 v1。
+    """
+    status = _field_value(info, "status")
+    return info["created"] == "Unknown" or status not in ("active", "paused", "completed")
+
+
+def _write_migrated(src, dst, info: dict):
+    """写入新 frontmatter，并流式复制原有内容（跳过旧的 frontmatter）"""
+    dst.write(build_migrated_frontmatter(info))
+    for section in iter_sections(src):
+        if section.kind != "frontmatter":
+            dst.write(section.text)
+
+
+def migrate_context(context_file: Path, info: dict | None = None):
+    """把 context.md 迁移到融合版：写入临时文件后原子替换（符号链接替换其指向的文件）"""
+    if info is None:
+        info = parse_context_file(context_file)
+    context_file = context_file.resolve()
+    tmp_file = context_file.with_name(f"{context_file.name}.{os.getpid()}.tmp")
+    try:
+        with open(context_file, encoding="utf-8") as src, open(
+            tmp_file, "w", encoding="utf-8"
+        ) as dst:
+            _write_migrated(src, dst, info)
+        _replace_keeping_mode(tmp_file, context_file)
+    finally:
+        tmp_file.unlink(missing_ok=True)
+
+
+def migration_diff(context_file: Path, label: str, info: dict | None = None) -> str:
+    """返回迁移前后的 unified diff（不修改文件）"""
+    import difflib
+
+    if info is None:
+        info = parse_context_file(context_file)
+    with open(context_file, encoding="utf-8") as src:
+        old = src.read()
+    new = io.StringIO()
+    _write_migrated(io.StringIO(old), new, info)
+    return "".join(
+        difflib.unified_diff(
+            old.splitlines(keepends=True),
+            new.getvalue().splitlines(keepends=True),
+            f"a/{label}",
+            f"b/{label}",
+        )
+    )
+
+
+def migrate_all(dry_run: bool = False, jobs: int | None = None, progress=None) -> dict:
+    """迁移工作区中所有 v1 / mixed 格式的 context.md
+
+    通过 list_projects 发现项目并用 needs_migration 筛选（版本只取决于 frontmatter，
+    可直接使用工作区索引的结果），迁移时重新完整解析。使用有界线程池并发处理，
+    每完成一个文件调用 progress(完成数, 总数)。dry_run 时不写文件，返回 diff。
+    返回 {"migrated": [(路径, 版本, diff 或 None)], "current": 已是融合版的数量, "failed": [(路径, 错误)]}。
+    """
+    import threading
+
+    workspace = get_workspace_root()
+    projects = list_projects(jobs=jobs)
+    pending = [(p["path"], p["format_version"]) for p in projects if needs_migration(p)]
+    lock = threading.Lock()
+    done = 0
+
+    def migrate(item):
+        nonlocal done
+        path, _version = item
+        context_file = workspace / path / ".claude" / "context.md"
+        try:
+            label = f"{path}/.claude/context.md"
+            result = migration_diff(context_file, label) if dry_run else migrate_context(context_file)
+        except (OSError, ValueError) as e:
+            result = e
+        with lock:
+            done += 1
+            if progress:
+                progress(done, len(pending))
+        return result
+
+    result = {"migrated": [], "current": len(projects) - len(pending), "failed": []}
+    for (path, version), outcome in zip(pending, _map_jobs(migrate, pending, resolve_jobs(jobs))):
+        if isinstance(outcome, Exception):
+            result["failed"].append((path, outcome))
+        else:
+            result["migrated"].append((path, version, outcome))
+    return result
+
+
+# ============ 会话归档 ============
+
+_SESSION_DATE = re.compile(r"###\s*(\d{4})-(\d{2})-(\d{2})")
+
+
+def _split_lines(text: str) -> list[str]:
+    """按 \\n 切分并保留行尾"""
+    lines = text.split("\n")
+    result = [line + "\n" for line in lines[:-1]]
+    if lines[-1]:
+        result.append(lines[-1])
+    return result
+
+
+def iter_session_entries(sections: Iterable[Section]) -> Iterator[tuple[str | None, str]]:
+    """把 iter_sections 的输出切分为会话条目
+
+    产出 (heading, text)：会话条目的 heading 是 "### " 标题行（不含换行），
+    其他内容的 heading 为 None。所有 text 按顺序拼接后与原文一致。
+    """
+    heading = None
+    parts: list[str] = []
+
+    for section in sections:
+        # 离开会话章节或遇到新的二级标题：结束当前条目
+        leaving = section.kind != "sessions" or section.text.startswith("## ")
+        if leaving and heading is not None:
+            yield heading, "".join(parts)
+            heading, parts = None, []
+        if section.kind != "sessions":
+            yield None, section.text
+            continue
+
+        for line in _split_lines(section.text):
+            if line.startswith("### "):
+                if heading is not None:
+                    yield heading, "".join(parts)
+                elif parts:
+                    yield None, "".join(parts)
+                heading, parts = line.rstrip("\n"), [line]
+            elif heading is None:
+                yield None, line
+            else:
+                parts.append(line)
+
+    if heading is not None:
+        yield heading, "".join(parts)
+
+
+def _session_date(heading: str) -> str | None:
+    match = _SESSION_DATE.match(heading)
+    return "-".join(match.groups()) if match else None
+
+
+def _select_sessions(headings: list[str], days: int | None, keep: int | None) -> set[int]:
+    """选出需要归档的会话序号：早于 days 天，或不在最近 keep 个之内（无日期的会话始终保留）"""
+    dated = [(date, i) for i, heading in enumerate(headings) if (date := _session_date(heading))]
+    selected = set()
+    if days is not None:
+        from datetime import datetime, timedelta
+
+        cutoff = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+        selected.update(i for date, i in dated if date < cutoff)
+    if keep is not None:
+        # 日期相同时，文件中靠后的视为更新
+        newest_first = sorted(dated, reverse=True)
+        selected.update(i for _, i in newest_first[max(keep, 0) :])
+    return selected
+
+
+def get_sessions_dir(context_file: Path) -> Path:
+    """获取会话归档目录（.claude/sessions）"""
+    return context_file.parent / SESSIONS_DIR_NAME
+
+
+def load_sessions_index(sessions_dir: Path) -> list[dict]:
+    """读取归档偏移索引"""
+    try:
+        raw = json.loads((sessions_dir / SESSIONS_INDEX_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return []
+    return raw.get("sessions", []) if isinstance(raw, dict) else []
+
+
+def archive_sessions(
+    context_file: Path,
+    days: int | None = None,
+    keep: int | None = None,
+    compress: bool = False,
+    dry_run: bool = False,
+) -> list[dict]:
+    """把旧会话从 context.md 移入 .claude/sessions/<年份>.md（compress 时为 .md.gz）
+
+    每个会话追加为归档文件中独立的一段（压缩时是独立的 gzip member），并在
+    sessions/index.json 中记录文件名、偏移和长度，读取单个会话时只需 seek 到对应位置。
+    context.md 以流式方式重写到临时文件后原子替换。返回被归档会话的索引记录。
+    """
+    with open(context_file, encoding="utf-8") as fh:
+        headings = [h for h, _ in iter_session_entries(iter_sections(fh)) if h is not None]
+    selected = _select_sessions(headings, days, keep)
+    if not selected:
+        return []
+
+    records = [
+        {"heading": heading[4:].strip(), "date": _session_date(heading)}
+        for i, heading in enumerate(headings)
+        if i in selected
+    ]
+    if dry_run:
+        return records
+
+    import gzip
+
+    sessions_dir = get_sessions_dir(context_file)
+    sessions_dir.mkdir(exist_ok=True)
+    index = load_sessions_index(sessions_dir)
+    suffix = ".md.gz" if compress else ".md"
+    archives: dict[str, object] = {}
+    target = context_file.resolve()
+    tmp_file = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+    record_iter = iter(records)
+
+    try:
+        with open(context_file, encoding="utf-8") as src, open(
+            tmp_file, "w", encoding="utf-8"
+        ) as dst:
+            position = 0
+            for heading, text in iter_session_entries(iter_sections(src)):
+                if heading is None:
+                    dst.write(text)
+                    continue
+                position += 1
+                if position - 1 not in selected:
+                    dst.write(text)
+                    continue
+
+                record = next(record_iter)
+                name = f"{record['date'][:4]}{suffix}"
+                if name not in archives:
+                    archives[name] = open(sessions_dir / name, "ab")  # noqa: SIM115
+                archive = archives[name]
+                data = text.encode("utf-8")
+                if compress:
+                    data = gzip.compress(data)
+                record.update(file=name, offset=archive.tell(), length=len(data))
+                archive.write(data)
+        for archive in archives.values():
+            archive.close()
+        index.extend(records)
+        _write_json_atomic(sessions_dir / SESSIONS_INDEX_NAME, {"version": 1, "sessions": index})
+        _replace_keeping_mode(tmp_file, target)
+    finally:
+        for archive in archives.values():
+            archive.close()
+        tmp_file.unlink(missing_ok=True)
+
+    return records
+
+
+def read_archived_session(sessions_dir: Path, record: dict) -> str:
+    """按偏移读取单个已归档会话（不解压、不扫描整个归档文件）"""
+    with open(sessions_dir / record["file"], "rb") as fh:
+        fh.seek(record["offset"])
+        data = fh.read(record["length"])
+    if record["file"].endswith(".gz"):
+        import gzip
+
+        data = gzip.decompress(data)
+    return data.decode("utf-8")
+
+
+def _replace_keeping_mode(tmp_file: Path, target: Path):
+    """用临时文件原子替换 target，并沿用 target 原来的权限位（如 0600）
+
+    target 应为已解析的真实路径，临时文件与它位于同一目录，符号链接本身不会被替换。
+    """
+    import shutil
+
+    shutil.copymode(target, tmp_file)
+    os.replace(tmp_file, target)
+
+
+def _write_json_atomic(path: Path, payload: dict):
+    """写临时文件后原子替换"""
+    tmp_file = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        tmp_file.write_text(
+            json.dumps(payload, ensure_ascii=False, separators=(",", ":")), encoding="utf-8"
+        )
+        os.replace(tmp_file, path)
+    finally:
+        tmp_file.unlink(missing_ok=True)
+
+
+def _auto_archive(context_file: Path):
+    """按 CTX_ARCHIVE_KEEP / CTX_ARCHIVE_DAYS 自动轮转会话记录（未设置时不做任何事）"""
+    try:
+        keep = int(os.environ["CTX_ARCHIVE_KEEP"]) if os.environ.get("CTX_ARCHIVE_KEEP") else None
+        days = int(os.environ["CTX_ARCHIVE_DAYS"]) if os.environ.get("CTX_ARCHIVE_DAYS") else None
+    except ValueError:
+        return
+    if keep is None and days is None:
+        return
+
+    compress = bool(os.environ.get("CTX_ARCHIVE_GZIP"))
+    records = archive_sessions(context_file, days=days, keep=keep, compress=compress)
+    if records:
+        print(f"📦 已自动归档 {len(records)} 个旧会话到 {get_sessions_dir(context_file)}")
+
+
+# ============ 后台守护进程 (ctxd) ============
+
+_IN_MODIFY = 0x2
+_IN_ATTRIB = 0x4
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_DELETE_SELF = 0x400
+_IN_MOVE_SELF = 0x800
+_IN_Q_OVERFLOW = 0x4000
+_IN_IGNORED = 0x8000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_IN_WATCH_MASK = (
+    _IN_MODIFY
+    | _IN_ATTRIB
+    | _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_DELETE_SELF
+    | _IN_MOVE_SELF
+)
+_IN_TREE_CHANGES = _IN_CREATE | _IN_DELETE | _IN_MOVED_FROM | _IN_MOVED_TO
+_IN_EVENT_FORMAT = "iIII"  # struct inotify_event: wd, mask, cookie, len
+
+
+def get_daemon_socket(workspace: Path) -> Path:
+    """获取 ctxd 的 Unix socket 路径（可用 CTX_SOCKET 覆盖）"""
+    override = os.environ.get("CTX_SOCKET")
+    return Path(override) if override else workspace / INDEX_DIR_NAME / DAEMON_SOCKET_NAME
+
+
+def _daemon_call(sock_path: Path, payload: dict, timeout: float = 2.0) -> str | None:
+    """发送一个请求并读取完整响应；连接失败或守护进程报错时返回 None"""
+    # 客户端处于启动快速路径上：直接使用 socket 模块的 C 实现，省去 socket/enum/selectors 的导入
+    import _socket
+
+    client = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    try:
+        client.settimeout(timeout)
+        client.connect(str(sock_path))
+        client.sendall(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+        client.shutdown(_socket.SHUT_WR)
+        chunks = []
+        while chunk := client.recv(1 << 16):
+            chunks.append(chunk)
+    except OSError:
+        return None
+    finally:
+        client.close()
+
+    status, _, body = b"".join(chunks).partition(b"\n")
+    return body.decode("utf-8") if status == b"ok" else None
+
+
+def daemon_request(command: str, cwd: Path | None = None) -> str | None:
+    """瘦客户端：请求 ctxd 渲染 ls / status / show 的输出
+
+    返回 None 表示守护进程未运行、不可用或设置了 CTX_NO_DAEMON，调用方应回退到直接模式。
+    """
+    if os.environ.get("CTX_NO_DAEMON"):
+        return None
+    started = time.perf_counter()
+    cwd = cwd or Path.cwd()
+    sock_path = get_daemon_socket(get_workspace_root())
+    if not sock_path.exists():
+        profile_add("discover", started)
+        return None
+    output = _daemon_call(sock_path, {"cmd": command, "cwd": str(cwd)})
+    profile_add("daemon", started)
+    if output is not None:
+        telemetry_set(daemon=True)
+    return output
+
+
+def _inotify_open() -> dict | None:
+    """打开 inotify 实例（仅 Linux，通过 ctypes 调用 libc），不可用时返回 None"""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    # watches: wd -> 目录；paths: 目录 -> wd（判断某个目录是否受监视）
+    return {"fd": fd, "libc": libc, "watches": {}, "paths": {}}
+
+
+def _inotify_watch(inotify: dict, path: Path):
+    wd = inotify["libc"].inotify_add_watch(inotify["fd"], os.fsencode(path), _IN_WATCH_MASK)
+    if wd < 0:
+        return
+    # 同一 inode 再次添加时返回原来的 wd（目录被移动过），旧路径不再受监视
+    old = inotify["watches"].get(wd)
+    if old is not None and inotify["paths"].get(old) == wd:
+        del inotify["paths"][old]
+    inotify["watches"][wd] = path
+    inotify["paths"][path] = wd
+
+
+def _inotify_watched(inotify: dict | None, path: Path) -> bool:
+    return inotify is not None and path in inotify["paths"]
+
+
+def _inotify_read(inotify: dict) -> Iterator[tuple[Path | None, int, str]]:
+    """读取所有待处理事件，产出 (被监视目录, mask, 文件名)"""
+    import struct
+
+    header = struct.Struct(_IN_EVENT_FORMAT)
+    while True:
+        try:
+            data = os.read(inotify["fd"], 1 << 16)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = header.unpack_from(data, offset)
+            offset += header.size
+            name = data[offset : offset + length].rstrip(b"\0").decode("utf-8", "replace")
+            offset += length
+            directory = inotify["watches"].get(wd)
+            if mask & _IN_IGNORED:
+                inotify["watches"].pop(wd, None)
+                if inotify["paths"].get(directory) == wd:
+                    del inotify["paths"][directory]
+            yield directory, mask, name
+
+
+def _is_tree_change(mask: int, name: str) -> bool:
+    """是否为影响项目发现的变化：新建/删除/移动普通目录或 .claude，或修改 .ctxignore"""
+    if not mask & _IN_TREE_CHANGES:
+        return False
+    if name == IGNORE_FILE_NAME:
+        return True
+    return bool(mask & _IN_ISDIR) and (name == ".claude" or not name.startswith("."))
+
+
+def _watch_new_claude_dir(inotify: dict, directory: Path, mask: int, name: str):
+    """新建或移入的 .claude 目录立即加入监视，不等重新发现（此时 context.md 可能还不存在）"""
+    if name == ".claude" and mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO):
+        _inotify_watch(inotify, directory / name)
+
+
+def _new_daemon_state(workspace: Path, use_inotify: bool = True) -> dict:
+    return {
+        "workspace": workspace,
+        "names": None,  # 已发现的项目列表，None 表示需要重新发现
+        "entries": {},  # context.md 路径 -> (mtime_ns, size, info)
+        "inotify": _inotify_open() if use_inotify else None,
+        "running": True,
+    }
+
+
+def _daemon_discover(state: dict) -> list[str]:
+    """按需重新发现项目，并为沿途目录和 .claude 目录添加监视"""
+    if state["names"] is not None:
+        return state["names"]
+
+    workspace = state["workspace"]
+    dirs: list[str] = []
+    names, _ = discover_projects(workspace, dirs=dirs)
+    state["names"] = names
+    inotify = state["inotify"]
+    if inotify:
+        for path in dirs:
+            _inotify_watch(inotify, Path(path))
+        for name in names:
+            _inotify_watch(inotify, workspace / name / ".claude")
+    return names
+
+
+def _daemon_handle_events(state: dict):
+    """处理 inotify 事件：context.md 变化时丢弃对应条目，目录结构变化时重新发现"""
+    inotify = state["inotify"]
+    if not inotify:
+        return
+    for directory, mask, name in _inotify_read(inotify):
+        if mask & _IN_Q_OVERFLOW or directory is None:
+            state["names"] = None
+            state["entries"].clear()
+        elif mask & (_IN_DELETE_SELF | _IN_MOVE_SELF):
+            state["names"] = None
+            state["entries"].pop(str(directory / "context.md"), None)
+        elif directory.name == ".claude":
+            if name == "context.md":
+                state["entries"].pop(str(directory / "context.md"), None)
+                if mask & _IN_TREE_CHANGES:
+                    state["names"] = None
+        elif _is_tree_change(mask, name):
+            _watch_new_claude_dir(inotify, directory, mask, name)
+            state["names"] = None
+
+
+def _daemon_context(state: dict, context_file: Path) -> dict | None:
+    """从内存读取解析结果；所在 .claude 目录不受 inotify 监视时先比较 stat
+
+    嵌套项目、超出 --depth 或位于被跳过目录中的项目不会被监视，不能只信任内存中的条目。
+    """
+    key = str(context_file)
+    entry = state["entries"].get(key)
+    if entry and _inotify_watched(state["inotify"], context_file.parent):
+        return entry[2]
+
+    try:
+        st = context_file.stat()
+    except OSError:
+        state["entries"].pop(key, None)
+        return None
+    if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+        return entry[2]
+    info = load_context(context_file)
+    state["entries"][key] = (st.st_mtime_ns, st.st_size, info)
+    return info
+
+
+def _daemon_projects(state: dict) -> list[dict]:
+    workspace = state["workspace"]
+    projects = []
+    for name in _daemon_discover(state):
+        try:
+            info = _daemon_context(state, workspace / name / ".claude" / "context.md")
+        except Exception as e:
+            print(f"⚠️  警告: 无法读取 {name}/.claude/context.md: {e}", file=sys.stderr)
             continue
+        if info is not None:
+            projects.append(dict(info, path=name))
+    return projects
+
 
-        if in_frontmatter:
-            # 新版字段
-            if line.startswith("project:"):
-                result["project"] = line.split(":", 1)[1].strip()
-            elif line.startswith("created:"):
-                result["created"] = line.split(":", 1)[1].strip()
-            elif line.startswith("last_session:"):
-                result["last_session"] = line.split(":", 1)[1].strip().strip('"')
-            elif line.startswith("status:"):
-                result["status"] = line.split(":", 1)[1].strip()
-            elif line.startswith("category:"):
-                result["category"] = line.split(":", 1)[1].strip()
-            elif line.startswith("current_focus:"):
-                result["current_focus"] = line.split(":", 1)[1].strip().strip('"')
-            elif line.startswith("next_steps:"):
-                result["next_steps"] = line.split(":", 1)[1].strip().strip('"')
-            elif line.startswith("brief:"):
-                result["brief"] = line.split(":", 1)[1].strip().strip('"')
-            elif line.startswith("branch:"):
-                result["branch"] = line.split(":", 1)[1].strip()
-            elif line.startswith("session_count:"):
-                result["session_count"] = int(line.split(":", 1)[1].strip())
-            # 旧版字段兼容
-            elif line.startswith("project_type:"):
-                result["project_type"] = line.split(":", 1)[1].strip()
-                if result["category"] == "unknown":
-                    result["category"] = result["project_type"]
-            elif line.startswith("stack:"):
-                in_stack = True
-            elif in_stack and line.startswith("  - "):
-                result["stack"].append(line.replace("  - ", "").strip())
-            elif in_stack and not line.startswith(" "):
-                in_stack = False
-
-        # 解析 TODO 列表
-        if "## 待办事项" in line or "## 待办" in line:
-            in_todos = True
-            in_sessions = False
+def _daemon_render(state: dict, request: dict) -> str:
+    """渲染与直接模式完全相同的命令输出"""
+    command = request["cmd"]
+    if command == "ping":
+        mode = "inotify" if state["inotify"] else "polling"
+        return f"pid={os.getpid()} mode={mode} projects={len(_daemon_discover(state))}\n"
+    if command == "shutdown":
+        state["running"] = False
+        return ""
+
+    import contextlib
+
+    cwd = Path(request["cwd"])
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        if command == "ls":
+            print_project_list(attach_git_info(_daemon_projects(state), state["workspace"]))
+        elif command in ("status", "show"):
+            context_file = cwd / ".claude" / "context.md"
+            info = _daemon_context(state, context_file)
+            if info is not None:
+                info = project_git_info(info, context_file, state["workspace"])
+            if command == "status" and info is None:
+                print("⚠️  当前项目没有 context.md")
+            elif command == "status":
+                print_status(info)
+            elif info is None:
+                print_no_context(cwd)
+            else:
+                display_context(info)
+        else:
+            raise ValueError(f"未知命令: {command}")
+    return out.getvalue()
+
+
+def _daemon_serve(state: dict, server):
+    """处理一个连接：读取完整请求（客户端关闭写端），写回 ok/error + 输出"""
+    import contextlib
+
+    conn, _ = server.accept()
+    with conn:
+        conn.settimeout(1.0)
+        try:
+            chunks = []
+            while chunk := conn.recv(1 << 16):
+                chunks.append(chunk)
+            body = "ok\n" + _daemon_render(state, json.loads(b"".join(chunks)))
+        except Exception as e:
+            body = f"error\n{e}"
+        with contextlib.suppress(OSError):
+            conn.sendall(body.encode("utf-8"))
+
+
+def run_daemon(
+    workspace: Path,
+    use_inotify: bool = True,
+    poll_interval: float = DAEMON_POLL_INTERVAL,
+):
+    """在前台运行 ctxd，直到收到 shutdown 请求
+
+    Linux 上用 inotify 监视项目目录，事件在处理每个请求之前读取，客户端写入后
+    立即查询也不会读到旧数据。没有 inotify 时退化为轮询：每个请求比较 stat，
+    每 poll_interval 秒重新发现一次项目。
+    """
+    import selectors
+    import socket
+
+    sock_path = get_daemon_socket(workspace)
+    sock_path.parent.mkdir(parents=True, exist_ok=True)
+    sock_path.unlink(missing_ok=True)
+    state = _new_daemon_state(workspace, use_inotify)
+    selector = selectors.DefaultSelector()
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        server.bind(str(sock_path))
+        server.listen(16)
+        selector.register(server, selectors.EVENT_READ)
+        if state["inotify"]:
+            selector.register(state["inotify"]["fd"], selectors.EVENT_READ)
+        _daemon_discover(state)
+        timeout = None if state["inotify"] else poll_interval
+
+        while state["running"]:
+            events = selector.select(timeout)
+            _daemon_handle_events(state)
+            if not events:
+                state["names"] = None
+            if any(key.fileobj is server for key, _ in events):
+                _daemon_serve(state, server)
+    finally:
+        selector.close()
+        server.close()
+        sock_path.unlink(missing_ok=True)
+        if state["inotify"]:
+            os.close(state["inotify"]["fd"])
+
+
+def _daemonize(workspace: Path) -> int:
+    """双重 fork 后在后台运行 ctxd，返回守护进程 pid（父进程中）"""
+    read_fd, write_fd = os.pipe()
+    if os.fork() > 0:
+        os.close(write_fd)
+        with os.fdopen(read_fd, "rb") as pipe:
+            data = pipe.read()
+        return int(data or 0)
+
+    os.close(read_fd)
+    os.setsid()
+    if os.fork() > 0:
+        os._exit(0)
+    os.write(write_fd, str(os.getpid()).encode())
+    os.close(write_fd)
+
+    log_file = workspace / INDEX_DIR_NAME / DAEMON_LOG_NAME
+    devnull = os.open(os.devnull, os.O_RDWR)
+    log_fd = os.open(log_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    os.dup2(log_fd, 2)
+    try:
+        run_daemon(workspace)
+    finally:
+        os._exit(0)
+
+
+# ============ 监视模式 (ctx watch) ============
+
+
+def _new_watch_state(workspace: Path, use_inotify: bool = True) -> dict:
+    """读取工作区索引并完成首次发现（之后只按事件增量更新）"""
+    state = {
+        "workspace": workspace,
+        "index": load_index(workspace),
+        "projects": {},  # 相对路径 -> info
+        "inotify": _inotify_open() if use_inotify else None,
+    }
+    _watch_apply(state, set(), rediscover=True)
+    return state
+
+
+def _watch_discover(state: dict) -> list[str]:
+    """重新发现项目（只遍历目录，不读取文件），并为扫描过的目录添加监视"""
+    workspace = state["workspace"]
+    dirs: list[str] = []
+    names, _ = discover_projects(workspace, dirs=dirs)
+    inotify = state["inotify"]
+    if inotify:
+        for path in dirs:
+            _inotify_watch(inotify, Path(path))
+        for name in names:
+            _inotify_watch(inotify, workspace / name / ".claude")
+    return names
+
+
+def _watch_apply(state: dict, changed: set[str], rediscover: bool = False) -> dict[str, str]:
+    """增量刷新指定项目并写回索引
+
+    rediscover 为 True 时重新发现项目，新增和消失的项目并入 changed。
+    返回真正发生变化的项目：{相对路径: "+" | "~" | "-"}。
+    """
+    workspace = state["workspace"]
+    index = state["index"]
+    projects = state["projects"]
+    changed = set(changed)
+    if rediscover:
+        names = set(_watch_discover(state))
+        changed |= names.symmetric_difference(projects)
+
+    updates = {}
+    for name in sorted(changed):
+        context_file = workspace / name / ".claude" / "context.md"
+        try:
+            info, entry = _read_indexed_context(index, name, context_file)
+        except FileNotFoundError:
+            info = entry = None
+        except Exception as e:
+            print(f"⚠️  警告: 无法读取 {name}/.claude/context.md: {e}", file=sys.stderr)
             continue
 
-        # 检测会话记录
-        if "## 会话记录" in line or "## 本次会话概览" in line or "## 已完成工作" in line:
-            in_sessions = True
-            result["has_sessions"] = True
-            in_todos = False
+        if entry is not None:
+            index["entries"][name] = entry
+            index["dirty"] = True
+        if info is None:
+            if projects.pop(name, None) is not None:
+                updates[name] = "-"
+            if index["entries"].pop(name, None) is not None:
+                index["dirty"] = True
             continue
 
-        if in_todos and line.startswith("## ") and "待办" not in line:
-            in_todos = False
+        info["path"] = name
+        if projects.get(name) != info:
+            updates[name] = "~" if name in projects else "+"
+            projects[name] = info
+
+    save_index(workspace, index)
+    return updates
+
+
+def _watch_project_name(state: dict, directory: Path) -> str | None:
+    workspace = state["workspace"]
+    project = directory.parent
+    if workspace not in project.parents:
+        return None
+    return project.relative_to(workspace).as_posix()
+
+
+def _watch_collect(state: dict, timeout: float | None, debounce: float) -> tuple[set[str], bool]:
+    """等待 inotify 事件，并在 debounce 秒内合并连续的事件（编辑器保存常产生多次写入）
+
+    返回 (变化的项目, 是否需要重新发现)。超时没有事件时返回空集合。
+    """
+    import select
+
+    inotify = state["inotify"]
+    changed: set[str] = set()
+    rediscover = False
+    wait = timeout
+    while select.select([inotify["fd"]], [], [], wait)[0]:
+        for directory, mask, name in _inotify_read(inotify):
+            if mask & _IN_Q_OVERFLOW or directory is None:
+                rediscover = True
+                changed |= set(state["projects"])
+            elif mask & (_IN_DELETE_SELF | _IN_MOVE_SELF):
+                rediscover = True
+            elif directory.name == ".claude":
+                project = _watch_project_name(state, directory) if name == "context.md" else None
+                if project is not None:
+                    changed.add(project)
+            elif _is_tree_change(mask, name):
+                _watch_new_claude_dir(inotify, directory, mask, name)
+                rediscover = True
+        wait = debounce
+    return changed, rediscover
+
+
+def _watch_lines(state: dict) -> list[str]:
+    """按 ctx ls 的分组渲染当前项目，返回行列表"""
+    import contextlib
+
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        print_project_list(sorted(state["projects"].values(), key=lambda p: p["path"]))
+    return out.getvalue().split("\n")
+
+
+def _screen_updates(old: list[str], new: list[str]) -> str:
+    """生成只重绘变化行的 ANSI 序列（行号从 1 开始，对应屏幕绝对位置）"""
+    out = []
+    for row, line in enumerate(new, 1):
+        if row > len(old) or old[row - 1] != line:
+            out.append(f"\x1b[{row};1H\x1b[2K{line}")
+    if len(new) < len(old):
+        out.append(f"\x1b[{len(new) + 1};1H\x1b[J")
+    return "".join(out)
+
+
+def cmd_watch(args):
+    """前台监视 workspace，增量更新索引并重绘 ctx ls 视图"""
+    from datetime import datetime
+
+    workspace = get_workspace_root()
+    debounce = max(args.debounce, 0) / 1000
+    state = _new_watch_state(workspace, use_inotify=not args.poll)
+    mode = "inotify" if state["inotify"] else f"轮询 {args.interval}s"
+    tty = sys.stdout.isatty()
+
+    def header():
+        now = datetime.now().strftime("%H:%M:%S")
+        return f"👀 ctx watch | {workspace} | {mode} | 更新于 {now} (Ctrl+C 退出)"
+
+    screen = [header(), *_watch_lines(state)]
+    if tty:
+        sys.stdout.write("\x1b[2J" + _screen_updates([], screen))
+    else:
+        print("\n".join(screen))
+    sys.stdout.flush()
+
+    try:
+        while True:
+            if state["inotify"]:
+                changed, rediscover = _watch_collect(state, None, debounce)
+            else:
+                # 轮询：只 stat 已知文件并重新发现目录，内容未变的文件不会被读取
+                time.sleep(args.interval)
+                changed, rediscover = set(state["projects"]), True
+            updates = _watch_apply(state, changed, rediscover)
+            if not updates:
+                continue
+
+            if tty:
+                new_screen = [header(), *_watch_lines(state)]
+                sys.stdout.write(_screen_updates(screen, new_screen))
+                screen = new_screen
+            else:
+                now = datetime.now().strftime("%H:%M:%S")
+                for name, kind in sorted(updates.items()):
+                    info = state["projects"].get(name)
+                    detail = f" | {info['status']} | {info['current_focus'][:35]}" if info else ""
+                    print(f"[{now}] {kind} {name}{detail}")
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        if tty:
+            sys.stdout.write(f"\x1b[{len(screen) + 1};1H\n")
+    finally:
+        if state["inotify"]:
+            os.close(state["inotify"]["fd"])
+
+
+# ============ 提示符片段 (ctx prompt) ============
+
+
+def get_user_cache_dir() -> Path:
+    """用户级缓存目录（$XDG_CACHE_HOME/ctx，默认 ~/.cache/ctx）"""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(Path.home(), ".cache")
+    return Path(base) / "ctx"
+
+
+def _prompt_cache_file(cwd: Path) -> Path:
+    # crc32 只用于分桶，缓存内容中保存完整 cwd 用于校验
+    import zlib
+
+    return get_user_cache_dir() / "prompt" / f"{zlib.crc32(os.fsencode(cwd)):08x}.json"
+
+
+def format_prompt(info: dict) -> str:
+    """生成提示符片段：状态图标 项目 (分支) 📋待办数（状态和分支去掉行尾注释）"""
+    icon = STATUS_ICONS.get(_field_value(info, "status"), "⚪")
+    branch = _field_value(info, "branch")
+    branch = f" ({branch})" if branch else ""
+    count = info.get("todo_count", len(info["todos"]))
+    todos = f" 📋{count}" if count else ""
+    return f"{icon} {info['project']}{branch}{todos}"
+
+
+def _read_prompt_cache(cwd: Path) -> dict | None:
+    try:
+        cache = json.loads(_prompt_cache_file(cwd).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return cache if isinstance(cache, dict) and cache.get("cwd") == str(cwd) else None
+
+
+def refresh_prompt(cwd: Path) -> str:
+    """重新生成并缓存 cwd 的提示符片段（没有 context.md 时为空字符串）"""
+    context_file = cwd / ".claude" / "context.md"
+    try:
+        st = context_file.stat()
+    except OSError:
+        return ""
+
+    # 分支与 ctx status 一样取自 .git，缓存同时记录这些文件的 mtime
+    git_sig: list = []
+    line = format_prompt(project_git_info(load_context(context_file), context_file, sig=git_sig))
+    cache_file = _prompt_cache_file(cwd)
+    payload = {
+        "cwd": str(cwd),
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+        "git": git_sig,
+        "line": line,
+    }
+    tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        tmp_file.unlink(missing_ok=True)
+    return line
+
+
+def prompt_line(cwd: Path) -> tuple[str, bool]:
+    """读取 cwd 的提示符片段缓存，返回 (片段, 是否仍然有效)
+
+    缓存以 context.md 的 mtime_ns 和大小以及决定分支的 git 文件的 mtime 为键，
+    有效时只需几次 stat 和一次小文件读取，完全不解析 context.md。
+    """
+    cache = _read_prompt_cache(cwd)
+    try:
+        st = (cwd / ".claude" / "context.md").stat()
+    except OSError:
+        return "", True
+    if (
+        cache
+        and cache["mtime_ns"] == st.st_mtime_ns
+        and cache["size"] == st.st_size
+        and "git" in cache
+        and all(_mtime_ns(path) == mtime for path, mtime in cache["git"])
+    ):
+        return cache["line"], True
+    return (cache["line"] if cache else ""), False
+
+
+def _spawn_prompt_refresh(cwd: Path):
+    """在后台子进程中刷新提示符缓存（不占用终端的 stdout/stderr）"""
+    if not hasattr(os, "fork"):
+        refresh_prompt(cwd)
+        return
+
+    sys.stdout.flush()
+    if os.fork() > 0:
+        return
+    try:
+        os.setsid()
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        refresh_prompt(cwd)
+    finally:
+        os._exit(0)
+
+
+def cmd_prompt(args):
+    """输出一行提示符片段（供 PS1 使用）"""
+    cwd = Path.cwd()
+    line, fresh = prompt_line(cwd)
+    if not fresh and not getattr(args, "async_", False):
+        line = refresh_prompt(cwd)
+    if line:
+        print(line)
+    if not fresh and getattr(args, "async_", False):
+        _spawn_prompt_refresh(cwd)
+
+
+# ============ 全文搜索 (ctx search) ============
+
+# ASCII 单词或 CJK（中日韩）字符串；CJK 串按字符二元组切分
+_SEARCH_TOKEN = re.compile(
+    r"[0-9a-z]+|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+"
+)
+# frontmatter 中的注释行和行尾注释不参与索引（模板注释会让每个项目都匹配 paused 等词）
+_SEARCH_FRONTMATTER_NOISE = re.compile(r"^\s*#.*$|\s+#.*$|^---\s*$", re.MULTILINE)
+
+# BM25 参数
+SEARCH_BM25_K1 = 1.2
+SEARCH_BM25_B = 0.75
+
+_SEARCH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY, path TEXT UNIQUE, project TEXT,
+    mtime_ns INTEGER, size INTEGER, hash TEXT
+);
+CREATE TABLE IF NOT EXISTS units (
+    id INTEGER PRIMARY KEY, doc INTEGER, section TEXT, text TEXT, length INTEGER
+);
+CREATE INDEX IF NOT EXISTS units_doc ON units (doc);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT, unit INTEGER, tf INTEGER, length INTEGER, PRIMARY KEY (term, unit)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_unit ON postings (unit);
+CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER) WITHOUT ROWID;
+"""
+
+
+def tokenize(text: str) -> list[str]:
+    """切分为检索词：ASCII 单词（小写），CJK 串切成相邻二字组（单字串保留单字）"""
+    tokens = []
+    for match in _SEARCH_TOKEN.finditer(text.lower()):
+        run = match.group()
+        if run.isascii() or len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i : i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def iter_search_units(fh) -> Iterator[tuple[str, str]]:
+    """把 context.md 切成检索单元 (章节名, 文本)
+
+    frontmatter（去掉注释）、每个二级标题下的正文（待办、笔记等）各为一个单元，
+    每条会话记录单独成为一个单元，命中时可以直接指出是哪次会话。
+    """
+    label, parts = None, []
+    first = True
+    for heading, text in iter_session_entries(iter_sections(fh)):
+        if first and heading is None and text.startswith("---"):
+            yield "frontmatter", _SEARCH_FRONTMATTER_NOISE.sub("", text)
+            first = False
             continue
+        first = False
+        if heading is not None:
+            if parts:
+                yield label or "正文", "".join(parts)
+                parts = []
+            yield heading[4:].strip(), text
+            continue
+        if text.startswith("## "):
+            if parts:
+                yield label or "正文", "".join(parts)
+            title = text.split("\n", 1)[0][3:].strip()
+            start = next((i for i, char in enumerate(title) if char.isalnum()), 0)
+            label, parts = title[start:], [text]
+        else:
+            parts.append(text)
+    if parts:
+        yield label or "正文", "".join(parts)
+
+
+def get_search_db(workspace: Path) -> Path:
+    """搜索索引路径：workspace/.ctx/search.db"""
+    return workspace / INDEX_DIR_NAME / SEARCH_DB_NAME
+
+
+def open_search_index(workspace: Path, rebuild: bool = False):
+    """打开（必要时创建）搜索索引；版本不符或 rebuild 时丢弃重建"""
+    import sqlite3
+
+    db_file = get_search_db(workspace)
+    db_file.parent.mkdir(parents=True, exist_ok=True)
+    if rebuild:
+        db_file.unlink(missing_ok=True)
+    conn = sqlite3.connect(db_file)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SEARCH_SCHEMA)
+    row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+    if row is None or row[0] != str(SEARCH_INDEX_VERSION):
+        with conn:
+            for table in ("meta", "docs", "units", "postings", "terms"):
+                conn.execute(f"DELETE FROM {table}")
+            conn.execute("INSERT INTO meta VALUES ('version', ?)", (str(SEARCH_INDEX_VERSION),))
+    return conn
+
+
+def refresh_search_index(conn, workspace: Path) -> dict:
+    """增量更新索引：stat 未变的文件跳过，内容哈希未变只刷新 stat，其余重新切分入库
+
+    已不存在的项目会被移除，完成时间记入 meta（search_is_stale 据此判断）。
+    返回 {"indexed", "unchanged", "removed"} 计数。
+    """
+    names, _ = discover_projects(workspace)
+    known = {
+        path: (doc_id, mtime_ns, size, digest)
+        for doc_id, path, mtime_ns, size, digest in conn.execute(
+            "SELECT id, path, mtime_ns, size, hash FROM docs"
+        )
+    }
+    stats = {"indexed": 0, "unchanged": 0, "removed": 0}
+    root = str(workspace)
+    with conn:
+        for name in names:
+            # 热路径上每个项目只做一次 stat，用字符串路径避免构造 Path 对象
+            context_file = os.path.join(root, name, ".claude", "context.md")
+            try:
+                st = os.stat(context_file)
+                row = known.pop(name, None)
+                if row and row[1] == st.st_mtime_ns and row[2] == st.st_size:
+                    stats["unchanged"] += 1
+                    continue
+                with open(context_file, "rb") as fh:
+                    data = fh.read()
+            except OSError:
+                continue
 
-        if in_sessions and line.startswith("## ") and "会话" not in line and "完成" not in line:
-            in_sessions = False
+            digest = _content_hash(data)
+            if row and row[3] == digest:
+                conn.execute(
+                    "UPDATE docs SET mtime_ns = ?, size = ? WHERE id = ?",
+                    (st.st_mtime_ns, st.st_size, row[0]),
+                )
+                stats["unchanged"] += 1
+                continue
+            if row:
+                _drop_search_doc(conn, row[0])
+            try:
+                _index_search_doc(conn, name, _decode_context(data), st, digest)
+            except UnicodeDecodeError as e:
+                print(f"⚠️  警告: 无法索引 {name}/.claude/context.md: {e}", file=sys.stderr)
+                continue
+            stats["indexed"] += 1
+
+        for doc_id, *_rest in known.values():
+            _drop_search_doc(conn, doc_id)
+            stats["removed"] += 1
+
+        if stats["indexed"] or stats["removed"]:
+            count, total = conn.execute("SELECT COUNT(*), SUM(length) FROM units").fetchone()
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('units', ?)", (str(count),))
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('length', ?)", (str(total or 0),))
+            conn.execute("DELETE FROM terms WHERE df <= 0")
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('refreshed', ?)", (str(time.time()),))
+    return stats
+
+
+def search_is_stale(conn) -> bool:
+    """从未完整扫描过，或距上次扫描超过 SEARCH_REFRESH_INTERVAL 秒"""
+    row = conn.execute("SELECT value FROM meta WHERE key = 'refreshed'").fetchone()
+    return row is None or time.time() - float(row[0]) > SEARCH_REFRESH_INTERVAL
+
+
+def search_hits_unchanged(conn, workspace: Path, results: list[dict]) -> bool:
+    """命中的文件是否都与索引记录一致（只 stat 结果中的几个文件）"""
+    paths = list(dict.fromkeys(hit["path"] for hit in results))
+    placeholders = ",".join("?" * len(paths))
+    rows = conn.execute(
+        f"SELECT path, mtime_ns, size FROM docs WHERE path IN ({placeholders})", paths
+    )
+    root = str(workspace)
+    for path, mtime_ns, size in rows:
+        try:
+            st = os.stat(os.path.join(root, path, ".claude", "context.md"))
+        except OSError:
+            return False
+        if st.st_mtime_ns != mtime_ns or st.st_size != size:
+            return False
+    return True
+
+
+def _drop_search_doc(conn, doc_id: int):
+    units = "SELECT id FROM units WHERE doc = ?"
+    counts = conn.execute(
+        f"SELECT COUNT(*), term FROM postings WHERE unit IN ({units}) GROUP BY term", (doc_id,)
+    ).fetchall()
+    conn.executemany("UPDATE terms SET df = df - ? WHERE term = ?", counts)
+    conn.execute(f"DELETE FROM postings WHERE unit IN ({units})", (doc_id,))
+    conn.execute("DELETE FROM units WHERE doc = ?", (doc_id,))
+    conn.execute("DELETE FROM docs WHERE id = ?", (doc_id,))
+
+
+def _index_search_doc(conn, name: str, content: str, st, digest: str):
+    project = parse_frontmatter(content, ["project"])["project"]
+    if project == "Unknown":
+        project = name
+    doc_id = conn.execute(
+        "INSERT INTO docs (path, project, mtime_ns, size, hash) VALUES (?, ?, ?, ?, ?)",
+        (name, project, st.st_mtime_ns, st.st_size, digest),
+    ).lastrowid
+
+    postings = []
+    df: dict[str, int] = {}
+    for section, text in iter_search_units(io.StringIO(content)):
+        tokens = tokenize(text)
+        if not tokens:
             continue
+        unit_id = conn.execute(
+            "INSERT INTO units (doc, section, text, length) VALUES (?, ?, ?, ?)",
+            (doc_id, section, text, len(tokens)),
+        ).lastrowid
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        postings.extend((term, unit_id, tf, len(tokens)) for term, tf in counts.items())
+        for term in counts:
+            df[term] = df.get(term, 0) + 1
+    conn.executemany("INSERT INTO postings VALUES (?, ?, ?, ?)", postings)
+    conn.executemany(
+        "INSERT INTO terms VALUES (?, ?) ON CONFLICT (term) DO UPDATE SET df = df + excluded.df",
+        df.items(),
+    )
+
 
-        if not in_todos:
+def search_index(conn, query: str, limit: int = 10) -> list[dict]:
+    """BM25 排序检索，返回 [{"path", "project", "section", "text", "score", "terms"}]
+
+    检索词之间是“或”关系，同时命中越多、越少见的词得分越高。单个汉字展开为
+    以它开头的所有二字组。文档频率从 terms 表直接读出，倒排表中冗余保存单元长度，
+    SQLite 在一次聚合查询中完成打分和排序，不需要回表，也不在 Python 中逐条遍历高频词。
+    """
+    import math
+
+    terms = list(dict.fromkeys(tokenize(query)))
+    meta = dict(conn.execute("SELECT key, value FROM meta WHERE key IN ('units', 'length')"))
+    total_units = int(meta.get("units", 0))
+    if not terms or not total_units:
+        return []
+    avg_length = int(meta["length"]) / total_units
+
+    expanded = []
+    for term in terms:
+        if len(term) == 1 and not term.isascii():
+            expanded += [
+                row[0]
+                for row in conn.execute(
+                    "SELECT term FROM terms WHERE term >= ? AND term < ?",
+                    (term, term + "\uffff"),
+                )
+            ]
+        else:
+            expanded.append(term)
+    if not expanded:
+        return []
+
+    placeholders = ",".join("?" * len(expanded))
+    weights = []
+    for term, df in conn.execute(
+        f"SELECT term, df FROM terms WHERE term IN ({placeholders}) AND df > 0", expanded
+    ):
+        weights += [term, math.log(1 + (total_units - df + 0.5) / (df + 0.5))]
+    if not weights:
+        return []
+
+    k1, b = SEARCH_BM25_K1, SEARCH_BM25_B
+    values = ",".join(["(?, ?)"] * (len(weights) // 2))
+    rows = conn.execute(
+        f"WITH q(term, idf) AS (VALUES {values}) "
+        "SELECT p.unit, SUM(q.idf * p.tf * ? / (p.tf + ? * (1 - ? + ? * p.length / ?))) AS score "
+        "FROM q JOIN postings p ON p.term = q.term "
+        "GROUP BY p.unit ORDER BY score DESC LIMIT ?",
+        [*weights, k1 + 1, k1, b, b, avg_length, limit],
+    ).fetchall()
+    return _search_results(conn, rows, terms)
+
+
+def _search_results(conn, top: list, terms: list[str]) -> list[dict]:
+    """补全命中单元所属的项目和原文"""
+    if not top:
+        return []
+    placeholders = ",".join("?" * len(top))
+    details = {
+        unit: (path, project, section, text)
+        for unit, path, project, section, text in conn.execute(
+            "SELECT u.id, d.path, d.project, u.section, u.text FROM units u "
+            f"JOIN docs d ON d.id = u.doc WHERE u.id IN ({placeholders})",
+            [unit for unit, _ in top],
+        )
+    }
+    results = []
+    for unit, score in top:
+        path, project, section, text = details[unit]
+        results.append(
+            {
+                "path": path,
+                "project": project,
+                "section": section,
+                "text": text,
+                "score": score,
+                "terms": terms,
+            }
+        )
+    return results
+
+
+def search_snippet(text: str, terms: list[str], width: int = 60, highlight: bool = False) -> str:
+    """截取第一个命中词附近的一段文本（合并空白），highlight 时用 ANSI 粗体标出命中词"""
+    flat = " ".join(text.split())
+    lowered = flat.lower()
+    positions = [pos for pos in (lowered.find(term) for term in terms) if pos >= 0]
+    start = max(0, min(positions, default=0) - width // 3)
+    snippet = flat[start : start + width]
+    if highlight:
+        pattern = "|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True))
+        snippet = re.sub(f"({pattern})", "\033[1m\\1\033[0m", snippet, flags=re.IGNORECASE)
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if start + width < len(flat) else ""
+    return f"{prefix}{snippet}{suffix}"
+
+
+def cmd_search(args):
+    """全文搜索所有项目的 context.md（frontmatter、待办、会话记录、笔记）
+
+    直接信任索引中的记录查询，不在每次搜索前扫描整个工作区。以下情况才先增量刷新再查询：
+    --refresh / --rebuild、索引过期（SEARCH_REFRESH_INTERVAL）、没有结果、命中的文件已改动。
+    """
+    query = " ".join(args.terms)
+    workspace = get_workspace_root()
+    start = time.perf_counter()
+    conn = open_search_index(workspace, rebuild=args.rebuild)
+    try:
+        stats = None
+        if getattr(args, "refresh", False) or search_is_stale(conn):
+            stats = refresh_search_index(conn, workspace)
+        results = search_index(conn, query, args.limit)
+        if stats is None and not (results and search_hits_unchanged(conn, workspace, results)):
+            stats = refresh_search_index(conn, workspace)
+            results = search_index(conn, query, args.limit)
+    finally:
+        conn.close()
+    elapsed = (time.perf_counter() - start) * 1000
+
+    if stats and (stats["indexed"] or stats["removed"]):
+        print(
+            f"🗂️  索引更新: {stats['indexed']} 个文件重新索引，{stats['removed']} 个移除",
+            file=sys.stderr,
+        )
+    if not results:
+        print(f"🔍 没有找到 “{query}”（{elapsed:.1f} ms）")
+        return
+
+    print(f"🔍 “{query}” 的 {len(results)} 条结果（{elapsed:.1f} ms）\n")
+    highlight = sys.stdout.isatty()
+    for rank, hit in enumerate(results, 1):
+        name = hit["path"] if hit["project"] == hit["path"] else f"{hit['project']} ({hit['path']})"
+        print(f"{rank:>2}. {name} · {hit['section']}  [{hit['score']:.2f}]")
+        # 章节名已在上一行显示，摘要从标题行之后开始
+        text = hit["text"].split("\n", 1)[-1] if hit["text"].startswith("#") else hit["text"]
+        print(f"    {search_snippet(text, hit['terms'], highlight=highlight)}")
+
+
+# ============ 待办汇总 (ctx todos / ctx next) ============
+
+_TODO_ITEM = re.compile(r"\s*[-*]\s+\[([ xX])\]\s*(.*)")
+_TODO_PRIORITY = re.compile(r"#{3,}\s*(P\d+)\b", re.IGNORECASE)
+# 不在 ### P0/P1 标题下的待办排在所有优先级之后
+TODO_DEFAULT_RANK = 99
+
+
+def parse_todos(fh) -> list[dict]:
+    """从文件句柄流式提取待办区中的所有待办项
+
+    返回 [{"priority", "text", "line", "done"}]：priority 为所在的 ### P0/P1 标题
+    （不在优先级标题下时为 ""），text 为完整文本（不截断），line 为文件中的行号（从 1 开始），
+    done 表示 - [x]。只逐行处理待办区，其余章节只统计换行数。
+    """
+    todos = []
+    line_no = 1
+    for section in iter_sections(fh):
+        text = section.text
+        if section.kind == "todos":
+            priority = ""
+            for offset, line in enumerate(text.split("\n")):
+                if line.startswith("#"):
+                    match = _TODO_PRIORITY.match(line)
+                    priority = match.group(1).upper() if match else ""
+                    continue
+                match = _TODO_ITEM.match(line)
+                if match and match.group(2).strip():
+                    todos.append(
+                        {
+                            "priority": priority,
+                            "text": match.group(2).strip(),
+                            "line": line_no + offset,
+                            "done": match.group(1) != " ",
+                        }
+                    )
+        line_no += text.count("\n")
+    return todos
+
+
+def count_open_todos(context_file: Path) -> int:
+    """统计 context.md 中未完成的待办项数"""
+    with open(context_file, encoding="utf-8") as fh:
+        return sum(not todo["done"] for todo in parse_todos(fh))
+
+
+def get_todos_index_file(workspace: Path) -> Path:
+    """待办索引路径：workspace/.ctx/todos.json"""
+    return workspace / INDEX_DIR_NAME / TODOS_INDEX_NAME
+
+
+def load_todos_index(workspace: Path) -> dict:
+    """读取待办索引，文件缺失、损坏或版本不符时返回空索引"""
+    try:
+        raw = json.loads(get_todos_index_file(workspace).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        raw = None
+    if not isinstance(raw, dict) or raw.get("version") != TODOS_INDEX_VERSION:
+        return {"entries": {}, "dirty": False}
+    return {"entries": raw.get("entries") or {}, "dirty": False}
+
+
+def _read_indexed_todos(index: dict, key: str, context_file: Path) -> tuple[dict, bool]:
+    """通过待办索引读取一个项目的待办，返回 (条目, 是否需要写回)
+
+    与工作区索引相同的校验方式：mtime_ns 和大小未变时直接使用缓存；否则读取全文并比较哈希，
+    哈希一致只刷新 stat 信息，不一致才重新解析。不修改索引（可在工作线程中调用）。
+    """
+    started = time.perf_counter()
+    st = context_file.stat()
+    profile_add("stat", started, 1)
+    entry = index["entries"].get(key)
+    if entry and entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size:
+        telemetry_file(True, st.st_size)
+        return entry, False
+
+    started = time.perf_counter()
+    data = context_file.read_bytes()
+    digest = _content_hash(data)
+    profile_add("read", started, 1)
+    if entry and entry["hash"] == digest:
+        telemetry_file(True, st.st_size)
+        return {**entry, "mtime_ns": st.st_mtime_ns, "size": st.st_size}, True
+
+    started = time.perf_counter()
+    content = _decode_context(data)
+    info = parse_frontmatter(content, ["project", "status", "last_session"])
+    todos = parse_todos(io.StringIO(content))
+    profile_add("parse", started, 1)
+    telemetry_file(False, st.st_size)
+    entry = {
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+        "hash": digest,
+        "project": info["project"],
+        "status": _field_value(info, "status"),
+        "last_session": info["last_session"],
+        "todos": todos,
+    }
+    return entry, True
+
+
+def load_todos(jobs: int | None = None) -> list[dict]:
+    """汇总工作区中所有项目的待办
+
+    每条记录包含 project、path、status（项目状态）、last_session 以及 parse_todos 的字段。
+    解析结果缓存在 workspace/.ctx/todos.json，未变化的文件只需 stat 一次。
+    """
+    started = time.perf_counter()
+    workspace = get_workspace_root()
+    names, discover_stats = discover_projects(workspace)
+    profile_add("discover", started, discover_stats["visited"])
+    telemetry_set(projects=len(names))
+
+    started = time.perf_counter()
+    index = load_todos_index(workspace)
+    profile_add("index", started)
+
+    def load(name):
+        try:
+            return _read_indexed_todos(index, name, workspace / name / ".claude" / "context.md")
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            return e
+
+    todos = []
+    entries = {}
+    for name, result in zip(names, _map_jobs(load, names, resolve_jobs(jobs))):
+        if result is None:
+            continue
+        if isinstance(result, Exception):
+            print(f"⚠️  警告: 无法读取 {name}/.claude/context.md: {result}", file=sys.stderr)
             continue
+        entry, changed = result
+        entries[name] = entry
+        index["dirty"] |= changed
+        project = name if entry["project"] == "Unknown" else entry["project"]
+        for todo in entry["todos"]:
+            todos.append(
+                {
+                    "project": project,
+                    "path": name,
+                    "status": entry["status"],
+                    "last_session": entry["last_session"],
+                    **todo,
+                }
+            )
 
-        if "- [ ]" in line:
-            todo_text = line.split("- [ ]")[1].strip()[:60]
-            result["todos"].append(todo_text)
-        elif "- [x]" in line:
-            # 已完成的待办，不加入待办列表
+    if index["dirty"] or entries.keys() != index["entries"].keys():
+        started = time.perf_counter()
+        try:
+            get_todos_index_file(workspace).parent.mkdir(exist_ok=True)
+            _write_json_atomic(
+                get_todos_index_file(workspace),
+                {"version": TODOS_INDEX_VERSION, "entries": entries},
+            )
+        except OSError:
             pass
-        elif line.strip().startswith("### P"):
-            prio = line.strip().replace("### ", "")
-            result["todos"].append(f"【{prio}】")
+        profile_add("index", started)
+    return todos
 
-    # 检测格式版本
-    if result["created"] != "Unknown" and result["status"] in ["active", "paused", "completed"]:
-        result["format_version"] = "v2"
-    elif result["project_type"] or result["session_count"] > 0 or result["branch"]:
-        result["format_version"] = "v1"
+
+def filter_todos(
+    todos: list[dict],
+    priorities: list[str] | None = None,
+    statuses: list[str] | None = None,
+    done: bool = False,
+) -> list[dict]:
+    """按优先级（P0、P1…，"-" 表示无优先级）和项目状态筛选；done 为 False 时排除已完成项"""
+    if priorities:
+        wanted = {"" if p == "-" else p.upper() for p in priorities}
+        todos = [todo for todo in todos if todo["priority"] in wanted]
+    if statuses:
+        todos = [todo for todo in todos if todo["status"] in statuses]
+    if not done:
+        todos = [todo for todo in todos if not todo["done"]]
+    return todos
+
+
+def _priority_rank(priority: str) -> int:
+    return int(priority[1:]) if priority else TODO_DEFAULT_RANK
+
+
+def _todo_rank(todo: dict) -> tuple:
+    """排序键：优先级 > 最近工作过的项目（last_session 越新越靠前）> 路径 > 行号"""
+    day = todo["last_session"].replace("-", "")
+    recency = -int(day) if day.isdigit() else 0
+    return (_priority_rank(todo["priority"]), recency, todo["path"], todo["line"])
+
+
+def next_todos(todos: list[dict], limit: int = 5) -> list[dict]:
+    """用堆从所有进行中项目的未完成待办里选出最优先的 limit 项（O(n log limit)）"""
+    import heapq
+
+    candidates = (todo for todo in todos if todo["status"] == "active" and not todo["done"])
+    return heapq.nsmallest(limit, candidates, key=_todo_rank)
+
+
+def _split_option_values(values: list[str] | None) -> list[str]:
+    """展开可重复且可逗号分隔的选项（--priority P0,P1 --priority P2）"""
+    return [value for item in values or [] for value in item.split(",") if value]
+
+
+def cmd_todos(args):
+    """汇总所有项目的待办，按项目分组、组内按优先级排列"""
+    todos = filter_todos(
+        load_todos(jobs=args.jobs),
+        priorities=_split_option_values(args.priority),
+        statuses=_split_option_values(args.status),
+        done=args.done,
+    )
+    started = time.perf_counter()
+    if not todos:
+        print("📭 没有符合条件的待办")
+        return
+
+    groups: dict = {}
+    for todo in todos:
+        groups.setdefault(todo["path"], []).append(todo)
+    print(f"\n📋 待办汇总 ({len(todos)} 项，{len(groups)} 个项目)\n")
+    for path in sorted(groups):
+        items = sorted(groups[path], key=lambda t: (_priority_rank(t["priority"]), t["line"]))
+        first = items[0]
+        icon = STATUS_ICONS.get(first["status"], STATUS_ICONS["unknown"])
+        name = path if first["project"] == path else f"{first['project']} ({path})"
+        print(f"{icon} {name}")
+        for todo in items:
+            mark = "✅" if todo["done"] else "  "
+            print(f"   {mark} {todo['priority'] or '--':<3} {todo['text']}  :{todo['line']}")
+        print()
+    profile_add("render", started)
+
+
+def cmd_next(args):
+    """跨所有进行中的项目给出接下来最该做的 N 项待办"""
+    todos = next_todos(load_todos(jobs=args.jobs), args.limit)
+    started = time.perf_counter()
+    if not todos:
+        print("🎉 进行中的项目没有未完成的待办")
+        return
+
+    print(f"🎯 接下来 ({len(todos)} 项)\n")
+    for rank, todo in enumerate(todos, 1):
+        location = f"{todo['path']}/.claude/context.md:{todo['line']}"
+        print(f"{rank:>2}. {todo['priority'] or '--':<3} {todo['project']} · {todo['text']}")
+        print(f"       {location}")
+    profile_add("render", started)
+
+
+# ============ 模糊匹配 (ctx switch) ============
+
+# 模板中的 brief 占位文本，不参与匹配（否则所有新项目都会命中“描述”“项目”等词）
+_TEMPLATE_BRIEF = "请用一句话描述这个项目的目标"
+# brief 只作为补充，命中的三字组按该权重计分（目录名和 project 字段为 1）
+TRIGRAM_BRIEF_WEIGHT = 0.5
+# 低于该得分的项目不作为候选；最佳候选领先第二名至少 SWITCH_MARGIN 时直接选中
+SWITCH_MIN_SCORE = 0.3
+SWITCH_MARGIN = 0.2
+
+
+_NAME_SEPARATORS = re.compile(r"[\s_\-./]+")
+
+
+def _normalize_name(text: str) -> str:
+    """小写，空白和 - _ . / 等分隔符统一为单个空格（podcast-app 与 "Podcast App" 等价）"""
+    return _NAME_SEPARATORS.sub(" ", text.lower()).strip()
+
+
+def trigrams(text: str) -> set[str]:
+    """规范化后在两侧补空格切分为三字组（短名称和词首也能匹配）"""
+    text = _normalize_name(text)
+    if not text:
+        return set()
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def get_trigram_file(workspace: Path) -> Path:
+    """三字组索引路径：与工作区索引同目录的 trigrams.json"""
+    return workspace / INDEX_DIR_NAME / TRIGRAM_FILE_NAME
+
+
+def build_trigram_index(entries: dict, source: list | None = None) -> dict:
+    """由工作区索引条目生成三字组倒排表
+
+    projects 为 [路径, project 字段, brief] 列表；names / briefs 分别是目录名与 project 字段、
+    brief 的倒排表 {三字组: "项目编号 项目编号 ..."}。倒排列表存为字符串，
+    加载时 JSON 解析很快，查询时只展开用到的几个三字组。
+    source 记录生成时工作区索引文件的 (mtime_ns, size)，用于判断是否过期。
+    """
+    projects = []
+    names: dict = {}
+    briefs: dict = {}
+    for doc_id, (path, entry) in enumerate(sorted(entries.items())):
+        info = entry["info"]
+        project = "" if info.get("project", "") == "Unknown" else info.get("project", "")
+        brief = "" if info.get("brief", "") == _TEMPLATE_BRIEF else info.get("brief", "")
+        projects.append([path, project, brief])
+        for gram in trigrams(path) | trigrams(project):
+            names.setdefault(gram, []).append(str(doc_id))
+        for gram in trigrams(brief):
+            briefs.setdefault(gram, []).append(str(doc_id))
+    return {
+        "version": TRIGRAM_INDEX_VERSION,
+        "source": source,
+        "projects": projects,
+        "names": {gram: " ".join(ids) for gram, ids in names.items()},
+        "briefs": {gram: " ".join(ids) for gram, ids in briefs.items()},
+    }
+
+
+def _index_file_signature(workspace: Path) -> list | None:
+    try:
+        st = get_index_file(workspace).stat()
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def load_trigram_index(workspace: Path) -> dict | None:
+    """读取三字组索引；与工作区索引文件不一致时由索引条目重建并写回
+
+    只在重建时才解析 index.json，命中时只需 stat 一次索引文件并读取 trigrams.json。
+    工作区索引不存在时返回 None。
+    """
+    source = _index_file_signature(workspace)
+    if source is None:
+        return None
+    trigram_file = get_trigram_file(workspace)
+    try:
+        cached = json.loads(trigram_file.read_text(encoding="utf-8"))
+        if cached.get("version") == TRIGRAM_INDEX_VERSION and cached.get("source") == source:
+            return cached
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    import contextlib
+
+    started = time.perf_counter()
+    trigram_index = build_trigram_index(load_index(workspace)["entries"], source)
+    with contextlib.suppress(OSError):
+        _write_json_atomic(trigram_file, trigram_index)
+    profile_add("index", started, len(trigram_index["projects"]))
+    return trigram_index
+
+
+def rank_projects(query: str, trigram_index: dict, limit: int = 10) -> list[tuple]:
+    """按三字组命中率为项目打分，返回 [(得分, 项目路径)]（降序）
+
+    得分 = 命中的查询三字组权重之和 / 查询三字组数，再加上名称奖励：
+    目录名或 project 与查询完全相同 +2，以查询开头 +0.5，包含查询 +0.25。
+    """
+    query_grams = trigrams(query)
+    if not query_grams:
+        return []
+    projects = trigram_index["projects"]
+    scores: dict = {}
+    for gram in query_grams:
+        hits = set(trigram_index["names"].get(gram, "").split())
+        for doc_id in hits:
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0
+        for doc_id in trigram_index["briefs"].get(gram, "").split():
+            if doc_id not in hits:
+                scores[doc_id] = scores.get(doc_id, 0.0) + TRIGRAM_BRIEF_WEIGHT
+
+    needle = _normalize_name(query)
+    if len(needle) < 3:
+        # 一两个字符的查询只有含补位空格的三字组，无法匹配词中间（如 brief 中的“音频”），
+        # 补充一次子串扫描，按最低得分计入
+        for doc_id, fields in enumerate(projects):
+            if str(doc_id) not in scores and needle in _normalize_name("\n".join(fields)):
+                scores[str(doc_id)] = SWITCH_MIN_SCORE * len(query_grams)
+
+    ranked = []
+    for doc_id, hits in scores.items():
+        score = hits / len(query_grams)
+        if score < SWITCH_MIN_SCORE:
+            continue
+        path, project, _brief = projects[int(doc_id)]
+        names = {_normalize_name(name) for name in (path, path.rsplit("/", 1)[-1], project)}
+        if needle in names:
+            score += 2.0
+        elif any(name.startswith(needle) for name in names):
+            score += 0.5
+        elif any(needle in name for name in names):
+            score += 0.25
+        ranked.append((score, path))
+    ranked.sort(key=lambda item: (-item[0], item[1]))
+    return ranked[:limit]
+
+
+def resolve_project(query: str, workspace: Path) -> tuple[str | None, list[tuple]]:
+    """把模糊或不完整的项目名解析为项目路径
+
+    直接使用工作区索引中的条目（不 stat 每个项目）；索引不存在或没有候选时
+    通过 list_projects 刷新索引后再匹配一次。返回 (选中的路径或 None, 排名候选列表)：
+    只有一个候选，或最佳候选领先第二名至少 SWITCH_MARGIN 时视为唯一匹配。
+    """
+    if os.environ.get("CTX_NO_INDEX"):
+        entries = {p["path"]: {"info": p} for p in list_projects()}
+        ranked = rank_projects(query, build_trigram_index(entries))
     else:
-        result["format_version"] = "mixed"
+        trigram_index = load_trigram_index(workspace)
+        ranked = rank_projects(query, trigram_index) if trigram_index else []
+        if not ranked:
+            # 索引不存在或已过期（如新建的项目还没被 ctx ls 记录）：刷新后再匹配一次
+            list_projects()
+            trigram_index = load_trigram_index(workspace)
+            ranked = rank_projects(query, trigram_index) if trigram_index else []
+
+    if len(ranked) == 1 or (ranked and ranked[0][0] - ranked[1][0] >= SWITCH_MARGIN):
+        return ranked[0][1], ranked
+    return None, ranked
+
+
+# ============ 访问频率 (frecency) ============
+
+
+def get_frecency_files() -> tuple[Path, Path]:
+    """访问记录路径：(压缩后的快照 frecency.json, 追加写入的日志 frecency.log)"""
+    cache_dir = get_user_cache_dir()
+    return cache_dir / FRECENCY_FILE_NAME, cache_dir / FRECENCY_LOG_NAME
+
+
+def record_visit(path: Path, now: float | None = None):
+    """追加一条访问记录（"时间戳<TAB>绝对路径"），不读取也不重写已有记录
+
+    与 shell-integration.sh 中 go 函数写入的格式相同（路径解析符号链接，对应 pwd -P）；
+    以 O_APPEND 单次写入，并发调用不会交错。
+    """
+    _snapshot, log_file = get_frecency_files()
+    line = f"{int(time.time() if now is None else now)}\t{os.path.realpath(path)}\n"
+    try:
+        log_file.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(log_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            os.write(fd, line.encode("utf-8"))
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
+def _decay(score: float, since: float, now: float) -> float:
+    """按半衰期做指数衰减"""
+    return score * 0.5 ** (max(now - since, 0.0) / FRECENCY_HALF_LIFE)
+
+
+def _replay_visits(scores: dict, log_file: Path):
+    """把日志中的访问合并进 {路径: [最近访问时的得分, 最近访问时间]}，每次访问 +1"""
+    try:
+        with open(log_file, encoding="utf-8", errors="replace") as fh:
+            lines = fh.read().splitlines()
+    except OSError:
+        return
+    for line in lines:
+        stamp, _, path = line.partition("\t")
+        if not path or not stamp.isdigit():
+            continue
+        ts = int(stamp)
+        score, last = scores.get(path, (0.0, ts))
+        if ts >= last:
+            scores[path] = [_decay(score, last, ts) + 1.0, ts]
+        else:
+            # 乱序的旧记录（并发写入）按其发生时间折算到最近一次访问
+            scores[path] = [score + _decay(1.0, ts, last), last]
+
+
+def load_frecency(now: float | None = None) -> dict[str, float]:
+    """读取所有路径当前的 frecency 得分 {绝对路径: 得分}
+
+    得分 = Σ 0.5 ** (距今时间 / FRECENCY_HALF_LIFE)，每次访问贡献 1。快照中每个路径只保存
+    (最近访问时的得分, 最近访问时间)，衰减在读取时计算，因此老化不需要改写文件。
+    日志超过 FRECENCY_LOG_MAX_BYTES 时压缩：先把日志改名（之后的访问写入新日志），
+    合并进快照，丢弃得分低于 FRECENCY_MIN_SCORE 的路径并最多保留 FRECENCY_MAX_ENTRIES 个，
+    原子写回快照后删除旧日志（写入失败时把旧日志追加回当前日志）。读取和压缩都是对记录数的单遍处理。
+    """
+    now = time.time() if now is None else now
+    snapshot_file, log_file = get_frecency_files()
+    try:
+        raw = json.loads(snapshot_file.read_text(encoding="utf-8"))
+        scores = dict(raw["scores"]) if raw.get("version") == FRECENCY_VERSION else {}
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        scores = {}
+
+    try:
+        compact = log_file.stat().st_size > FRECENCY_LOG_MAX_BYTES
+    except OSError:
+        compact = False
+    source = log_file
+    if compact:
+        source = log_file.with_name(f"{log_file.name}.{os.getpid()}")
+        try:
+            os.replace(log_file, source)
+        except OSError:
+            compact, source = False, log_file
+    _replay_visits(scores, source)
+
+    current = {path: _decay(score, last, now) for path, (score, last) in scores.items()}
+    if compact:
+        import heapq
+
+        keep = [path for path, score in current.items() if score >= FRECENCY_MIN_SCORE]
+        if len(keep) > FRECENCY_MAX_ENTRIES:
+            keep = heapq.nlargest(FRECENCY_MAX_ENTRIES, keep, key=current.__getitem__)
+        try:
+            _write_json_atomic(
+                snapshot_file,
+                {"version": FRECENCY_VERSION, "scores": {path: scores[path] for path in keep}},
+            )
+        except OSError:
+            _requeue_visits(source, log_file)
+        else:
+            import contextlib
+
+            with contextlib.suppress(OSError):
+                source.unlink()
+        current = {path: current[path] for path in keep}
+    return current
+
+
+def _requeue_visits(source: Path, log_file: Path):
+    """快照写入失败时把改名的日志追加回当前日志，下次读取时重新计入（追加不会覆盖期间的新访问）"""
+    try:
+        data = source.read_bytes()
+        with open(log_file, "ab") as fh:
+            fh.write(data)
+        source.unlink()
+    except OSError:
+        pass
+
+
+def rank_recent_projects(workspace: Path, now: float | None = None) -> list[tuple[float, str]]:
+    """workspace 下有访问记录的项目，按 frecency 降序返回 [(得分, 相对路径)]
+
+    路径都解析符号链接后再比较，经由链接和真实路径记录的访问合并为同一个项目
+    （兼容旧版 go 函数记录的逻辑路径）。
+    """
+    root = os.path.realpath(workspace)
+    scores: dict[str, float] = {}
+    for path, score in load_frecency(now).items():
+        path = os.path.realpath(path)
+        rel = os.path.relpath(path, root)
+        if rel == "." or rel.startswith(".."):
+            continue
+        if os.path.isfile(os.path.join(path, ".claude", "context.md")):
+            rel = rel.replace(os.sep, "/")
+            scores[rel] = scores.get(rel, 0.0) + score
+    ranked = [(score, rel) for rel, score in scores.items()]
+    ranked.sort(key=lambda item: (-item[0], item[1]))
+    return ranked
+
+
+# ============ Git 信息（不启动 git 进程） ============
+
+_REFLOG_TAIL_BYTES = 4096
+_COMMITTER_TIME = re.compile(rb"^committer .* (\d+) [+-]\d{4}$", re.MULTILINE)
+
+
+def _read_text(path: str) -> str | None:
+    try:
+        with open(path, encoding="utf-8", errors="replace") as fh:
+            return fh.read()
+    except OSError:
+        return None
+
+
+def _mtime_ns(path: str) -> int | None:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def find_git_dirs(project: Path) -> tuple[str, str, list[str]] | None:
+    """定位项目根目录的 git 目录，返回 (gitdir, commondir, 读取过的文件)
+
+    .git 是目录时两者相同；.git 是文件（worktree、子模块）时按 "gitdir: <路径>" 跳转，
+    worktree 的 gitdir 中 commondir 文件指向主仓库（refs、packed-refs 所在位置）。
+    """
+    dot_git = os.path.join(project, ".git")
+    if os.path.isdir(dot_git):
+        return dot_git, dot_git, []
+    content = _read_text(dot_git)
+    if content is None or not content.startswith("gitdir:"):
+        return None
+    gitdir = os.path.normpath(os.path.join(project, content[7:].strip()))
+    common = _read_text(os.path.join(gitdir, "commondir"))
+    commondir = os.path.normpath(os.path.join(gitdir, common.strip())) if common else gitdir
+    return gitdir, commondir, [dot_git]
+
+
+def _resolve_ref(gitdir: str, commondir: str, ref: str, files: list[str]) -> tuple[str, str]:
+    """依次查找松散引用文件（worktree 私有的在 gitdir，分支在 commondir）和 packed-refs
+
+    返回 (提交哈希, 找到它的文件)，找不到时为 ("", "")。
+    """
+    for base in dict.fromkeys((gitdir, commondir)):
+        path = os.path.join(base, ref)
+        files.append(path)
+        sha = (_read_text(path) or "").strip()
+        if len(sha) >= 40:
+            return sha, path
+    packed = os.path.join(commondir, "packed-refs")
+    files.append(packed)
+    for line in (_read_text(packed) or "").splitlines():
+        sha, _, name = line.partition(" ")
+        if name == ref:
+            return sha, packed
+    return "", ""
+
+
+def _reflog_time(path: str) -> int | None:
+    """读取 reflog 最后一条记录的时间戳（只读文件末尾）"""
+    try:
+        with open(path, "rb") as fh:
+            fh.seek(0, os.SEEK_END)
+            fh.seek(max(fh.tell() - _REFLOG_TAIL_BYTES, 0))
+            lines = fh.read().rstrip(b"\n").rsplit(b"\n", 1)
+    except OSError:
+        return None
+    # <旧 sha> <新 sha> <姓名> <邮箱> <时间戳> <时区>\t<说明>
+    fields = lines[-1].split(b"\t", 1)[0].split()
+    return int(fields[-2]) if len(fields) >= 2 and fields[-2].isdigit() else None
+
+
+def _loose_commit_time(commondir: str, sha: str) -> int | None:
+    """从松散对象读取提交时间（打包的对象不解析）"""
+    import zlib
+
+    try:
+        with open(os.path.join(commondir, "objects", sha[:2], sha[2:]), "rb") as fh:
+            data = zlib.decompressobj().decompress(fh.read(), 4096)
+    except (OSError, zlib.error):
+        return None
+    match = _COMMITTER_TIME.search(data)
+    return int(match.group(1)) if match else None
+
+
+def read_git_info(project: Path) -> dict | None:
+    """直接读取 .git 中的文件得到当前分支和最近提交时间，不是 git 仓库时返回 None
+
+    返回 {"branch", "detached", "commit", "last_commit", "files"}：
+    - branch 来自 HEAD；分离 HEAD 时为提交的短哈希，detached 为 True
+    - commit 由松散引用文件或 packed-refs 解析
+    - last_commit 依次取分支 reflog、HEAD reflog 最后一条记录的时间，
+      没有 reflog 时读取松散提交对象，再退回引用文件的 mtime（秒，无法确定时为 0）
+    - files 为决定分支和提交的文件（含不存在的），用于按 mtime 校验缓存
+    """
+    dirs = find_git_dirs(project)
+    if dirs is None:
+        return None
+    gitdir, commondir, files = dirs
+    head_file = os.path.join(gitdir, "HEAD")
+    files.append(head_file)
+    head = (_read_text(head_file) or "").strip()
+
+    if head.startswith("ref:"):
+        ref = head[4:].strip()
+        branch = ref[len("refs/heads/") :] if ref.startswith("refs/heads/") else ref
+        commit, ref_file = _resolve_ref(gitdir, commondir, ref, files)
+        reflogs = [os.path.join(commondir, "logs", ref), os.path.join(gitdir, "logs", "HEAD")]
+        detached = False
+    else:
+        commit, ref_file, detached = head, head_file, True
+        branch = head[:7]
+        reflogs = [os.path.join(gitdir, "logs", "HEAD")]
+
+    # reflog 不加入 files：提交、切换分支时引用文件或 HEAD 总会一起被改写，少 stat 一次
+    last_commit = None
+    for reflog in reflogs:
+        last_commit = _reflog_time(reflog)
+        if last_commit:
+            break
+    if not last_commit and commit:
+        last_commit = _loose_commit_time(commondir, commit)
+    if not last_commit and ref_file:
+        last_commit = (_mtime_ns(ref_file) or 0) // 1_000_000_000
+
+    return {
+        "branch": branch,
+        "detached": detached,
+        "commit": commit,
+        "last_commit": last_commit or 0,
+        "files": files,
+    }
+
+
+def get_git_cache_file(workspace: Path) -> Path:
+    """Git 信息缓存：workspace/.ctx/git.json"""
+    return workspace / INDEX_DIR_NAME / GIT_CACHE_NAME
 
+
+def load_git_cache(workspace: Path) -> dict:
+    """读取 Git 信息缓存 {"entries": {项目绝对路径: 信息}, "dirty"}"""
+    try:
+        raw = json.loads(get_git_cache_file(workspace).read_text(encoding="utf-8"))
+        if raw.get("version") == GIT_CACHE_VERSION:
+            return {"entries": raw["entries"], "dirty": False}
+    except (OSError, ValueError, KeyError, AttributeError):
+        pass
+    return {"entries": {}, "dirty": False}
+
+
+def save_git_cache(workspace: Path, cache: dict):
+    """有变化时原子写回缓存（失败时静默跳过）"""
+    if not cache["dirty"]:
+        return
+    try:
+        get_git_cache_file(workspace).parent.mkdir(exist_ok=True)
+        _write_json_atomic(
+            get_git_cache_file(workspace),
+            {"version": GIT_CACHE_VERSION, "entries": cache["entries"]},
+        )
+        cache["dirty"] = False
+    except OSError:
+        pass
+
+
+def cached_git_info(project: Path, cache: dict) -> dict | None:
+    """带缓存的 read_git_info：读取过的文件 mtime 都未变化时直接使用缓存
+
+    不是仓库的项目只缓存 .git 的 mtime（None 表示不存在），建仓后自动失效。
+    """
+    key = str(project)
+    entry = cache["entries"].get(key)
+    if entry and all(_mtime_ns(path) == mtime for path, mtime in entry["sig"]):
+        return entry["info"]
+
+    info = read_git_info(project)
+    watched = info["files"] if info else [os.path.join(project, ".git")]
+    sig = [[path, _mtime_ns(path)] for path in dict.fromkeys(watched)]
+    if info:
+        info = {key: value for key, value in info.items() if key != "files"}
+    cache["entries"][key] = {"sig": sig, "info": info}
+    cache["dirty"] = True
+    return info
+
+
+def with_git_info(info: dict, git: dict | None) -> dict:
+    """用实时的分支覆盖 frontmatter 中的 branch，并附加 last_commit（返回新字典）"""
+    if git is None:
+        return info
+    return dict(info, branch=git["branch"], last_commit=git["last_commit"])
+
+
+def sync_branch(context_file: Path, git: dict | None) -> bool:
+    """把检测到的分支写回 frontmatter 的 branch 字段（分离 HEAD 或已一致时跳过）"""
+    if not git or git["detached"] or not git["branch"]:
+        return False
+    current = read_frontmatter(context_file, ["branch"])
+    if _field_value(current, "branch") == git["branch"]:
+        return False
+    edit_frontmatter(context_file, {"branch": git["branch"]})
+    return True
+
+
+def attach_git_info(projects: list[dict], workspace: Path, sync: bool = False) -> list[dict]:
+    """为 list_projects 的结果附加实时分支和最近提交时间（sync 时同时写回 frontmatter）
+
+    缓存中已不在项目列表里的条目会被移除。
+    """
+    if os.environ.get("CTX_NO_GIT"):
+        return projects
+    started = time.perf_counter()
+    cache = load_git_cache(workspace)
+    result = []
+    seen = set()
+    for info in projects:
+        project = workspace / info["path"]
+        seen.add(str(project))
+        git = cached_git_info(project, cache)
+        if sync and sync_branch(project / ".claude" / "context.md", git):
+            print(f"🔀 {info['path']}: branch → {git['branch']}", file=sys.stderr)
+        result.append(with_git_info(info, git))
+    stale = [key for key in cache["entries"] if key not in seen]
+    for key in stale:
+        del cache["entries"][key]
+    cache["dirty"] |= bool(stale)
+    save_git_cache(workspace, cache)
+    profile_add("git", started, len(projects))
     return result
 
 
+def project_git_info(
+    info: dict,
+    context_file: Path,
+    workspace: Path | None = None,
+    sync: bool = False,
+    sig: list | None = None,
+) -> dict:
+    """为单个项目（ctx / ctx status / ctx prompt）附加实时分支，与 ctx ls 共用缓存
+
+    传入 sig 列表时收集缓存校验用的 [文件, mtime_ns]（ctx prompt 据此判断缓存是否过期）。
+    项目不在工作区内时不读写工作区的缓存，也不会在别处创建 .ctx。
+    """
+    if os.environ.get("CTX_NO_GIT"):
+        return info
+    started = time.perf_counter()
+    workspace = workspace or get_workspace_root()
+    project = context_file.parent.parent
+    inside = workspace in project.parents
+    cache = load_git_cache(workspace) if inside else {"entries": {}, "dirty": False}
+    git = cached_git_info(project, cache)
+    if sig is not None:
+        sig.extend(cache["entries"][str(project)]["sig"])
+    if sync and sync_branch(context_file, git):
+        print(f"🔀 branch → {git['branch']}", file=sys.stderr)
+    if inside:
+        save_git_cache(workspace, cache)
+    profile_add("git", started, 1)
+    return with_git_info(info, git)
+
+
+# ============ 性能剖析 (--profile) ============
+
+# 开启剖析后为 {"start", "samples": [(阶段, 秒, 文件数)], "pstats", "profiler", "memory"}
+_PROFILE = None
+
+# 报告中各阶段的顺序（discover 包括 get_workspace_root、项目发现和 context.md 查找）
+PROFILE_PHASES = ("discover", "index", "stat", "read", "parse", "git", "daemon", "render")
+
+
+def start_profile(pstats_path: str = "", memory: bool = False):
+    """开启剖析，记录各阶段耗时
+
+    pstats_path 非空时同时运行 cProfile；memory 为 True 时用 tracemalloc 记录内存峰值。
+    """
+    global _PROFILE
+    _PROFILE = {
+        "start": time.perf_counter(),
+        "samples": [],
+        "pstats": pstats_path,
+        "profiler": None,
+        "memory": memory,
+    }
+    if memory:
+        import tracemalloc
+
+        tracemalloc.start()
+    if pstats_path:
+        import cProfile
+
+        _PROFILE["profiler"] = cProfile.Profile()
+        _PROFILE["profiler"].enable()
+
+
+def profile_add(phase: str, started: float, files: int = 0):
+    """记录一个阶段从 started（time.perf_counter()）到现在的耗时；未开启剖析时不做任何事
+
+    list.append 是原子的，可在 list_projects 的工作线程中调用。
+    """
+    if _PROFILE is not None:
+        _PROFILE["samples"].append((phase, time.perf_counter() - started, files))
+
+
+def finish_profile():
+    """停止剖析并在 stderr 输出各阶段耗时、文件数，以及可选的 cProfile 文件和内存峰值"""
+    global _PROFILE
+    profile, _PROFILE = _PROFILE, None
+    if profile is None:
+        return
+    if profile["profiler"] is not None:
+        profile["profiler"].disable()
+        profile["profiler"].dump_stats(profile["pstats"])
+    total = time.perf_counter() - profile["start"]
+
+    phases = {}
+    for phase, seconds, files in profile["samples"]:
+        spent, count = phases.get(phase, (0.0, 0))
+        phases[phase] = (spent + seconds, count + files)
+
+    err = sys.stderr
+    print(f"\n⏱️  ctx 剖析: 总耗时 {total * 1000:.2f} ms（自 main 开始）", file=err)
+    for phase in PROFILE_PHASES:
+        if phase in phases:
+            spent, count = phases[phase]
+            unit = {"discover": "个目录", "git": "个项目"}.get(phase, "个文件")
+            detail = f"  {count} {unit}" if count else ""
+            print(f"   {phase:<9}{spent * 1000:>10.2f} ms{detail}", file=err)
+    other = total - sum(spent for spent, _ in phases.values())
+    print(f"   {'other':<9}{max(other, 0.0) * 1000:>10.2f} ms  参数解析、按需导入、写入等", file=err)
+    if phases.keys() & {"stat", "read", "parse"}:
+        print("   (stat/read/parse 为逐文件累计，--jobs > 1 时可能超过总耗时)", file=err)
+    if "daemon" in phases:
+        print("   结果来自 ctxd，设置 CTX_NO_DAEMON=1 可剖析直接模式", file=err)
+    if profile["memory"]:
+        import tracemalloc
+
+        _current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"   内存峰值: {peak / 1024:.1f} KiB (tracemalloc)", file=err)
+    if profile["pstats"]:
+        print(f"   cProfile: {profile['pstats']}（python -m pstats 查看）", file=err)
+
+
+def _extract_profile_args(argv: list[str]) -> tuple[list[str], str | None, bool]:
+    """从参数中取出 --profile[=FILE.pstats] 和 --profile-memory（可出现在任意位置）
+
+    也读取 CTX_PROFILE（1 表示只统计阶段耗时，其他值视为 .pstats 路径）和 CTX_PROFILE_MEMORY。
+    返回 (剩余参数, 剖析设置或 None, 是否统计内存)。
+    """
+    profile = os.environ.get("CTX_PROFILE") or None
+    memory = bool(os.environ.get("CTX_PROFILE_MEMORY"))
+    rest = []
+    for arg in argv:
+        if arg == "--profile" or arg.startswith("--profile="):
+            profile = arg.partition("=")[2] or profile or "1"
+        elif arg == "--profile-memory":
+            memory = True
+            profile = profile or "1"
+        else:
+            rest.append(arg)
+    if memory and not profile:
+        profile = "1"
+    return rest, profile, memory
+
+
+# ============ 本地遥测 (CTX_TELEMETRY) ============
+
+# 开启遥测后为 {"start", "cmd", "projects", "daemon", "files": [(是否命中缓存, 文件大小)]}
+_TELEMETRY = None
+
+
+def get_telemetry_file() -> Path:
+    """遥测文件路径（CTX_TELEMETRY_FILE，默认 ~/.cache/ctx/telemetry.jsonl）"""
+    override = os.environ.get("CTX_TELEMETRY_FILE")
+    return Path(override) if override else get_user_cache_dir() / TELEMETRY_FILE_NAME
+
+
+def start_telemetry(argv: list[str]) -> bool:
+    """CTX_TELEMETRY 开启时开始记录本次调用，返回是否开启"""
+    global _TELEMETRY
+    if not os.environ.get("CTX_TELEMETRY"):
+        return False
+    command = argv[0] if argv and not argv[0].startswith("-") else "show"
+    if command == "telemetry":
+        return False
+    _TELEMETRY = {
+        "start": time.perf_counter(),
+        "cmd": command,
+        "projects": 0,
+        "daemon": False,
+        "files": [],
+    }
+    return True
+
+
+def telemetry_set(**fields):
+    """设置本次调用的计数（projects、daemon），未开启遥测时不做任何事"""
+    if _TELEMETRY is not None:
+        _TELEMETRY.update(fields)
+
+
+def telemetry_file(hit: bool, size: int):
+    """记录读取的一个 context.md：是否命中缓存（工作区索引或解析缓存）及文件大小
+
+    list.append 是原子的，可在 list_projects 的工作线程中调用。
+    """
+    if _TELEMETRY is not None:
+        _TELEMETRY["files"].append((hit, size))
+
+
+def finish_telemetry(exit_code: int):
+    """追加一条 JSONL 记录；写入失败时静默跳过，不影响命令本身"""
+    import contextlib
+
+    global _TELEMETRY
+    state, _TELEMETRY = _TELEMETRY, None
+    if state is None:
+        return
+    files = state["files"]
+    hits = sum(1 for hit, _ in files if hit)
+    record = {
+        "ts": round(time.time(), 3),
+        "cmd": state["cmd"],
+        "ms": round((time.perf_counter() - state["start"]) * 1000, 3),
+        "exit": exit_code,
+        "projects": state["projects"],
+        "cache_hits": hits,
+        "cache_misses": len(files) - hits,
+        "max_bytes": max((size for _, size in files), default=0),
+        "daemon": state["daemon"],
+        "workspace": str(get_workspace_root()),
+    }
+    with contextlib.suppress(OSError):
+        append_telemetry(get_telemetry_file(), record)
+
+
+def append_telemetry(path: Path, record: dict):
+    """以 O_APPEND 写入一行（并发调用不会交错），文件超过上限时先轮转为 .1、.2"""
+    try:
+        limit = int(os.environ.get("CTX_TELEMETRY_MAX_BYTES", TELEMETRY_MAX_BYTES))
+    except ValueError:
+        limit = TELEMETRY_MAX_BYTES
+    try:
+        if path.stat().st_size >= limit:
+            for n in range(TELEMETRY_BACKUPS - 1, 0, -1):
+                older = path.with_name(f"{path.name}.{n}")
+                if older.exists():
+                    os.replace(older, path.with_name(f"{path.name}.{n + 1}"))
+            os.replace(path, path.with_name(f"{path.name}.1"))
+    except FileNotFoundError:
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+    line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+    try:
+        os.write(fd, line.encode("utf-8"))
+    finally:
+        os.close(fd)
+
+
+def load_telemetry(path: Path) -> list[dict]:
+    """读取遥测记录（含轮转的旧文件，从旧到新），跳过损坏的行"""
+    records = []
+    for n in range(TELEMETRY_BACKUPS, -1, -1):
+        part = path.with_name(f"{path.name}.{n}") if n else path
+        try:
+            lines = part.read_text(encoding="utf-8").splitlines()
+        except OSError:
+            continue
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and isinstance(record.get("ms"), (int, float)):
+                records.append(record)
+    return records
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    """最近秩百分位数（values 已排序）"""
+    rank = max(1, -(-len(values) * pct // 100))
+    return values[int(rank) - 1]
+
+
+def summarize_telemetry(records: list[dict], by: str = "cmd") -> list[dict]:
+    """按命令（或工作区）分组，计算次数、p50/p95/p99 延迟、最多项目数和最大文件，按 p95 降序"""
+    groups = {}
+    for record in records:
+        groups.setdefault(str(record.get(by, "?")), []).append(record)
+
+    rows = []
+    for key, group in groups.items():
+        latencies = sorted(record["ms"] for record in group)
+        hits = sum(record.get("cache_hits", 0) for record in group)
+        misses = sum(record.get("cache_misses", 0) for record in group)
+        rows.append(
+            {
+                "key": key,
+                "count": len(group),
+                "p50": _percentile(latencies, 50),
+                "p95": _percentile(latencies, 95),
+                "p99": _percentile(latencies, 99),
+                "projects": max(record.get("projects", 0) for record in group),
+                "max_bytes": max(record.get("max_bytes", 0) for record in group),
+                "hit_rate": hits / (hits + misses) if hits + misses else None,
+            }
+        )
+    rows.sort(key=lambda row: row["p95"], reverse=True)
+    return rows
+
+
+def cmd_telemetry(args):
+    """查看本地遥测：summary 输出各命令的延迟分布，path 输出文件路径"""
+    path = Path(args.file) if args.file else get_telemetry_file()
+    if args.action == "path":
+        print(path)
+        return
+
+    records = load_telemetry(path)
+    if not records:
+        print(f"📭 没有遥测记录: {path}")
+        if not os.environ.get("CTX_TELEMETRY"):
+            print("   设置 CTX_TELEMETRY=1 开启记录")
+        return
+
+    by = "workspace" if args.by == "workspace" else "cmd"
+    table = [["工作区" if by == "workspace" else "命令", "次数", "p50 ms", "p95 ms", "p99 ms"]]
+    table[0] += ["项目", "最大文件", "缓存命中"]
+    for row in summarize_telemetry(records, by):
+        hit_rate = f"{row['hit_rate']:.0%}" if row["hit_rate"] is not None else "-"
+        table.append(
+            [
+                row["key"],
+                str(row["count"]),
+                f"{row['p50']:.2f}",
+                f"{row['p95']:.2f}",
+                f"{row['p99']:.2f}",
+                str(row["projects"]),
+                f"{row['max_bytes'] / 1024:.1f} KiB",
+                hit_rate,
+            ]
+        )
+
+    widths = [max(_display_width(cells[i]) for cells in table) for i in range(len(table[0]))]
+    print(f"📈 遥测汇总: {len(records)} 条记录（{path}）\n")
+    for cells in table:
+        line = [cells[0] + " " * (widths[0] - _display_width(cells[0]))]
+        line += [" " * (w - _display_width(c)) + c for c, w in zip(cells[1:], widths[1:])]
+        print("  ".join(line))
+
+
 # ============ 显示函数 ============
 
 
@@ -211,38 +3652,126 @@ def display_context(context: dict):
     print("╚══════════════════════════════════════════════════════════════════╝")
 
 
-def show_status():
-    """显示当前项目简要状态（紧凑版）"""
+def show_status(sync: bool = False):
+    """显示当前项目简要状态（紧凑版）；sync 为 True 时把检测到的分支写回 frontmatter"""
     context_file = get_context_file()
     if not context_file:
         print("⚠️  当前项目没有 context.md")
         return
 
-    content = context_file.read_text(encoding="utf-8")
-    info = parse_context(content)
+    info = project_git_info(load_context(context_file), context_file, sync=sync)
+    started = time.perf_counter()
+    print_status(info)
+    profile_add("render", started)
 
-    status_icon = {"active": "🟢", "paused": "🟡", "completed": "✅", "unknown": "⚪"}.get(
-        info["status"], "⚪"
-    )
+
+def format_shell(info: dict) -> str:
+    """把解析结果导出为可 eval 的 shell 赋值语句
+
+    变量名加 ctx_ 前缀（zsh 中 status 是只读变量），值统一用单引号转义；
+    列表字段导出为数组（bash/zsh 通用），并额外导出 ctx_todo_count。
+    """
+    import shlex
+
+    lines = []
+    for key, value in info.items():
+        if isinstance(value, list):
+            items = " ".join(shlex.quote(str(item)) for item in value)
+            lines.append(f"ctx_{key}=({items})")
+        elif isinstance(value, bool):
+            lines.append(f"ctx_{key}={int(value)}")
+        else:
+            lines.append(f"ctx_{key}={shlex.quote(str(value))}")
+    if "todo_count" not in info:
+        lines.append(f"ctx_todo_count={len(info['todos'])}")
+    return "\n".join(lines)
+
+
+def _format_timestamp(ts: int) -> str:
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(ts))
+
+
+def print_status(info: dict):
+    """打印项目简要状态"""
+    status_icon = STATUS_ICONS.get(info["status"], "⚪")
 
     branch_info = f" | {info['branch']}" if info["branch"] else ""
+    if info.get("last_commit"):
+        branch_info += f" · 提交于 {_format_timestamp(info['last_commit'])}"
     session_info = f" | 会话#{info['session_count']}" if info["session_count"] > 0 else ""
+    todo_count = info.get("todo_count", len(info["todos"]))
 
     print(f"""
 📊 {status_icon} {info['project']}
    ├─ 状态: {info['status']} | 分类: {info['category']}{branch_info}
    ├─ 焦点: {info['current_focus'][:50]}
-   └─ 待办: {len(info['todos'])} 项{session_info} | 上次: {info['last_session']}
+   └─ 待办: {todo_count} 项{session_info} | 上次: {info['last_session']}
 """)
 
 
 # ============ 命令函数 ============
 
 
-def cmd_ls(_args):
+def cmd_ls(args):
     """列出所有项目"""
-    projects = list_projects()
+    stats: dict = {}
+    projects = list_projects(
+        jobs=getattr(args, "jobs", None), max_depth=getattr(args, "depth", None), stats=stats
+    )
+
+    if getattr(args, "stats", False):
+        print(
+            f"🔎 扫描 {stats['visited']} 个目录 | 剪枝 {stats['pruned']} 个 | "
+            f"发现 {stats['projects']} 个项目 | 最大深度 {stats['max_depth']}",
+            file=sys.stderr,
+        )
+
+    projects = attach_git_info(
+        projects, get_workspace_root(), sync=getattr(args, "sync_branch", False)
+    )
+
+    started = time.perf_counter()
+    if getattr(args, "recent", False):
+        print_recent_projects(projects, rank_recent_projects(get_workspace_root()))
+    else:
+        print_project_list(projects)
+    profile_add("render", started)
+
 
+def print_recent_projects(projects: list[dict], ranked: list[tuple[float, str]]):
+    """按 frecency 排列项目，没有访问记录的项目按 last_session 排在后面"""
+    if not projects:
+        print("📭 workspace 下还没有任何项目记录")
+        return
+
+    scores = {path: score for score, path in ranked}
+    visited = sorted(
+        (p for p in projects if p["path"] in scores), key=lambda p: (-scores[p["path"]], p["path"])
+    )
+    others = sorted(
+        (p for p in projects if p["path"] not in scores),
+        key=lambda x: x["last_session"],
+        reverse=True,
+    )
+
+    print(f"\n🕘 最近常用的项目 ({len(projects)} 个项目，{len(visited)} 个有访问记录)\n")
+    for p in visited + others:
+        icon = STATUS_ICONS.get(p["status"], STATUS_ICONS["unknown"])
+        score = f"{scores[p['path']]:5.2f}" if p["path"] in scores else "    -"
+        print(f"   {icon} {p['path']:<25} | {score} | {p['last_session']}")
+    print()
+
+
+def _git_tag(info: dict) -> str:
+    """ctx ls 行尾的实时分支和最近提交日期（只对检测到 git 仓库的项目显示）"""
+    if "last_commit" not in info or not info["branch"]:
+        return ""
+    day = f" {time.strftime('%Y-%m-%d', time.localtime(info['last_commit']))}"
+    return f" ⎇ {info['branch']}{day if info['last_commit'] else ''}"
+
+
+def print_project_list(projects: list[dict]):
+    """按状态分组打印项目列表"""
     if not projects:
         print("📭 workspace 下还没有任何项目记录")
         return
@@ -264,19 +3793,19 @@ def cmd_ls(_args):
                 else p["current_focus"]
             )
             session_tag = f" #{p['session_count']}" if p["session_count"] > 0 else ""
-            print(f"   {p['path']:<25} | {focus}{session_tag}")
+            print(f"   {p['path']:<25} | {focus}{session_tag}{_git_tag(p)}")
         print()
 
     if paused:
         print("🟡 已暂停")
         for p in sorted(paused, key=lambda x: x["last_session"], reverse=True):
-            print(f"   {p['path']:<25} | {p['last_session']}")
+            print(f"   {p['path']:<25} | {p['last_session']}{_git_tag(p)}")
         print()
 
     if completed:
         print("✅ 已完成")
         for p in sorted(completed, key=lambda x: x["last_session"], reverse=True):
-            print(f"   {p['path']:<25} | {p['last_session']}")
+            print(f"   {p['path']:<25} | {p['last_session']}{_git_tag(p)}")
         print()
 
     if others:
@@ -286,13 +3815,145 @@ def cmd_ls(_args):
         print()
 
 
-def cmd_status(_args):
-    """显示当前项目状态"""
-    show_status()
+def cmd_index(args):
+    """管理工作区索引"""
+    workspace = get_workspace_root()
+    index_file = get_index_file(workspace)
+
+    if args.rebuild:
+        index_file.unlink(missing_ok=True)
+        start = time.perf_counter()
+        projects = list_projects(jobs=getattr(args, "jobs", None))
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"✅ 已重建索引: {len(projects)} 个项目 ({elapsed:.1f} ms)")
+        print(f"   路径: {index_file}")
+        return
+
+    index = load_index(workspace)
+    entries = index["entries"]
+
+    if args.verify:
+        problems = []
+        for key, entry in sorted(entries.items()):
+            context_file = workspace / key / ".claude" / "context.md"
+            try:
+                header = read_header(context_file)
+            except OSError:
+                problems.append(f"{key}: 文件已不存在")
+                continue
+            if _content_hash(header) != entry["hash"]:
+                problems.append(f"{key}: 内容已变化（下次 ctx ls 时刷新）")
+            elif parse_frontmatter(_decode_context(header)) != entry["info"]:
+                problems.append(f"{key}: 缓存的解析结果与当前解析不一致")
+
+        if problems:
+            print(f"⚠️  索引校验发现 {len(problems)} 个问题:")
+            for problem in problems:
+                print(f"   - {problem}")
+            print("   运行 ctx index --rebuild 重建索引")
+            sys.exit(1)
+        print(f"✅ 索引校验通过: {len(entries)} 个项目")
+        return
+
+    if not index_file.exists():
+        print("📭 尚未建立索引（运行 ctx ls 或 ctx index --rebuild）")
+        return
+    print(f"📇 工作区索引: {index_file}")
+    print(f"   项目数: {len(entries)} | 版本: v{INDEX_VERSION}")
+
+
+def cmd_archive(args):
+    """归档旧会话记录 / 查看已归档会话"""
+    context_file = get_context_file()
+    if not context_file:
+        print("❌ 当前项目没有 context.md")
+        return
+    sessions_dir = get_sessions_dir(context_file)
+
+    if args.list or args.show:
+        index = load_sessions_index(sessions_dir)
+        if args.show:
+            query = args.show
+            index = [r for r in index if query == r["date"] or query in r["heading"]]
+        if not index:
+            print("📭 没有匹配的已归档会话")
+            return
+        for record in index:
+            if args.show:
+                print(read_archived_session(sessions_dir, record), end="")
+            else:
+                print(f"   {record['heading']:<40} | {record['file']}")
+        return
+
+    if args.days is None and args.keep is None:
+        print("❌ 请指定 --days N 或 --keep K")
+        return
+
+    records = archive_sessions(
+        context_file, days=args.days, keep=args.keep, compress=args.gzip, dry_run=args.dry_run
+    )
+    if not records:
+        print("✅ 没有需要归档的会话")
+        return
+
+    action = "将归档" if args.dry_run else "已归档"
+    print(f"📦 {action} {len(records)} 个会话:")
+    for record in records:
+        target = record.get("file", f"{record['date'][:4]}{'.md.gz' if args.gzip else '.md'}")
+        print(f"   {record['heading']:<40} → sessions/{target}")
+
+
+def cmd_daemon(args):
+    """管理后台守护进程 ctxd"""
+    workspace = get_workspace_root()
+    sock_path = get_daemon_socket(workspace)
+    running = _daemon_call(sock_path, {"cmd": "ping"}) if sock_path.exists() else None
+
+    if args.action == "status":
+        if running:
+            print(f"🟢 ctxd 运行中: {running.strip()} | {sock_path}")
+        else:
+            print("⚪ ctxd 未运行")
+    elif args.action == "stop":
+        if running is None:
+            print("⚪ ctxd 未运行")
+            return
+        _daemon_call(sock_path, {"cmd": "shutdown"})
+        print("✅ ctxd 已停止")
+    elif running:
+        print(f"⚠️  ctxd 已在运行: {running.strip()}")
+    elif args.action == "run":
+        run_daemon(workspace)
+    else:
+        (workspace / INDEX_DIR_NAME).mkdir(parents=True, exist_ok=True)
+        pid = _daemonize(workspace)
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and _daemon_call(sock_path, {"cmd": "ping"}) is None:
+            time.sleep(0.02)
+        print(f"✅ ctxd 已启动 (pid {pid}) | {sock_path}")
+
+
+def cmd_status(args):
+    """显示当前项目状态（--format=shell/json 输出全部字段供脚本使用）"""
+    fmt = getattr(args, "format", "text")
+    if fmt == "text":
+        show_status(sync=getattr(args, "sync_branch", False))
+        return
+
+    context_file = get_context_file()
+    if not context_file:
+        print("⚠️  当前项目没有 context.md", file=sys.stderr)
+        sys.exit(1)
+    info = project_git_info(load_context(context_file), context_file)
+    started = time.perf_counter()
+    print(format_shell(info) if fmt == "shell" else json.dumps(info, ensure_ascii=False))
+    profile_add("render", started)
 
 
 def cmd_init(args):
     """初始化 context（支持工作区和项目两种模板）"""
+    from datetime import datetime
+
     context_dir = get_context_dir()
     context_file = context_dir / "context.md"
 
@@ -392,6 +4053,8 @@ stack:
 
 def _get_project_template(project_name, today):
     """生成具体项目 context 模板"""
+    from datetime import datetime
+
     return f"""---
 # ============ 基本信息 ============
 project: {project_name}
@@ -447,15 +4110,34 @@ stack:
 
 
 def cmd_switch(args):
-    """切换到指定项目"""
+    """切换到指定项目（名称不存在时按三字组索引模糊匹配；不带参数时列出最近常用的项目）"""
     project_name = args.project
     workspace = get_workspace_root()
+    if not project_name:
+        ranked = rank_recent_projects(workspace)
+        if not ranked:
+            print("📭 还没有访问记录（ctx switch <项目名> 或 go <项目名> 后会记录）")
+            return
+        print("🕘 最近常用的项目（按访问频率和时间排序）\n")
+        for rank, (score, path) in enumerate(ranked[:10], 1):
+            print(f"{rank:>3}. {path:<25} [{score:.2f}]")
+        print("\n   用法: ctx switch <项目名>")
+        return
     target_path = workspace / project_name
 
     if not target_path.exists():
-        print(f"❌ 项目不存在: {project_name}")
-        print(f"   路径: {target_path}")
-        return
+        match, ranked = resolve_project(project_name, workspace)
+        if match is None and ranked:
+            print(f"❓ “{project_name}” 匹配到多个项目，请输入更完整的名称:\n")
+            for score, path in ranked[:5]:
+                print(f"   {path:<25} [{score:.2f}]")
+            return
+        if match is None or not (workspace / match).exists():
+            print(f"❌ 项目不存在: {project_name}")
+            print(f"   路径: {target_path}")
+            return
+        print(f"🔎 模糊匹配: {project_name} → {match}")
+        project_name, target_path = match, workspace / match
 
     if not target_path.is_dir():
         print(f"❌ 不是目录: {project_name}")
@@ -464,13 +4146,13 @@ def cmd_switch(args):
     # 打印切换命令供用户复制
     print(f"\n🔄 切换到项目: {project_name}")
     print(f"\n   请执行: cd {target_path}\n")
+    record_visit(target_path)
 
     # 显示项目状态
     context_file = target_path / ".claude" / "context.md"
     if context_file.exists():
         os.chdir(target_path)
-        content = context_file.read_text(encoding="utf-8")
-        info = parse_context(content)
+        info = load_context(context_file)
         display_context(info)
     else:
         print("⚠️  该项目还没有 context.md")
@@ -478,128 +4160,89 @@ def cmd_switch(args):
 
 def cmd_update(args):
     """更新字段"""
+    if getattr(args, "all", False):
+        cmd_update_all(args)
+        return
+    if getattr(args, "where", None):
+        print("❌ --where 需要与 --all 一起使用")
+        return
+
     context_file = get_context_file()
     if not context_file:
         print("❌ 当前项目没有 context.md")
         return
 
-    content = context_file.read_text(encoding="utf-8")
+    try:
+        fields = parse_update_args(args.assignments)
+        fsync = args.fsync or bool(os.environ.get("CTX_FSYNC"))
+        update_context(context_file, fields, fsync=fsync)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
 
-    # 简单的字段更新
-    field = args.field
-    value = args.value
+    for field, value in fields.items():
+        print(f"✅ 已更新 {field}: {value}")
+    _auto_archive(context_file)
 
-    # 支持的字段
-    valid_fields = [
-        "project",
-        "status",
-        "category",
-        "project_type",
-        "current_focus",
-        "next_steps",
-        "brief",
-        "branch",
-    ]
 
-    if field in valid_fields:
-        # 更新或添加字段
-        if f"{field}:" in content:
-            content = content.replace(f"{field}:", f"{field}: {value}", 1)
-        else:
-            # 在 created 后添加
-            content = content.replace("created: ", f"created: \n{field}: {value}\nlast_session: ")
-    else:
-        print(f"❌ 不支持的字段: {field}")
-        print(f"   支持的字段: {', '.join(valid_fields)}")
+def cmd_update_all(args):
+    """批量更新工作区中满足 --where 条件的项目"""
+    try:
+        fields = parse_update_args(args.assignments)
+        conditions = parse_where(args.where or [])
+    except ValueError as e:
+        print(f"❌ {e}")
         return
 
-    # 更新 last_session 和 session_count
-    today = datetime.now().strftime("%Y-%m-%d")
-    content = re.sub(r"last_session:.*", f"last_session: {today}", content)
+    start = time.perf_counter()
+    fsync = args.fsync or bool(os.environ.get("CTX_FSYNC"))
+    result = bulk_update(fields, conditions, args.dry_run, args.jobs, fsync)
+    elapsed = time.perf_counter() - start
 
-    # 增加 session_count（如果存在）
-    if "session_count:" in content:
-        content = re.sub(
-            r"session_count: (\d+)", lambda m: f"session_count: {int(m.group(1)) + 1}", content
+    icon = "🔍" if args.dry_run else "✅"
+    for path, old in result["updated"]:
+        changes = ", ".join(
+            f"{field}: {old[field] or '(空)'} → {fields[field]}" for field in fields
         )
-
-    context_file.write_text(content, encoding="utf-8")
-    print(f"✅ 已更新 {field}: {value}")
+        print(f"{icon} {path}  {changes}")
+    for path, error in result["failed"]:
+        print(f"❌ {path}: {error}")
+
+    verb = "将更新" if args.dry_run else "已更新"
+    print(
+        f"\n📊 {verb} {len(result['updated'])} 个项目 | 跳过 {result['skipped']} 个 | "
+        f"失败 {len(result['failed'])} 个 | 耗时 {elapsed:.2f}s"
+    )
+    if result["failed"]:
+        sys.exit(1)
 
 
-def cmd_migrate(_args):
+def cmd_migrate(args):
     """迁移旧版 context.md 到融合版"""
+    if getattr(args, "all", False):
+        cmd_migrate_all(args)
+        return
+
     context_file = get_context_file()
     if not context_file:
         print("❌ 当前项目没有 context.md")
         return
 
-    content = context_file.read_text(encoding="utf-8")
-    info = parse_context(content)
+    info = parse_context_file(context_file)
 
     # 检查是否需要迁移
-    if info["format_version"] == "v2":
+    if not needs_migration(info):
         print("✅ 已经是融合版格式，无需迁移")
         return
 
+    if getattr(args, "dry_run", False):
+        print(migration_diff(context_file, "context.md", info), end="")
+        return
+
     print(f"📦 检测到格式版本: {info['format_version']}")
     print("🔄 开始迁移到融合版...\n")
 
-    # 构建新版 frontmatter
-    new_frontmatter = f"""---
-# ============ 基本信息 ============
-project: {info['project']}
-created: {info['created'] if info['created'] != 'Unknown' else datetime.now().strftime('%Y-%m-%d')}
-last_session: {datetime.now().strftime('%Y-%m-%d')}
-session_count: {info['session_count'] if info['session_count'] > 0 else 1}
-
-# ============ 状态分类 ============
-status: active                 # 请根据实际情况修改: active | paused | completed
-category: {info['category'] if info['category'] != 'unknown' else '探索性'}
-project_type: {info['project_type'] if info['project_type'] else ''}
-
-# ============ 工作追踪 ============
-current_focus: "{info['current_focus']}"
-next_steps: ""
-branch: {info['branch'] if info['branch'] else 'main'}
-
-# ============ 项目描述 ============
-brief: {info['brief'] if info['brief'] else '"请用一句话描述这个项目的目标"'}
-
-# ============ 技术栈 ============
-stack:
-"""
-
-    # 添加 stack
-    if info["stack"]:
-        for item in info["stack"]:
-            new_frontmatter += f"  - {item}\n"
-    else:
-        new_frontmatter += "  - 语言/框架\n"
-
-    new_frontmatter += "---\n\n"
-
-    # 保留原有内容（移除旧的 frontmatter）
-    lines = content.split("\n")
-    in_old_frontmatter = False
-    content_part = []
-
-    for line in lines:
-        if line.strip() == "---":
-            if not in_old_frontmatter and not content_part:
-                in_old_frontmatter = True
-                continue
-            elif in_old_frontmatter:
-                in_old_frontmatter = False
-                continue
-        if not in_old_frontmatter:
-            content_part.append(line)
-
-    # 合并
-    new_content = new_frontmatter + "\n".join(content_part)
-
-    # 写入
-    context_file.write_text(new_content, encoding="utf-8")
+    migrate_context(context_file, info)
 
     print("✅ 迁移完成！")
     print(f"\n📝 请检查并编辑: {context_file}")
@@ -609,17 +4252,53 @@ stack:
     print("   - brief (项目目标描述)\n")
 
 
+def cmd_migrate_all(args):
+    """并发迁移工作区中所有旧格式的 context.md"""
+    tty = sys.stderr.isatty()
+
+    def progress(done, total):
+        if tty:
+            print(f"\r🔄 {done}/{total}", end="" if done < total else "\n", file=sys.stderr)
+
+    start = time.perf_counter()
+    result = migrate_all(args.dry_run, args.jobs, progress)
+    elapsed = time.perf_counter() - start
+
+    for path, version, diff in result["migrated"]:
+        if args.dry_run:
+            print(diff, end="")
+        else:
+            print(f"✅ {path} ({version})")
+    for path, error in result["failed"]:
+        print(f"❌ {path}: {error}")
+
+    count = len(result["migrated"])
+    rate = count / elapsed if elapsed > 0 else 0.0
+    verb = "将迁移" if args.dry_run else "已迁移"
+    print(
+        f"\n📊 {verb} {count} 个文件 | 已是融合版 {result['current']} 个 | "
+        f"失败 {len(result['failed'])} 个 | 耗时 {elapsed:.2f}s ({rate:.0f} 个文件/秒)"
+    )
+    if result["failed"]:
+        sys.exit(1)
+
+
 def cmd_show(_args):
     """显示完整上下文（默认命令）"""
     context_file = get_context_file()
 
     if context_file:
-        content = context_file.read_text(encoding="utf-8")
-        context = parse_context(content)
+        context = project_git_info(load_context(context_file), context_file)
+        started = time.perf_counter()
         display_context(context)
+        profile_add("render", started)
     else:
-        cwd = Path.cwd()
-        print(f"""
+        print_no_context(Path.cwd())
+
+
+def print_no_context(cwd: Path):
+    """打印未检测到 context.md 时的提示"""
+    print(f"""
 📂 当前目录: {cwd}
 
 ⚠️  未检测到工作区记忆 (.claude/context.md)
@@ -635,7 +4314,61 @@ def cmd_show(_args):
 # ============ 主函数 ============
 
 
+def _add_jobs_argument(parser):
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=None,
+        help="并发读取/解析的线程数（默认取 CTX_JOBS，否则串行；0 为自动）",
+    )
+
+
 def main():
+    argv, profile, memory = _extract_profile_args(sys.argv[1:])
+    telemetry = start_telemetry(argv)
+    if profile is None and not telemetry:
+        _run(argv)
+        return
+
+    if profile is not None:
+        start_profile("" if profile == "1" else profile, memory)
+    exit_code = 1
+    try:
+        _run(argv)
+        exit_code = 0
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else int(e.code is not None)
+        raise
+    finally:
+        finish_profile()
+        finish_telemetry(exit_code)
+
+
+def _run(argv: list[str]):
+    # 快速路径：shell 钩子最常用的 ctx / ctx status / ctx ls 不构建 argparse；
+    # ctxd 运行时直接输出守护进程渲染好的结果
+    if argv in (["status", "--format=shell"], ["status", "--format=json"]):
+        from types import SimpleNamespace
+
+        cmd_status(SimpleNamespace(format=argv[1].partition("=")[2]))
+        return
+    if argv in (["prompt"], ["prompt", "--async"]):
+        from types import SimpleNamespace
+
+        cmd_prompt(SimpleNamespace(async_=len(argv) == 2))
+        return
+    if argv in ([], ["status"], ["ls"]):
+        command = argv[0] if argv else "show"
+        output = daemon_request(command)
+        if output is not None:
+            sys.stdout.write(output)
+        else:
+            {"show": cmd_show, "status": cmd_status, "ls": cmd_ls}[command](None)
+        return
+
+    import argparse
+
     parser = argparse.ArgumentParser(
         description="Context Manager Enhanced v2.0 - 工作区上下文管理",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -644,20 +4377,56 @@ def main():
   ctx              显示当前项目上下文
   ctx status       显示简要状态
   ctx ls           列出所有项目
-  ctx switch <名>  切换到指定项目
+  ctx switch <名>  切换到指定项目（支持模糊匹配；不带参数列出最近常用的项目）
+  ctx ls --recent  按访问频率和时间排列项目
   ctx init         初始化新项目（融合版）
   ctx migrate      迁移旧格式到融合版
+  ctx index --rebuild  重建工作区索引
+  ctx archive --keep 20  只保留最近 20 个会话，其余归档
   ctx update status paused  更新状态
+  ctx watch        实时监视项目列表
+  ctx prompt       输出提示符片段（PS1）
+  ctx daemon start  启动后台守护进程 ctxd
+  ctx search 音频 播放  全文搜索所有项目（BM25 排序）
+  ctx todos --priority P0 --status active  汇总所有项目的待办
+  ctx next -n 5    跨进行中的项目给出最优先的 5 项待办
+  ctx telemetry    按命令汇总本地遥测的 p50/p95/p99 延迟
+
+剖析（可用于任意命令，也可设置 CTX_PROFILE / CTX_PROFILE_MEMORY）:
+  ctx ls --profile                 在 stderr 输出各阶段耗时和文件数
+  ctx ls --profile=ctx.pstats      同时保存 cProfile 结果
+  ctx ls --profile-memory          同时统计 tracemalloc 内存峰值
         """,
     )
 
     subparsers = parser.add_subparsers(dest="command", help="可用命令")
 
     # ls 命令
-    subparsers.add_parser("ls", help="列出所有项目")
+    ls_parser = subparsers.add_parser("ls", help="列出所有项目")
+    _add_jobs_argument(ls_parser)
+    ls_parser.add_argument(
+        "--depth",
+        type=int,
+        default=None,
+        help=f"项目发现的最大递归深度（默认取 CTX_MAX_DEPTH，否则 {DEFAULT_MAX_DEPTH}）",
+    )
+    ls_parser.add_argument("--stats", action="store_true", help="在 stderr 输出扫描统计")
+    ls_parser.add_argument("--recent", action="store_true", help="按访问频率和时间（frecency）排序")
+    ls_parser.add_argument(
+        "--sync-branch", action="store_true", help="把检测到的 git 分支写回各项目的 branch 字段"
+    )
 
     # status 命令
-    subparsers.add_parser("status", help="显示简要状态")
+    status_parser = subparsers.add_parser("status", help="显示简要状态")
+    status_parser.add_argument(
+        "--format",
+        choices=["text", "shell", "json"],
+        default="text",
+        help="输出格式: text(默认) | shell(可 eval 的变量赋值) | json",
+    )
+    status_parser.add_argument(
+        "--sync-branch", action="store_true", help="把检测到的 git 分支写回 branch 字段"
+    )
 
     # init 命令
     init_parser = subparsers.add_parser("init", help="初始化 context.md")
@@ -670,18 +4439,120 @@ def main():
 
     # switch 命令
     switch_parser = subparsers.add_parser("switch", help="切换到指定项目")
-    switch_parser.add_argument("project", help="项目名称")
+    switch_parser.add_argument(
+        "project", nargs="?", help="项目名称（支持模糊匹配；省略时列出最近常用的项目）"
+    )
 
     # update 命令
     update_parser = subparsers.add_parser("update", help="更新字段")
-    update_parser.add_argument("field", help="字段名")
-    update_parser.add_argument("value", help="新值")
+    update_parser.add_argument(
+        "assignments", nargs="+", metavar="字段=值", help="字段=值 ...（也支持旧写法: 字段 值）"
+    )
+    update_parser.add_argument(
+        "--fsync", action="store_true", help="替换前将文件刷到磁盘（也可设置 CTX_FSYNC=1）"
+    )
+    update_parser.add_argument("--all", action="store_true", help="批量更新工作区中的项目")
+    update_parser.add_argument(
+        "--where",
+        action="append",
+        metavar="条件",
+        help="筛选条件，可重复（如 status=active、last_session<2026-08-01）",
+    )
+    update_parser.add_argument("--dry-run", action="store_true", help="只显示将要更新的项目")
+    _add_jobs_argument(update_parser)
 
     # migrate 命令
-    subparsers.add_parser("migrate", help="迁移旧格式到融合版")
+    migrate_parser = subparsers.add_parser("migrate", help="迁移旧格式到融合版")
+    migrate_parser.add_argument("--all", action="store_true", help="迁移工作区中所有旧格式项目")
+    migrate_parser.add_argument("--dry-run", action="store_true", help="只输出 unified diff")
+    _add_jobs_argument(migrate_parser)
+
+    # archive 命令
+    archive_parser = subparsers.add_parser("archive", help="归档旧会话记录")
+    archive_parser.add_argument("--days", type=int, help="归档早于 N 天的会话")
+    archive_parser.add_argument("--keep", type=int, help="只保留最近 K 个会话")
+    archive_parser.add_argument("--gzip", action="store_true", help="使用 gzip 压缩归档")
+    archive_parser.add_argument("--dry-run", action="store_true", help="只显示将要归档的会话")
+    archive_parser.add_argument("--list", action="store_true", help="列出已归档会话")
+    archive_parser.add_argument("--show", metavar="查询", help="按日期或标题查看已归档会话")
+
+    # index 命令
+    index_parser = subparsers.add_parser("index", help="管理工作区索引")
+    index_group = index_parser.add_mutually_exclusive_group()
+    index_group.add_argument("--rebuild", action="store_true", help="丢弃并重建索引")
+    index_group.add_argument("--verify", action="store_true", help="校验索引与文件是否一致")
+    _add_jobs_argument(index_parser)
+
+    # watch 命令
+    watch_parser = subparsers.add_parser("watch", help="监视 workspace 并实时刷新项目列表")
+    watch_parser.add_argument(
+        "--debounce", type=int, default=200, help="合并连续事件的等待时间 (ms，默认 200)"
+    )
+    watch_parser.add_argument("--poll", action="store_true", help="不使用 inotify，改为轮询")
+    watch_parser.add_argument(
+        "--interval", type=float, default=2.0, help="轮询间隔 (秒，默认 2)"
+    )
+
+    # prompt 命令
+    prompt_parser = subparsers.add_parser("prompt", help="输出提示符片段（供 PS1 使用）")
+    prompt_parser.add_argument(
+        "--async",
+        dest="async_",
+        action="store_true",
+        help="立即输出上次缓存的结果，在后台刷新",
+    )
+
+    # daemon 命令
+    daemon_parser = subparsers.add_parser("daemon", help="管理后台守护进程 ctxd")
+    daemon_parser.add_argument(
+        "action",
+        nargs="?",
+        choices=["start", "stop", "status", "run"],
+        default="start",
+        help="start(后台启动) | stop | status | run(前台运行)",
+    )
+
+    # search 命令
+    search_parser = subparsers.add_parser("search", help="全文搜索所有项目的 context.md")
+    search_parser.add_argument("terms", nargs="+", help="检索词（中文按二字组匹配）")
+    search_parser.add_argument("--limit", "-n", type=int, default=10, help="最多显示的结果数")
+    search_parser.add_argument("--rebuild", action="store_true", help="丢弃并重建搜索索引")
+    search_parser.add_argument(
+        "--refresh", action="store_true", help="查询前先增量扫描工作区（默认信任已有索引）"
+    )
+
+    # todos 命令
+    todos_parser = subparsers.add_parser("todos", help="汇总所有项目的待办")
+    todos_parser.add_argument(
+        "--priority",
+        "-p",
+        action="append",
+        metavar="P0",
+        help="只显示这些优先级，可重复或逗号分隔（- 表示无优先级）",
+    )
+    todos_parser.add_argument(
+        "--status", "-s", action="append", metavar="状态", help="只显示这些状态的项目（如 active）"
+    )
+    todos_parser.add_argument("--done", action="store_true", help="同时显示已完成的待办")
+    _add_jobs_argument(todos_parser)
+
+    # next 命令
+    next_parser = subparsers.add_parser("next", help="跨进行中的项目给出最优先的待办")
+    next_parser.add_argument("--limit", "-n", type=int, default=5, help="显示的项数（默认 5）")
+    _add_jobs_argument(next_parser)
+
+    # telemetry 命令
+    telemetry_parser = subparsers.add_parser("telemetry", help="查看本地遥测（CTX_TELEMETRY=1 开启）")
+    telemetry_parser.add_argument(
+        "action", nargs="?", choices=["summary", "path"], default="summary", help="summary | path"
+    )
+    telemetry_parser.add_argument(
+        "--by", choices=["command", "workspace"], default="command", help="按命令或工作区分组"
+    )
+    telemetry_parser.add_argument("--file", help="遥测文件（默认 CTX_TELEMETRY_FILE 或 ~/.cache/ctx）")
 
     # 解析参数
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     # 执行命令
     if args.command == "ls":
@@ -696,6 +4567,24 @@ def main():
         cmd_update(args)
     elif args.command == "migrate":
         cmd_migrate(args)
+    elif args.command == "index":
+        cmd_index(args)
+    elif args.command == "archive":
+        cmd_archive(args)
+    elif args.command == "daemon":
+        cmd_daemon(args)
+    elif args.command == "watch":
+        cmd_watch(args)
+    elif args.command == "prompt":
+        cmd_prompt(args)
+    elif args.command == "search":
+        cmd_search(args)
+    elif args.command == "todos":
+        cmd_todos(args)
+    elif args.command == "next":
+        cmd_next(args)
+    elif args.command == "telemetry":
+        cmd_telemetry(args)
     else:
         # 默认命令：显示上下文
         cmd_show(args)
@@ -16,10 +16,17 @@ fi
 cat > "$SKILL_DIR/ctx" << 'EOF'
 #!/bin/bash
 SKILL_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
-exec "$SKILL_DIR/.venv/bin/python" "$SKILL_DIR/scripts/context_manager.py" "$@"
+exec "$SKILL_DIR/.venv/bin/python" "$SKILL_DIR/ctx.py" "$@"
 EOF
 
-chmod +x "$SKILL_DIR/ctx"
+cat > "$SKILL_DIR/ctxd" << 'EOF'
+#!/bin/bash
+# ctxd - Context Manager 后台守护进程（start | stop | status | run）
+SKILL_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+exec "$SKILL_DIR/ctx" daemon "$@"
+EOF
+
+chmod +x "$SKILL_DIR/ctx" "$SKILL_DIR/ctxd"
 
 echo "✅ 安装完成"
 echo ""
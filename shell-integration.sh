@@ -30,6 +30,12 @@ go() {
 
     cd "$workspace/$project" || return 1
 
+    # 记录访问（只追加一行，ctx switch 不带参数和 ctx ls --recent 按访问频率排序）
+    local cache_dir="${XDG_CACHE_HOME:-$HOME/.cache}/ctx"
+    [ -d "$cache_dir" ] || mkdir -p "$cache_dir"
+    # 记录物理路径（pwd -P），与 ctx switch 记录的路径一致，符号链接的 workspace 不会拆成两条
+    printf '%s\t%s\n' "${EPOCHSECONDS:-$(date +%s)}" "$(pwd -P)" >> "$cache_dir/frecency.log"
+
     # 自动显示项目状态
     if [ -f ".claude/context.md" ]; then
         ~/.claude/skills/context-manager/ctx status
@@ -42,6 +48,12 @@ go() {
 # ctx 命令快捷方式
 alias ctx='~/.claude/skills/context-manager/ctx'
 
+# 可选：在提示符中显示项目状态（读取按目录缓存的结果，--async 在后台刷新）
+# PS1='$(~/.claude/skills/context-manager/ctx prompt --async) '"$PS1"
+
+# 可选：启动后台守护进程 ctxd，go / ctx status 直接读取内存中的解析结果
+# ~/.claude/skills/context-manager/ctxd start >/dev/null 2>&1
+
 # Tab 补全支持 (bash)
 if [ -n "$BASH_VERSION" ]; then
     _go_complete() {
@@ -1,37 +1,45 @@
 #!/bin/bash
 # 显示当前项目的 context.md 内容
+#
+# 字段由 `ctx status --format=shell` 一次解析导出（与 ctx 命令显示的值一致）。
+# ctx 的查找顺序：CTX_BIN、与本脚本同目录的 ctx、PATH 中的 ctx、默认安装位置。
 
 CONTEXT_FILE="$PWD/.claude/context.md"
 
+find_ctx() {
+    local script_dir candidate
+    script_dir=$(cd "$(dirname "${BASH_SOURCE[0]:-$0}")" 2>/dev/null && pwd)
+    for candidate in "$CTX_BIN" "$script_dir/ctx" "$(command -v ctx 2>/dev/null)" \
+        "$HOME/.claude/skills/context-manager/ctx"; do
+        if [ -n "$candidate" ] && [ -f "$candidate" ] && [ -x "$candidate" ]; then
+            echo "$candidate"
+            return 0
+        fi
+    done
+    return 1
+}
+
 if [ -f "$CONTEXT_FILE" ]; then
+    if ! ctx_bin=$(find_ctx); then
+        echo "⚠️  show-context.sh: 找不到 ctx，可用 CTX_BIN 指定路径" >&2
+        exit 0
+    fi
+    if ! fields=$("$ctx_bin" status --format=shell 2>/dev/null); then
+        echo "⚠️  show-context.sh: $ctx_bin status 执行失败" >&2
+        exit 0
+    fi
+    eval "$fields"
+
     echo "════════════════════════════════════════════════════════════════"
     echo "📂 项目上下文 - $(basename "$PWD")"
     echo "════════════════════════════════════════════════════════════════"
-    
-    # 提取项目名
-    project=$(grep "^project:" "$CONTEXT_FILE" | cut -d: -f2 | xargs)
-    
-    # 提取状态和分类
-    status=$(grep "^status:" "$CONTEXT_FILE" | cut -d: -f2 | xargs)
-    category=$(grep "^category:" "$CONTEXT_FILE" | cut -d: -f2 | xargs)
-    
-    # 提取当前焦点
-    focus=$(grep "^current_focus:" "$CONTEXT_FILE" | cut -d"'" -f2 | xargs)
-    
-    echo "📊 状态: $status | 分类: $category"
-    echo "🎯 当前焦点: $focus"
-    
-    # 提取会话数
-    session_count=$(grep "^session_count:" "$CONTEXT_FILE" | cut -d: -f2 | xargs)
-    last_session=$(grep "^last_session:" "$CONTEXT_FILE" | cut -d: -f2 | xargs)
-    echo "📅 会话 #$session_count | 最后工作: $last_session"
-    
+
+    echo "📊 状态: $ctx_status | 分类: $ctx_category"
+    echo "🎯 当前焦点: $ctx_current_focus"
+    echo "📅 会话 #$ctx_session_count | 最后工作: $ctx_last_session"
+
     echo "════════════════════════════════════════════════════════════════"
     echo ""
     echo "💡 提示: 使用 'ctx' 查看完整上下文"
     echo ""
 fi
-SCRIPT
-
-chmod +x /Users/lize/.claude/context-manager-skill/show-context.sh
-echo "✅ 创建了显示脚本"
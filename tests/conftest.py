@@ -11,3 +11,20 @@ def reset_cwd():
     original_cwd = os.getcwd()
     yield
     os.chdir(original_cwd)
+
+
+@pytest.fixture(autouse=True)
+def isolate_home(tmp_path_factory, monkeypatch):
+    """HOME、用户缓存目录和默认 workspace 指向临时目录，并关闭 Git 检测
+
+    测试不会写入开发者真实的 ~/.cache/ctx 或 ~/workspace/.ctx；需要 Git 的测试自行
+    monkeypatch.delenv("CTX_NO_GIT")。
+    """
+    import scripts.context_manager
+
+    home = tmp_path_factory.mktemp("home")
+    monkeypatch.setenv("HOME", str(home))
+    monkeypatch.setenv("XDG_CACHE_HOME", str(home / ".cache"))
+    monkeypatch.setenv("CTX_NO_GIT", "1")
+    monkeypatch.setattr(scripts.context_manager, "WORKSPACE_ROOT", home / "workspace")
+    return home
@@ -0,0 +1,117 @@
+"""Reference copy of the original ``parse_context`` implementation.
+
+Kept verbatim (apart from the function name) so the table-driven parser in
+``scripts/context_manager.py`` can be checked against it in differential
+tests and benchmarks. Do not "fix" this module.
+"""
+
+
+def legacy_parse_context(content: str) -> dict:
+    """解析 context.md 内容（双格式兼容）"""
+    result = {
+        "project": "Unknown",
+        "created": "Unknown",
+        "last_session": "Unknown",
+        "session_count": 0,
+        "status": "unknown",
+        "category": "unknown",
+        "project_type": "",
+        "current_focus": "Unknown",
+        "next_steps": "",
+        "brief": "",
+        "branch": "",
+        "stack": [],
+        "todos": [],
+        "has_sessions": False,
+        "format_version": "unknown",
+    }
+
+    lines = content.split("\n")
+    in_frontmatter = False
+    in_todos = False
+    in_stack = False
+    in_sessions = False
+
+    for line in lines:
+        # 解析 YAML frontmatter
+        if line.strip() == "---":
+            in_frontmatter = not in_frontmatter
+            continue
+
+        if in_frontmatter:
+            # 新版字段
+            if line.startswith("project:"):
+                result["project"] = line.split(":", 1)[1].strip()
+            elif line.startswith("created:"):
+                result["created"] = line.split(":", 1)[1].strip()
+            elif line.startswith("last_session:"):
+                result["last_session"] = line.split(":", 1)[1].strip().strip('"')
+            elif line.startswith("status:"):
+                result["status"] = line.split(":", 1)[1].strip()
+            elif line.startswith("category:"):
+                result["category"] = line.split(":", 1)[1].strip()
+            elif line.startswith("current_focus:"):
+                result["current_focus"] = line.split(":", 1)[1].strip().strip('"')
+            elif line.startswith("next_steps:"):
+                result["next_steps"] = line.split(":", 1)[1].strip().strip('"')
+            elif line.startswith("brief:"):
+                result["brief"] = line.split(":", 1)[1].strip().strip('"')
+            elif line.startswith("branch:"):
+                result["branch"] = line.split(":", 1)[1].strip()
+            elif line.startswith("session_count:"):
+                result["session_count"] = int(line.split(":", 1)[1].strip())
+            # 旧版字段兼容
+            elif line.startswith("project_type:"):
+                result["project_type"] = line.split(":", 1)[1].strip()
+                if result["category"] == "unknown":
+                    result["category"] = result["project_type"]
+            elif line.startswith("stack:"):
+                in_stack = True
+            elif in_stack and line.startswith("  - "):
+                result["stack"].append(line.replace("  - ", "").strip())
+            elif in_stack and not line.startswith(" "):
+                in_stack = False
+
+        # 解析 TODO 列表
+        if "## 待办事项" in line or "## 待办" in line:
+            in_todos = True
+            in_sessions = False
+            continue
+
+        # 检测会话记录
+        if "## 会话记录" in line or "## 本次会话概览" in line or "## 已完成工作" in line:
+            in_sessions = True
+            result["has_sessions"] = True
+            in_todos = False
+            continue
+
+        if in_todos and line.startswith("## ") and "待办" not in line:
+            in_todos = False
+            continue
+
+        if in_sessions and line.startswith("## ") and "会话" not in line and "完成" not in line:
+            in_sessions = False
+            continue
+
+        if not in_todos:
+            continue
+
+        if "- [ ]" in line:
+            todo_text = line.split("- [ ]")[1].strip()[:60]
+            result["todos"].append(todo_text)
+        elif "- [x]" in line:
+            # 已完成的待办，不加入待办列表
+            pass
+        elif line.strip().startswith("### P"):
+            prio = line.strip().replace("### ", "")
+            result["todos"].append(f"【{prio}】")
+
+    # 检测格式版本
+    if result["created"] != "Unknown" and result["status"] in ["active", "paused", "completed"]:
+        result["format_version"] = "v2"
+    elif result["project_type"] or result["session_count"] > 0 or result["branch"]:
+        result["format_version"] = "v1"
+    else:
+        result["format_version"] = "mixed"
+
+    return result
@@ -1,6 +1,7 @@
 """Tests for context_manager.py"""
 
 import os
+import time
 
 import pytest
 
@@ -391,7 +392,7 @@ branch: main
 """)
 
             # 更新字段
-            args = argparse.Namespace(field="current_focus", value="新焦点")
+            args = argparse.Namespace(assignments=["current_focus", "新焦点"], fsync=False)
             cmd_update(args)
 
             # 验证更新
@@ -421,7 +422,7 @@ status: active
 ---
 """)
 
-            args = argparse.Namespace(field="status", value="paused")
+            args = argparse.Namespace(assignments=["status", "paused"], fsync=False)
             cmd_update(args)
 
             content = context_file.read_text()
@@ -449,7 +450,7 @@ branch: main
 ---
 """)
 
-            args = argparse.Namespace(field="branch", value="feature/new")
+            args = argparse.Namespace(assignments=["branch", "feature/new"], fsync=False)
             cmd_update(args)
 
             content = context_file.read_text()
@@ -688,3 +689,2019 @@ branch: main
 
         finally:
             os.chdir(original_cwd)
+
+
+class TestWorkspaceIndex:
+    """测试工作区索引"""
+
+    def test_list_projects_builds_index(self, temp_workspace, monkeypatch):
+        """首次列出项目时写入索引"""
+        from scripts.context_manager import get_index_file, list_projects, load_index
+
+        monkeypatch.chdir(temp_workspace)
+        projects = list_projects()
+
+        assert len(projects) == 3
+        assert get_index_file(temp_workspace).exists()
+        assert sorted(load_index(temp_workspace)["entries"]) == [
+            "project-0",
+            "project-1",
+            "project-2",
+        ]
+
+    def test_warm_index_skips_parse(self, temp_workspace, monkeypatch):
+        """索引命中时不再解析文件"""
+        import scripts.context_manager
+        from scripts.context_manager import list_projects
+
+        monkeypatch.chdir(temp_workspace)
+        first = list_projects()
+
+        def fail_parse(_content):
+            raise AssertionError("不应重新解析")
+
+        monkeypatch.setattr(scripts.context_manager, "parse_frontmatter", fail_parse)
+        second = list_projects()
+
+        assert sorted(second, key=lambda p: p["path"]) == sorted(first, key=lambda p: p["path"])
+
+    def test_touched_file_reuses_hash(self, temp_workspace, monkeypatch):
+        """mtime 变化但内容不变时不重新解析"""
+        import scripts.context_manager
+        from scripts.context_manager import list_projects
+
+        monkeypatch.chdir(temp_workspace)
+        list_projects()
+
+        context_file = temp_workspace / "project-0" / ".claude" / "context.md"
+        st = context_file.stat()
+        os.utime(context_file, ns=(st.st_atime_ns, st.st_mtime_ns + 5_000_000_000))
+
+        def fail_parse(_content):
+            raise AssertionError("不应重新解析")
+
+        monkeypatch.setattr(scripts.context_manager, "parse_frontmatter", fail_parse)
+        assert len(list_projects()) == 3
+
+    def test_changed_and_removed_projects(self, temp_workspace, monkeypatch):
+        """修改的文件会重新解析，删除的项目会从索引移除"""
+        import shutil
+
+        from scripts.context_manager import list_projects, load_index
+
+        monkeypatch.chdir(temp_workspace)
+        list_projects()
+
+        context_file = temp_workspace / "project-1" / ".claude" / "context.md"
+        context_file.write_text(
+            context_file.read_text().replace("status: paused", "status: completed") + "\n"
+        )
+        shutil.rmtree(temp_workspace / "project-2")
+
+        projects = {p["path"]: p for p in list_projects()}
+        assert projects["project-1"]["status"] == "completed"
+        assert "project-2" not in projects
+        assert "project-2" not in load_index(temp_workspace)["entries"]
+
+    def test_corrupt_index_is_ignored(self, temp_workspace, monkeypatch):
+        """损坏的索引会被忽略并重建"""
+        from scripts.context_manager import get_index_file, list_projects, load_index
+
+        monkeypatch.chdir(temp_workspace)
+        index_file = get_index_file(temp_workspace)
+        index_file.parent.mkdir()
+        index_file.write_text("{not json")
+
+        assert len(list_projects()) == 3
+        assert len(load_index(temp_workspace)["entries"]) == 3
+
+    def test_cmd_index_verify_and_rebuild(self, temp_workspace, monkeypatch, capsys):
+        """测试 ctx index --verify / --rebuild"""
+        import argparse
+
+        from scripts.context_manager import cmd_index, list_projects
+
+        monkeypatch.chdir(temp_workspace)
+        list_projects()
+
+        cmd_index(argparse.Namespace(rebuild=False, verify=True))
+        assert "索引校验通过" in capsys.readouterr().out
+
+        context_file = temp_workspace / "project-0" / ".claude" / "context.md"
+        context_file.write_text(context_file.read_text().replace("status: active", "status: paused"))
+        with pytest.raises(SystemExit):
+            cmd_index(argparse.Namespace(rebuild=False, verify=True))
+        assert "内容已变化" in capsys.readouterr().out
+
+        cmd_index(argparse.Namespace(rebuild=True, verify=False))
+        assert "3 个项目" in capsys.readouterr().out
+        cmd_index(argparse.Namespace(rebuild=False, verify=True))
+        assert "索引校验通过" in capsys.readouterr().out
+
+
+class TestParallelListProjects:
+    """测试并发扫描"""
+
+    def test_parallel_matches_serial(self, temp_workspace, monkeypatch):
+        """并发结果与串行一致且顺序确定"""
+        from scripts.context_manager import list_projects
+
+        monkeypatch.chdir(temp_workspace)
+        monkeypatch.setenv("CTX_NO_INDEX", "1")
+        for i in range(3, 12):
+            claude_dir = temp_workspace / f"project-{i}" / ".claude"
+            claude_dir.mkdir(parents=True)
+            (claude_dir / "context.md").write_text(f"---\nproject: project-{i}\n---\n")
+
+        serial = list_projects(jobs=1)
+        parallel = list_projects(jobs=4)
+
+        assert parallel == serial
+        assert [p["path"] for p in parallel] == sorted(p["path"] for p in parallel)
+
+    def test_parallel_keeps_warnings(self, temp_workspace, monkeypatch, capsys):
+        """并发模式下仍输出单个文件的警告"""
+        from scripts.context_manager import list_projects
+
+        monkeypatch.chdir(temp_workspace)
+        broken = temp_workspace / "project-1" / ".claude" / "context.md"
+        broken.write_text("---\nproject: broken\nsession_count: many\n---\n")
+
+        projects = list_projects(jobs=4)
+
+        assert [p["path"] for p in projects] == ["project-0", "project-2"]
+        assert "project-1/.claude/context.md" in capsys.readouterr().err
+
+    def test_resolve_jobs(self, monkeypatch):
+        """测试并发数解析"""
+        from scripts.context_manager import resolve_jobs
+
+        monkeypatch.delenv("CTX_JOBS", raising=False)
+        assert resolve_jobs() == 1
+        assert resolve_jobs(6) == 6
+        monkeypatch.setenv("CTX_JOBS", "3")
+        assert resolve_jobs() == 3
+        assert resolve_jobs(2) == 2
+        assert resolve_jobs(0) >= 1
+        monkeypatch.setenv("CTX_JOBS", "lots")
+        assert resolve_jobs() == 1
+
+
+class TestDiscoverProjects:
+    """测试递归项目发现"""
+
+    @staticmethod
+    def _make_project(path, name=None):
+        claude_dir = path / ".claude"
+        claude_dir.mkdir(parents=True)
+        (claude_dir / "context.md").write_text(f"---\nproject: {name or path.name}\n---\n")
+
+    def test_grouped_layout(self, temp_workspace):
+        """发现分组目录下的项目，并跳过默认剪枝目录"""
+        from scripts.context_manager import discover_projects
+
+        self._make_project(temp_workspace / "clients" / "acme")
+        self._make_project(temp_workspace / "oss" / "tool")
+        self._make_project(temp_workspace / "oss" / "node_modules" / "dep")
+        self._make_project(temp_workspace / "project-0" / "sub" / "nested")
+
+        found, stats = discover_projects(temp_workspace)
+
+        # project-0 已是项目，不再向下递归
+        assert found == ["clients/acme", "oss/tool", "project-0", "project-1", "project-2"]
+        assert stats["projects"] == 5
+        assert stats["pruned"] >= 1
+        assert stats["visited"] > 0
+
+    def test_max_depth(self, temp_workspace, monkeypatch):
+        """深度限制为 1 时与旧行为一致"""
+        from scripts.context_manager import discover_projects
+
+        self._make_project(temp_workspace / "clients" / "acme")
+
+        found, _ = discover_projects(temp_workspace, max_depth=1)
+        assert found == ["project-0", "project-1", "project-2"]
+
+        monkeypatch.setenv("CTX_MAX_DEPTH", "2")
+        found, stats = discover_projects(temp_workspace)
+        assert "clients/acme" in found
+        assert stats["max_depth"] == 2
+
+    def test_ignore_file(self, temp_workspace):
+        """.ctxignore 支持目录名和相对路径模式"""
+        from scripts.context_manager import discover_projects
+
+        self._make_project(temp_workspace / "archive" / "old")
+        self._make_project(temp_workspace / "clients" / "acme")
+        self._make_project(temp_workspace / "clients" / "beta")
+        (temp_workspace / ".ctxignore").write_text("# 注释\narchive/\nclients/b*\n")
+
+        found, _ = discover_projects(temp_workspace)
+
+        assert "archive/old" not in found
+        assert "clients/beta" not in found
+        assert "clients/acme" in found
+
+    def test_list_projects_nested(self, temp_workspace, monkeypatch, capsys):
+        """ctx ls 显示嵌套项目并输出扫描统计"""
+        import argparse
+
+        from scripts.context_manager import cmd_ls, list_projects
+
+        self._make_project(temp_workspace / "clients" / "acme")
+        monkeypatch.chdir(temp_workspace)
+
+        paths = [p["path"] for p in list_projects()]
+        assert "clients/acme" in paths
+
+        cmd_ls(argparse.Namespace(jobs=None, depth=None, stats=True))
+        captured = capsys.readouterr()
+        assert "clients/acme" in captured.out
+        assert "扫描" in captured.err
+
+
+class TestParseFrontmatter:
+    """测试只解析 frontmatter 的快速路径"""
+
+    CONTENT = """---
+project: fast
+created: 2024-01-01
+last_session: "2024-02-01"
+session_count: 7
+status: paused
+stack:
+  - Python
+---
+
+## 待办事项
+- [ ] 任务1
+
+## 会话记录
+### 2024-02-01 (会话 #7)
+"""
+
+    def test_matches_full_parse(self):
+        """frontmatter 字段与完整解析一致"""
+        from scripts.context_manager import parse_context, parse_frontmatter
+
+        full = parse_context(self.CONTENT)
+        header = parse_frontmatter(self.CONTENT)
+
+        assert header["todos"] == []
+        assert header["has_sessions"] is False
+        for field in ("project", "created", "last_session", "session_count", "status"):
+            assert header[field] == full[field]
+        assert header["stack"] == ["Python"]
+        assert header["format_version"] == full["format_version"] == "v2"
+
+    def test_selected_fields(self):
+        """只返回请求的字段"""
+        from scripts.context_manager import parse_frontmatter
+
+        result = parse_frontmatter(self.CONTENT, fields=["status", "session_count"])
+
+        assert result == {"status": "paused", "session_count": 7}
+        with pytest.raises(ValueError):
+            parse_frontmatter(self.CONTENT, fields=["nope"])
+
+    def test_read_header_stops_at_closing_marker(self, tmp_path):
+        """只读取到 frontmatter 结束标记"""
+        from scripts.context_manager import read_frontmatter, read_header
+
+        context_file = tmp_path / "context.md"
+        context_file.write_text(self.CONTENT + "\n".join(f"- 会话 {i}" for i in range(10000)))
+
+        header = read_header(context_file)
+        assert header.endswith(b"---\n")
+        assert b"## " not in header
+        assert read_frontmatter(context_file, ["project"]) == {"project": "fast"}
+
+    def test_no_frontmatter(self, tmp_path):
+        """没有 frontmatter 时读到正文标题即停止"""
+        from scripts.context_manager import read_frontmatter, read_header
+
+        context_file = tmp_path / "context.md"
+        context_file.write_text("# 标题\n\n## 待办事项\n- [ ] 任务\n---\nproject: x\n---\n")
+
+        assert read_header(context_file) == "# 标题\n\n".encode()
+        assert read_frontmatter(context_file)["project"] == "Unknown"
+
+
+class TestParseContextDifferential:
+    """表驱动解析器与原实现的差分测试"""
+
+    FRONTMATTER_LINES = [
+        "project: diff-{n}",
+        "created: 2024-01-0{d}",
+        'last_session: "2024-02-0{d}"',
+        "last_session: 2024-03-0{d}",
+        "session_count: {n}",
+        "status: active",
+        "status: paused                 # active | paused | completed",
+        "category: 探索性",
+        "project_type: flask-api",
+        "project_type:",
+        'current_focus: "焦点 {n}: 含冒号"',
+        "next_steps: 下一步",
+        'brief: "项目 {n}"',
+        "branch: feature/x-{n}",
+        "stack:",
+        "  - Python",
+        "  - Vue 3",
+        "    nested",
+        "# ============ 注释 ============",
+        "",
+        "unknown_key: value",
+        "projectx: nope",
+    ]
+    BODY_LINES = [
+        "## 📋 待办事项",
+        "## 待办",
+        "### P0 [本周]",
+        "### P1",
+        "  ### P2 缩进",
+        "- [ ] 任务 {n} " + "很长" * 40,
+        "  - [ ] 子任务",
+        "- [x] 已完成",
+        "## 📝 会话记录",
+        "## 本次会话概览",
+        "## 已完成工作",
+        "### 2024-01-0{d} (会话 #{n})",
+        "**主题**: 第 {n} 次",
+        "- ✅ 完成",
+        "## 📝 笔记/决策",
+        "## 🔗 相关资源",
+        "## 会话之外",
+        "普通文本 {n}",
+        "---",
+        "",
+    ]
+
+    @staticmethod
+    def _documents():
+        import random
+
+        from scripts.context_manager import _get_project_template, _get_workspace_template
+
+        yield _get_project_template("demo", "2024-01-01")
+        yield _get_workspace_template("workspace", "2024-01-01")
+        yield ""
+        yield "\n\n---\n"
+
+        rng = random.Random(20240101)
+        cls = TestParseContextDifferential
+        for _ in range(500):
+            lines = ["---"] if rng.random() < 0.9 else []
+            lines += rng.choices(cls.FRONTMATTER_LINES, k=rng.randint(0, 15))
+            lines.append("---")
+            lines += rng.choices(cls.BODY_LINES, k=rng.randint(0, 40))
+            text = "\n".join(lines).format(n=rng.randint(0, 99), d=rng.randint(1, 9))
+            yield text.replace("\n", "\r\n") if rng.random() < 0.1 else text
+
+    @pytest.mark.parametrize("chunk_size", [None, 1, 7, 64], ids=["default", "1", "7", "64"])
+    def test_matches_legacy_parser(self, chunk_size):
+        """输出与原实现逐字段一致；块跨越读取边界（小 chunk_size）时结果不变"""
+        import io
+
+        from scripts.context_manager import _parse_sections, iter_sections, parse_context
+        from tests.legacy_parse import legacy_parse_context
+
+        for content in self._documents():
+            if chunk_size is None:
+                parsed = parse_context(content)
+            else:
+                parsed = _parse_sections(iter_sections(io.StringIO(content), chunk_size))
+            assert parsed == legacy_parse_context(content), (chunk_size, content)
+
+    def test_small_chunks_round_trip(self):
+        """任意 chunk_size 下各块拼接后与原文一致，且不产出空块"""
+        import io
+
+        from scripts.context_manager import iter_sections
+
+        for content in self._documents():
+            for chunk_size in (1, 7, 64):
+                sections = list(iter_sections(io.StringIO(content), chunk_size=chunk_size))
+                assert "".join(section.text for section in sections) == content
+                assert all(section.text for section in sections), (chunk_size, content)
+
+    def test_invalid_session_count_still_raises(self):
+        """非法 session_count 与原实现一样抛出 ValueError"""
+        from scripts.context_manager import parse_context
+
+        with pytest.raises(ValueError):
+            parse_context("---\nsession_count: many\n---\n")
+
+
+class TestStreamingSections:
+    """测试流式章节读取"""
+
+    @staticmethod
+    def _write_large_context(path, sessions):
+        lines = [
+            "---",
+            "project: huge",
+            "created: 2024-01-01",
+            "session_count: 3",
+            "status: active",
+            "---",
+            "",
+            "## 待办事项",
+            "- [ ] 任务1",
+            "",
+            "## 会话记录",
+            "",
+        ]
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write("\n".join(lines) + "\n")
+            for n in range(sessions):
+                fh.write(f"### 2024-01-01 (会话 #{n})\n**主题**: 第 {n} 次会话\n- ✅ 完成了一些工作\n\n")
+            fh.write("## 📝 笔记/决策\n- 最后一条\n")
+
+    def test_section_kinds(self):
+        """按章节产出 frontmatter / todos / sessions / body 块"""
+        import io
+
+        from scripts.context_manager import _get_project_template, iter_sections
+
+        # 注意：解析器（与原实现一致）只识别不带 emoji 的章节标题
+        content = _get_project_template("demo", "2024-01-01")
+        content = content.replace("📋 ", "").replace("📝 会话", "会话")
+        sections = list(iter_sections(io.StringIO(content)))
+
+        assert "".join(section.text for section in sections) == content
+        assert sections[0].kind == "frontmatter"
+        assert sections[0].text.startswith("---\n") and sections[0].text.endswith("---\n")
+        kinds = [section.kind for section in sections]
+        assert kinds.index("todos") < kinds.index("sessions")
+        assert kinds[-1] == "body"
+
+    def test_parse_context_file_memory_ceiling(self, tmp_path):
+        """解析数 MB 的文件时峰值内存保持在固定上限内"""
+        import tracemalloc
+
+        from scripts.context_manager import parse_context_file
+
+        context_file = tmp_path / "context.md"
+        self._write_large_context(context_file, sessions=120000)
+        assert context_file.stat().st_size > 8_000_000
+
+        tracemalloc.start()
+        try:
+            info = parse_context_file(context_file)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        assert info["project"] == "huge"
+        assert info["todos"] == ["任务1"]
+        assert info["has_sessions"] is True
+        assert peak < 2_500_000
+
+    def test_migrate_memory_ceiling(self, tmp_path, monkeypatch):
+        """迁移大文件时流式复制正文，峰值内存保持在固定上限内"""
+        import argparse
+        import tracemalloc
+
+        from scripts.context_manager import cmd_migrate
+
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / ".claude").mkdir()
+        context_file = tmp_path / ".claude" / "context.md"
+        self._write_large_context(context_file, sessions=120000)
+        original = context_file.read_text(encoding="utf-8")
+        body = original.split("---\n", 2)[2]
+        context_file.write_text(original.replace("status: active\n", ""), encoding="utf-8")
+
+        tracemalloc.start()
+        try:
+            cmd_migrate(argparse.Namespace())
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        migrated = context_file.read_text(encoding="utf-8")
+        assert migrated.startswith("---\n# ============ 基本信息 ============\nproject: huge\n")
+        assert migrated.endswith("---\n\n" + body)
+        assert peak < 2_500_000
+
+
+class TestArchiveSessions:
+    """测试会话归档"""
+
+    @staticmethod
+    def _write_context(path, dates):
+        sessions = "".join(
+            f"### {date} (会话 #{n})\n**主题**: 会话 {n}\n\n" for n, date in enumerate(dates, 1)
+        )
+        path.write_text(
+            "---\nproject: demo\ncreated: 2024-01-01\nsession_count: 3\nstatus: active\n---\n\n"
+            "## 📋 待办事项\n- [ ] 任务1\n\n"
+            f"## 📝 会话记录\n\n{sessions}"
+            "## 📝 笔记/决策\n- 保留的笔记\n",
+            encoding="utf-8",
+        )
+
+    def test_archive_keep_most_recent(self, tmp_path):
+        """--keep 只保留最近 K 个会话，其余按年份写入归档"""
+        from scripts.context_manager import (
+            archive_sessions,
+            load_sessions_index,
+            read_archived_session,
+        )
+
+        context_file = tmp_path / "context.md"
+        self._write_context(context_file, ["2026-03-01", "2025-12-01", "2024-05-01"])
+
+        records = archive_sessions(context_file, keep=1)
+
+        content = context_file.read_text(encoding="utf-8")
+        assert "### 2026-03-01" in content
+        assert "2025-12-01" not in content and "2024-05-01" not in content
+        assert "- [ ] 任务1" in content and "- 保留的笔记" in content
+        assert [r["file"] for r in records] == ["2025.md", "2024.md"]
+
+        sessions_dir = tmp_path / "sessions"
+        index = load_sessions_index(sessions_dir)
+        assert index == records
+        assert read_archived_session(sessions_dir, index[0]).startswith("### 2025-12-01 (会话 #2)")
+
+    def test_archive_days_gzip_seek(self, tmp_path):
+        """--days 归档旧会话；gzip 归档可按偏移单独读取"""
+        from scripts.context_manager import archive_sessions, read_archived_session
+
+        context_file = tmp_path / "context.md"
+        self._write_context(context_file, ["2099-01-01", "2020-02-01", "2020-01-01"])
+
+        records = archive_sessions(context_file, days=30, compress=True)
+        assert [r["date"] for r in records] == ["2020-02-01", "2020-01-01"]
+        assert {r["file"] for r in records} == {"2020.md.gz"}
+
+        text = read_archived_session(tmp_path / "sessions", records[1])
+        assert text == "### 2020-01-01 (会话 #3)\n**主题**: 会话 3\n\n"
+        assert "2020-" not in context_file.read_text(encoding="utf-8")
+
+    def test_dry_run_and_lossless(self, tmp_path):
+        """--dry-run 不修改文件；归档内容与 context.md 拼接后不丢信息"""
+        from scripts.context_manager import archive_sessions
+
+        context_file = tmp_path / "context.md"
+        self._write_context(context_file, ["2026-03-01", "2025-12-01", "2024-05-01"])
+        original = context_file.read_text(encoding="utf-8")
+
+        assert len(archive_sessions(context_file, keep=0, dry_run=True)) == 3
+        assert context_file.read_text(encoding="utf-8") == original
+        assert not (tmp_path / "sessions").exists()
+
+        archive_sessions(context_file, keep=0)
+        archived = "".join(
+            (tmp_path / "sessions" / f"{year}.md").read_text(encoding="utf-8")
+            for year in ("2026", "2025", "2024")
+        )
+        remaining = context_file.read_text(encoding="utf-8")
+        assert sorted((remaining + archived).splitlines()) == sorted(original.splitlines())
+
+
+class TestContextCache:
+    """测试单项目解析缓存"""
+
+    @staticmethod
+    def _write(context_file, status, mtime_ns):
+        context_file.write_text(
+            f"---\nproject: demo\nstatus: {status}\n---\n\n## 待办事项\n- [ ] 任务1\n", encoding="utf-8"
+        )
+        os.utime(context_file, ns=(mtime_ns, mtime_ns))
+
+    @staticmethod
+    def _count_parses(monkeypatch):
+        from scripts import context_manager as cm
+
+        calls = []
+        real = cm.parse_context_file
+
+        def counting(path):
+            calls.append(path)
+            return real(path)
+
+        monkeypatch.setattr(cm, "parse_context_file", counting)
+        return calls
+
+    def test_cache_hit_and_touch(self, tmp_path, monkeypatch):
+        """命中缓存时不重新解析；touch 后只校验哈希"""
+        from scripts.context_manager import get_context_cache_file, load_context, parse_context_file
+
+        monkeypatch.delenv("CTX_NO_CACHE", raising=False)
+        context_file = tmp_path / "context.md"
+        old_ns = time.time_ns() - 3600 * 10**9
+        self._write(context_file, "active", old_ns)
+        expected = {**parse_context_file(context_file), "todo_count": 1}
+        calls = self._count_parses(monkeypatch)
+
+        assert load_context(context_file) == expected
+        assert get_context_cache_file(context_file).exists()
+        assert load_context(context_file) == expected
+        os.utime(context_file, ns=(old_ns + 10**9, old_ns + 10**9))
+        assert load_context(context_file) == expected
+        assert len(calls) == 1
+
+    def test_checkout_and_clock_skew_invalidate(self, tmp_path, monkeypatch):
+        """内容变化（包括同大小、mtime 在未来）时重新解析"""
+        from scripts.context_manager import load_context
+
+        monkeypatch.delenv("CTX_NO_CACHE", raising=False)
+        context_file = tmp_path / "context.md"
+        old_ns = time.time_ns() - 3600 * 10**9
+        self._write(context_file, "active", old_ns)
+        load_context(context_file)
+
+        # git checkout：内容和 mtime 都变化
+        self._write(context_file, "paused", old_ns + 10**9)
+        assert load_context(context_file)["status"] == "paused"
+
+        # 时钟偏差：mtime 在未来，同大小内容替换后 stat 完全相同
+        future_ns = time.time_ns() + 3600 * 10**9
+        self._write(context_file, "active", future_ns)
+        assert load_context(context_file)["status"] == "active"
+        self._write(context_file, "paused", future_ns)
+        assert load_context(context_file)["status"] == "paused"
+
+    def test_disable_with_env(self, tmp_path, monkeypatch):
+        """CTX_NO_CACHE=1 时不读写缓存"""
+        from scripts.context_manager import get_context_cache_file, load_context
+
+        monkeypatch.setenv("CTX_NO_CACHE", "1")
+        context_file = tmp_path / "context.md"
+        self._write(context_file, "active", time.time_ns())
+
+        assert load_context(context_file)["status"] == "active"
+        assert not get_context_cache_file(context_file).exists()
+
+
+class TestDaemon:
+    """测试 ctxd 守护进程与瘦客户端"""
+
+    @pytest.fixture
+    def daemon_socket(self, monkeypatch):
+        import tempfile
+
+        # Unix socket 路径长度有限，放到短路径下
+        with tempfile.TemporaryDirectory(prefix="ctxd") as tmp:
+            sock_path = os.path.join(tmp, "s")
+            monkeypatch.setenv("CTX_SOCKET", sock_path)
+            monkeypatch.delenv("CTX_NO_DAEMON", raising=False)
+            yield sock_path
+
+    @staticmethod
+    def _start(workspace, use_inotify):
+        import threading
+
+        from scripts.context_manager import _daemon_call, get_daemon_socket, run_daemon
+
+        thread = threading.Thread(target=run_daemon, args=(workspace, use_inotify, 0.05))
+        thread.start()
+        sock_path = get_daemon_socket(workspace)
+        for _ in range(300):
+            if sock_path.exists() and _daemon_call(sock_path, {"cmd": "ping"}):
+                break
+            time.sleep(0.01)
+        return thread, sock_path
+
+    @staticmethod
+    def _direct(func, capsys):
+        capsys.readouterr()
+        func()
+        return capsys.readouterr().out
+
+    @pytest.mark.parametrize("use_inotify", [True, False], ids=["inotify", "polling"])
+    def test_daemon_matches_direct_mode(
+        self, temp_workspace, daemon_socket, capsys, monkeypatch, use_inotify
+    ):
+        """守护进程的输出与直接模式一致，文件修改和新项目能及时反映"""
+        from scripts.context_manager import (
+            _daemon_call,
+            cmd_ls,
+            cmd_show,
+            daemon_request,
+            show_status,
+        )
+
+        project = temp_workspace / "project-0"
+        monkeypatch.chdir(project)
+        thread, sock_path = self._start(temp_workspace, use_inotify)
+        try:
+            assert daemon_request("status") == self._direct(show_status, capsys)
+            assert daemon_request("show") == self._direct(lambda: cmd_show(None), capsys)
+            assert daemon_request("ls") == self._direct(lambda: cmd_ls(None), capsys)
+
+            context_file = project / ".claude" / "context.md"
+            content = context_file.read_text(encoding="utf-8")
+            paused = content.replace("status: active", "status: paused")
+            context_file.write_text(paused, encoding="utf-8")
+            assert "状态: paused" in daemon_request("status")
+
+            new_project = temp_workspace / "clients" / "acme" / ".claude"
+            new_project.mkdir(parents=True)
+            (new_project / "context.md").write_text(content, encoding="utf-8")
+            time.sleep(0.1)
+            assert "clients/acme" in daemon_request("ls")
+        finally:
+            _daemon_call(sock_path, {"cmd": "shutdown"})
+            thread.join(5)
+        assert not sock_path.exists()
+
+    def test_nested_project_is_stat_validated(self, temp_workspace):
+        """嵌套在其他项目中的项目不受 inotify 监视，修改后不能返回旧条目"""
+        from scripts import context_manager as cm
+
+        state = cm._new_daemon_state(temp_workspace)
+        if state["inotify"] is None:
+            pytest.skip("inotify 不可用")
+        try:
+            nested = temp_workspace / "project-0" / "sub" / ".claude"
+            nested.mkdir(parents=True)
+            context_file = nested / "context.md"
+            context_file.write_text("---\nproject: sub\nstatus: active\n---\n", encoding="utf-8")
+            assert "project-0/sub" not in cm._daemon_discover(state)
+            assert cm._daemon_context(state, context_file)["status"] == "active"
+
+            context_file.write_text("---\nproject: sub\nstatus: paused\n---\n", encoding="utf-8")
+            cm._daemon_handle_events(state)
+            assert cm._daemon_context(state, context_file)["status"] == "paused"
+        finally:
+            os.close(state["inotify"]["fd"])
+
+    def test_client_falls_back_without_daemon(
+        self, temp_workspace, daemon_socket, capsys, monkeypatch
+    ):
+        """守护进程未运行时回退到直接模式"""
+        import sys
+
+        from scripts.context_manager import daemon_request, main, show_status
+
+        monkeypatch.chdir(temp_workspace / "project-0")
+        assert daemon_request("status") is None
+
+        expected = self._direct(show_status, capsys)
+        monkeypatch.setattr(sys, "argv", ["ctx", "status"])
+        main()
+        assert capsys.readouterr().out == expected
+
+
+class TestWatch:
+    """测试 ctx watch 的增量刷新"""
+
+    def test_apply_updates_only_changed_projects(self, temp_workspace, monkeypatch):
+        """只重新读取变化的项目，并同步更新工作区索引"""
+        from scripts import context_manager as cm
+
+        state = cm._new_watch_state(temp_workspace, use_inotify=False)
+        assert sorted(state["projects"]) == ["project-0", "project-1", "project-2"]
+
+        context_file = temp_workspace / "project-1" / ".claude" / "context.md"
+        content = context_file.read_text(encoding="utf-8")
+        context_file.write_text(content.replace("paused", "completed"), encoding="utf-8")
+        (temp_workspace / "project-2" / ".claude" / "context.md").unlink()
+
+        reads = []
+        real = cm._read_indexed_context
+
+        def counting(index, key, path):
+            reads.append(key)
+            return real(index, key, path)
+
+        monkeypatch.setattr(cm, "_read_indexed_context", counting)
+        updates = cm._watch_apply(state, {"project-1"}, rediscover=True)
+
+        assert updates == {"project-1": "~", "project-2": "-"}
+        assert sorted(reads) == ["project-1", "project-2"]
+        entries = cm.load_index(temp_workspace)["entries"]
+        assert sorted(entries) == ["project-0", "project-1"]
+        assert entries["project-1"]["info"]["status"] == "completed"
+
+    def test_screen_updates_redraw_changed_rows(self):
+        """只重绘内容变化的行，行数减少时清除多余部分"""
+        from scripts.context_manager import _screen_updates
+
+        assert _screen_updates(["a", "b", "c"], ["a", "B", "c"]) == "\x1b[2;1H\x1b[2KB"
+        assert _screen_updates(["a", "b", "c"], ["a", "b"]) == "\x1b[3;1H\x1b[J"
+        assert _screen_updates(["a"], ["a"]) == ""
+
+    def test_inotify_debounces_bursts(self, temp_workspace):
+        """连续多次保存合并为一次更新"""
+        from scripts.context_manager import _new_watch_state, _watch_collect
+
+        state = _new_watch_state(temp_workspace)
+        if state["inotify"] is None:
+            pytest.skip("inotify 不可用")
+        try:
+            context_file = temp_workspace / "project-0" / ".claude" / "context.md"
+            for _ in range(5):
+                with open(context_file, "a", encoding="utf-8") as fh:
+                    fh.write("\n")
+            changed, rediscover = _watch_collect(state, 1.0, debounce=0.05)
+            assert changed == {"project-0"}
+            assert not rediscover
+            assert _watch_collect(state, 0.05, debounce=0.05) == (set(), False)
+        finally:
+            os.close(state["inotify"]["fd"])
+
+    def test_project_created_in_stages(self, temp_workspace):
+        """先建 .claude 目录、稍后才写入 context.md 的项目也能被发现"""
+        from scripts.context_manager import _new_watch_state, _watch_apply, _watch_collect
+
+        content = "---\nproject: x\nstatus: active\n---\n"
+        (temp_workspace / "early" / ".claude").mkdir(parents=True)
+        (temp_workspace / "mid").mkdir()
+        state = _new_watch_state(temp_workspace)
+        if state["inotify"] is None:
+            pytest.skip("inotify 不可用")
+        try:
+            (temp_workspace / "mid" / ".claude").mkdir()
+            (temp_workspace / "late" / ".claude").mkdir(parents=True)
+            changed, rediscover = _watch_collect(state, 1.0, debounce=0.05)
+            assert _watch_apply(state, changed, rediscover) == {}
+
+            for name in ("early", "mid", "late"):
+                (temp_workspace / name / ".claude" / "context.md").write_text(
+                    content, encoding="utf-8"
+                )
+            changed, rediscover = _watch_collect(state, 1.0, debounce=0.05)
+            assert changed == {"early", "mid", "late"}
+            updates = _watch_apply(state, changed, rediscover)
+            assert updates == {"early": "+", "mid": "+", "late": "+"}
+        finally:
+            os.close(state["inotify"]["fd"])
+
+
+class TestStartupTime:
+    """测试 ctx 快速路径的导入（python -X importtime）"""
+
+    # 顶层模块导入耗时之和的预算（不含解释器自身启动），慢速 CI 可用 CTX_STARTUP_BUDGET_MS 放宽
+    IMPORT_BUDGET_MS = 100
+    # 快速路径上不应出现的模块
+    DEFERRED = ("argparse", "hashlib", "datetime", "typing", "contextlib", "socket", "gettext")
+
+    @staticmethod
+    def _importtime(temp_workspace, tmp_path, *args):
+        """运行 ctx.py 并返回 {模块名: 累计导入耗时(us)} 和顶层模块总耗时"""
+        import subprocess
+        import sys
+        from pathlib import Path
+
+        entry = Path(__file__).resolve().parent.parent / "ctx.py"
+        # 子进程的 HOME、缓存目录都指向 tmp_path，ctx prompt 不会写入真实的 ~/.cache/ctx
+        env = dict(
+            os.environ,
+            HOME=str(tmp_path / "home"),
+            XDG_CACHE_HOME=str(tmp_path / "cache"),
+            CTX_NO_GIT="1",
+            CTX_NO_DAEMON="1",
+            PYTHONPYCACHEPREFIX=str(tmp_path / "pyc"),
+        )
+        env.pop("PYTHONDONTWRITEBYTECODE", None)
+        command = [sys.executable, "-X", "importtime", str(entry), *args]
+        cwd = temp_workspace / "project-0"
+        # 日常场景：context.md 早已写入，.context.cache 可直接命中
+        old_ns = time.time_ns() - 3600 * 10**9
+        os.utime(cwd / ".claude" / "context.md", ns=(old_ns, old_ns))
+        # 第一次运行生成字节码缓存，第二次才是常态下的启动
+        subprocess.run(command, cwd=cwd, env=env, capture_output=True, check=True)
+        result = subprocess.run(
+            command, cwd=cwd, env=env, capture_output=True, text=True, check=True
+        )
+
+        modules = {}
+        total = 0
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "imported package" in line:
+                continue
+            _, cumulative, name = line[len("import time:") :].split("|")
+            modules[name.strip()] = int(cumulative)
+            if not name[1:].startswith(" "):
+                total += int(cumulative)
+        return modules, total
+
+    @pytest.mark.parametrize(
+        "args", [(), ("status",), ("prompt",)], ids=["bare", "status", "prompt"]
+    )
+    def test_fast_path_defers_heavy_imports(self, temp_workspace, tmp_path, args):
+        """ctx / ctx status 不导入 argparse 等非必需模块"""
+        modules, _ = self._importtime(temp_workspace, tmp_path, *args)
+        assert "scripts.context_manager" in modules
+        assert not [name for name in self.DEFERRED if name in modules]
+
+    def test_import_budget(self, temp_workspace, tmp_path):
+        """ctx status 的模块导入总耗时（-X importtime 顶层模块之和）不超过预算"""
+        budget_ms = float(os.environ.get("CTX_STARTUP_BUDGET_MS", self.IMPORT_BUDGET_MS))
+        _, total = self._importtime(temp_workspace, tmp_path, "status")
+        assert total / 1000 < budget_ms, f"导入耗时 {total / 1000:.1f} ms 超出预算 {budget_ms} ms"
+
+
+class TestPrompt:
+    """测试 ctx prompt 提示符片段"""
+
+    @pytest.fixture
+    def project(self, tmp_path, monkeypatch, isolate_home):
+        # isolate_home：缓存写入临时 HOME，默认关闭 Git 检测（需要时在测试中打开）
+        project = tmp_path / "demo"
+        (project / ".claude").mkdir(parents=True)
+        (project / ".claude" / "context.md").write_text(
+            "---\nproject: demo\nstatus: active\nbranch: main\n---\n\n## 待办事项\n- [ ] 任务1\n",
+            encoding="utf-8",
+        )
+        monkeypatch.chdir(project)
+        return project
+
+    def test_warm_call_does_not_parse(self, project, capsys, monkeypatch):
+        """缓存命中时不读取、不解析 context.md"""
+        from scripts import context_manager as cm
+
+        cm.cmd_prompt(None)
+        assert capsys.readouterr().out == "🟢 demo (main) 📋1\n"
+
+        def fail(_path):
+            raise AssertionError("不应重新解析")
+
+        monkeypatch.setattr(cm, "load_context", fail)
+        cm.cmd_prompt(None)
+        assert capsys.readouterr().out == "🟢 demo (main) 📋1\n"
+
+    def test_mtime_change_refreshes(self, project, capsys):
+        """context.md 变化后重新生成；没有 context.md 时不输出"""
+        from scripts.context_manager import cmd_prompt, prompt_line
+
+        cmd_prompt(None)
+        context_file = project / ".claude" / "context.md"
+        context_file.write_text("---\nproject: demo\nstatus: paused\n---\n", encoding="utf-8")
+        assert prompt_line(project) == ("🟢 demo (main) 📋1", False)
+
+        cmd_prompt(None)
+        assert capsys.readouterr().out.splitlines()[-1] == "🟡 demo"
+
+        context_file.unlink()
+        cmd_prompt(None)
+        assert capsys.readouterr().out == ""
+
+    def test_branch_follows_git_head(self, project, capsys, monkeypatch, isolate_home):
+        """分支取自 .git（与 ctx status 一致），切换分支后缓存失效"""
+        from scripts.context_manager import cmd_prompt, prompt_line
+
+        monkeypatch.delenv("CTX_NO_GIT")
+
+        git_dir = project / ".git"
+        (git_dir / "refs" / "heads").mkdir(parents=True)
+        (git_dir / "refs" / "heads" / "master").write_text("a" * 40 + "\n")
+        head = git_dir / "HEAD"
+        head.write_text("ref: refs/heads/master\n")
+        cmd_prompt(None)
+        assert capsys.readouterr().out == "🟢 demo (master) 📋1\n"
+
+        head.write_text("ref: refs/heads/dev\n")
+        st = head.stat()
+        os.utime(head, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        assert prompt_line(project) == ("🟢 demo (master) 📋1", False)
+        cmd_prompt(None)
+        assert capsys.readouterr().out == "🟢 demo (dev) 📋1\n"
+        assert not (isolate_home / "workspace" / ".ctx").exists()
+
+    def test_init_template_strips_comments(self, tmp_path, isolate_home):
+        """ctx init 模板中的行尾注释不出现在提示符中；带 emoji 的待办标题也计入待办数"""
+        from scripts.context_manager import _get_project_template, refresh_prompt
+
+        project = tmp_path / "p"
+        (project / ".claude").mkdir(parents=True)
+        (project / ".claude" / "context.md").write_text(
+            _get_project_template("p", "2024-01-01"), encoding="utf-8"
+        )
+        assert refresh_prompt(project) == "🟢 p (main) 📋4"
+
+    def test_async_prints_cached_value_and_refreshes(self, project, capsys, monkeypatch):
+        """--async 立即输出旧值，并在后台刷新"""
+        from types import SimpleNamespace
+
+        from scripts import context_manager as cm
+
+        cm.cmd_prompt(None)
+        capsys.readouterr()
+        (project / ".claude" / "context.md").write_text(
+            "---\nproject: demo\nstatus: completed\n---\n", encoding="utf-8"
+        )
+        spawned = []
+        monkeypatch.setattr(cm, "_spawn_prompt_refresh", lambda cwd: spawned.append(cwd))
+
+        cm.cmd_prompt(SimpleNamespace(async_=True))
+        assert capsys.readouterr().out == "🟢 demo (main) 📋1\n"
+        assert spawned == [project]
+
+        cm.refresh_prompt(project)
+        cm.cmd_prompt(SimpleNamespace(async_=True))
+        assert capsys.readouterr().out == "✅ demo\n"
+        assert spawned == [project]
+
+
+class TestStatusFormat:
+    """测试 ctx status --format=shell/json"""
+
+    CONTENT = (
+        "---\nproject: demo\nstatus: active\n"
+        "current_focus: \"it's $(echo pwned) `date` done\"\n"
+        "session_count: 4\nstack:\n  - Py thon\n  - Rust\n---\n\n## 待办事项\n- [ ] 任务 一\n"
+    )
+
+    def test_shell_export_round_trips_through_bash(self, tmp_path, monkeypatch, capsys):
+        """eval 后的变量值与 parse_context 一致，特殊字符不会被执行"""
+        import argparse
+        import shutil
+        import subprocess
+
+        from scripts.context_manager import cmd_status
+
+        if shutil.which("bash") is None:
+            pytest.skip("需要 bash")
+        (tmp_path / ".claude").mkdir()
+        (tmp_path / ".claude" / "context.md").write_text(self.CONTENT, encoding="utf-8")
+        monkeypatch.chdir(tmp_path)
+
+        cmd_status(argparse.Namespace(format="shell"))
+        script = capsys.readouterr().out + (
+            'printf "%s\\n" "$ctx_current_focus" "$ctx_session_count" "${ctx_stack[1]}" '
+            '"${ctx_todos[0]}" "$ctx_todo_count"'
+        )
+        result = subprocess.run(["bash", "-c", script], capture_output=True, text=True, check=True)
+
+        info = parse_context(self.CONTENT)
+        assert result.stdout.splitlines() == [info["current_focus"], "4", "Rust", "任务 一", "1"]
+
+    def test_json_and_missing_context(self, tmp_path, monkeypatch, capsys):
+        """json 输出全部字段；没有 context.md 时以非零状态退出"""
+        import argparse
+        import json
+
+        from scripts.context_manager import cmd_status
+
+        monkeypatch.chdir(tmp_path)
+        with pytest.raises(SystemExit):
+            cmd_status(argparse.Namespace(format="json"))
+        assert capsys.readouterr().out == ""
+
+        (tmp_path / ".claude").mkdir()
+        (tmp_path / ".claude" / "context.md").write_text(self.CONTENT, encoding="utf-8")
+        cmd_status(argparse.Namespace(format="json"))
+        expected = {**parse_context(self.CONTENT), "todo_count": 1}
+        assert json.loads(capsys.readouterr().out) == expected
+
+
+class TestFrontmatterEditor:
+    """测试基于偏移的 frontmatter 编辑"""
+
+    @pytest.fixture
+    def project(self, tmp_path, monkeypatch):
+        from scripts.context_manager import _get_project_template
+
+        (tmp_path / ".claude").mkdir()
+        context_file = tmp_path / ".claude" / "context.md"
+        content = _get_project_template("demo", "2024-01-01")
+        content += "\n### 2024-01-02 (会话 #2)\nbranch: 会话笔记中的 branch\nstatus: 不是字段\n"
+        context_file.write_text(content, encoding="utf-8")
+        monkeypatch.chdir(tmp_path)
+        return context_file
+
+    @staticmethod
+    def _update(field, value):
+        import argparse
+
+        from scripts.context_manager import cmd_update
+
+        cmd_update(argparse.Namespace(assignments=[field, value], fsync=False))
+
+    def test_replaces_value_and_keeps_comment_alignment(self, project):
+        """替换而不是前置拼接旧值，行尾注释保持原来的列"""
+        from scripts.context_manager import _display_width
+
+        before = project.read_text(encoding="utf-8").splitlines()
+        self._update("status", "paused")
+        self._update("category", "产品")
+        self._update("project_type", "cli")
+        after = project.read_text(encoding="utf-8").splitlines()
+
+        status_comment = "active | paused | completed"
+        category_comment = "探索性 | 产品 | 临时 | 学习"
+
+        def line(lines, key):
+            return next(item for item in lines if item.startswith(f"{key}:"))
+
+        assert line(after, "status") == "status: paused                 # " + status_comment
+        assert line(after, "category") == "category: 产品                 # " + category_comment
+        assert line(after, "project_type").startswith("project_type: cli ")
+        for key in ("status", "category", "project_type"):
+            # 按显示宽度计算，中文字符占两列
+            column = [_display_width(line(lines, key).split("#")[0]) for lines in (before, after)]
+            assert column[0] == column[1]
+        assert "session_count: 4" in after
+        assert line(after, "last_session") != line(before, "last_session")
+
+    def test_body_untouched(self, project):
+        """正文中形如字段的行不会被修改，frontmatter 之后的字节原样保留"""
+        body = project.read_bytes().split(b"\n---\n", 1)[1]
+        self._update("branch", "feature/x")
+        content = project.read_bytes()
+        assert content.split(b"\n---\n", 1)[1] == body
+        assert b"branch: feature/x              # \xe5\xbd\x93" in content
+        assert b"branch: \xe4\xbc\x9a" in content  # 会话笔记中的 branch 未变
+
+    def test_insert_missing_field_and_no_frontmatter(self, tmp_path, monkeypatch, capsys):
+        """缺失的字段插入到结束标记之前；没有 frontmatter 时不修改文件"""
+        from scripts.context_manager import parse_context
+
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / ".claude").mkdir()
+        context_file = tmp_path / ".claude" / "context.md"
+        context_file.write_text(
+            "---\nproject: demo\nstack:\n  - Go\n---\n## 待办\n", encoding="utf-8"
+        )
+        self._update("brief", "一句话")
+        assert context_file.read_text(encoding="utf-8") == (
+            '---\nproject: demo\nstack:\n  - Go\nbrief: "一句话"\n---\n## 待办\n'
+        )
+        assert parse_context(context_file.read_text(encoding="utf-8"))["stack"] == ["Go"]
+
+        context_file.write_text("# 旧格式\n\n## 当前状态\n", encoding="utf-8")
+        self._update("status", "paused")
+        assert "缺少 frontmatter" in capsys.readouterr().out
+        assert context_file.read_text(encoding="utf-8") == "# 旧格式\n\n## 当前状态\n"
+
+    def test_index_offsets(self):
+        """记录的字节范围覆盖冒号后到注释前的部分（含多字节字符和 CRLF）"""
+        import io
+
+        from scripts.context_manager import index_frontmatter
+
+        data = '---\r\nproject: 演示\r\nstatus: active   # 注释\r\nbrief: "a #b"\r\n---\r\n正文\r\n'
+        raw = data.encode("utf-8")
+        layout = index_frontmatter(io.BytesIO(raw))
+
+        def slot(key):
+            item = layout["fields"][key]
+            return raw[item.start : item.end].decode("utf-8"), item.comment, item.quoted
+
+        assert slot("project") == (" 演示", False, False)
+        assert slot("status") == (" active   ", True, False)
+        assert slot("brief") == (' "a #b"', False, True)
+        assert raw[layout["end"] :] == "正文\r\n".encode()
+
+
+    @pytest.mark.parametrize("writer", ["update", "migrate", "archive"])
+    def test_symlink_and_mode_preserved(self, tmp_path, writer):
+        """符号链接的 context.md 仍是链接并改写其指向的文件；0600 权限保持不变"""
+        import stat
+
+        from scripts import context_manager as cm
+
+        real = tmp_path / "dotfiles" / "context.md"
+        real.parent.mkdir()
+        original = (
+            "---\nproject: demo\nstatus: active\n---\n\n## 📝 会话记录\n\n"
+            "### 2024-01-01 (会话 #1)\n旧\n\n### 2026-01-01 (会话 #2)\n新\n"
+        )
+        real.write_text(original, encoding="utf-8")
+        real.chmod(0o600)
+        link = tmp_path / ".claude" / "context.md"
+        link.parent.mkdir()
+        link.symlink_to(real)
+
+        if writer == "update":
+            cm.edit_frontmatter(link, {"status": "paused"})
+        elif writer == "migrate":
+            cm.migrate_context(link)
+        else:
+            assert len(cm.archive_sessions(link, keep=1)) == 1
+
+        assert link.is_symlink() and link.resolve() == real
+        assert real.read_text(encoding="utf-8") != original
+        assert stat.S_IMODE(real.stat().st_mode) == 0o600
+        assert not list(real.parent.glob("*.tmp"))
+
+
+class TestMultiFieldUpdate:
+    """测试一次更新多个字段"""
+
+    def test_parse_update_args(self):
+        """旧写法、多字段写法和错误输入"""
+        from scripts.context_manager import parse_update_args
+
+        assert parse_update_args(["status", "paused"]) == {"status": "paused"}
+        assert parse_update_args(["brief", "a=b"]) == {"brief": "a=b"}
+        assert parse_update_args(["status=paused", "current_focus=x = y", "next_steps="]) == {
+            "status": "paused",
+            "current_focus": "x = y",
+            "next_steps": "",
+        }
+        for tokens in (["status"], ["status=paused", "branch"], ["owner=me"], ["owner", "me"]):
+            with pytest.raises(ValueError):
+                parse_update_args(tokens)
+
+    def test_single_write_and_single_bump(self, tmp_path, monkeypatch, capsys):
+        """多个字段一次写入，session_count 只增加一次；出错时不修改文件"""
+        import argparse
+
+        from scripts import context_manager as cm
+
+        (tmp_path / ".claude").mkdir()
+        context_file = tmp_path / ".claude" / "context.md"
+        context_file.write_text(cm._get_project_template("demo", "2024-01-01"), encoding="utf-8")
+        monkeypatch.chdir(tmp_path)
+
+        replaced = []
+        real_replace = os.replace
+        monkeypatch.setattr(
+            cm.os, "replace", lambda src, dst: (replaced.append(dst), real_replace(src, dst))
+        )
+        cm.cmd_update(
+            argparse.Namespace(
+                assignments=["status=paused", "current_focus=收尾", "next_steps=发布"],
+                fsync=True,
+            )
+        )
+        assert replaced == [context_file]
+        info = cm.parse_context(context_file.read_text(encoding="utf-8"))
+        assert info["status"].split()[0] == "paused"
+        assert (info["current_focus"], info["next_steps"]) == ("收尾", "发布")
+        assert info["session_count"] == 2
+        assert list(tmp_path.joinpath(".claude").glob("*.tmp")) == []
+
+        before = context_file.read_bytes()
+        cm.cmd_update(argparse.Namespace(assignments=["status=active", "owner=me"], fsync=False))
+        assert "不支持的字段: owner" in capsys.readouterr().out
+        assert context_file.read_bytes() == before
+
+
+class TestBulkUpdate:
+    """测试 ctx update --all 批量更新"""
+
+    def test_where_conditions(self):
+        """条件解析与匹配（行尾注释不参与比较，整数按数值比较）"""
+        from scripts.context_manager import match_where, parse_where
+
+        info = {
+            "status": "active   # active | paused",
+            "last_session": "2026-07-01",
+            "session_count": 9,
+        }
+        assert match_where(info, parse_where(["status=active", "last_session<2026-08-01"]))
+        assert match_where(info, parse_where(["session_count < 10", "category!=产品"]))
+        assert not match_where(info, parse_where(["session_count>=10"]))
+        for condition in ("status", "owner=me", "status~active"):
+            with pytest.raises(ValueError):
+                parse_where([condition])
+
+    def test_bulk_update(self, temp_workspace, monkeypatch, capsys):
+        """按条件并发写入、dry-run 不修改文件、失败单独统计"""
+        import argparse
+
+        from scripts.context_manager import cmd_update
+
+        monkeypatch.chdir(temp_workspace)
+        monkeypatch.setenv("CTX_NO_INDEX", "1")
+        legacy = temp_workspace / "project-3" / ".claude"
+        legacy.mkdir(parents=True)
+        (legacy / "context.md").write_text("# 旧格式\n\n## 当前状态\n- 状态: paused\n")
+
+        def run(*where, dry_run=False):
+            args = argparse.Namespace(
+                assignments=["category=归档"],
+                fsync=False,
+                all=True,
+                where=list(where),
+                dry_run=dry_run,
+                jobs=4,
+            )
+            cmd_update(args)
+
+        before = {p: p.read_bytes() for p in temp_workspace.glob("*/.claude/context.md")}
+        run("status!=active", dry_run=True)
+        out = capsys.readouterr().out
+        assert "🔍 project-1  category: 测试 → 归档" in out
+        assert "将更新 3 个项目 | 跳过 1 个 | 失败 0 个" in out
+        assert {p: p.read_bytes() for p in before} == before
+
+        with pytest.raises(SystemExit):
+            run("status!=active")
+        out = capsys.readouterr().out
+        assert "已更新 2 个项目 | 跳过 1 个 | 失败 1 个" in out
+        assert "❌ project-3:" in out
+        for i, expected in ((0, "测试"), (1, "归档"), (2, "归档")):
+            content = (temp_workspace / f"project-{i}" / ".claude" / "context.md").read_text()
+            assert f"category: {expected}\n" in content
+            assert f"session_count: {i + 1}\n" in content
+
+        run("session_count>=2")
+        assert "已更新 0 个项目 | 跳过 4 个" in capsys.readouterr().out
+
+
+class TestMigrateAll:
+    """测试 ctx migrate --all"""
+
+    @pytest.fixture
+    def legacy_workspace(self, tmp_path, monkeypatch):
+        from scripts.context_manager import _get_project_template
+
+        workspace = tmp_path / "workspace"
+        for i in range(4):
+            claude_dir = workspace / f"project-{i}" / ".claude"
+            claude_dir.mkdir(parents=True)
+            content = f"# project-{i}\n\n## 待办事项\n- [ ] 任务 {i}\n\n## 会话记录\n### 2024-01-0{i + 1}\n"
+            if i == 3:
+                content = _get_project_template("project-3", "2024-01-01")
+            (claude_dir / "context.md").write_text(content, encoding="utf-8")
+        monkeypatch.chdir(workspace)
+        monkeypatch.setenv("CTX_NO_INDEX", "1")
+        return workspace
+
+    def test_dry_run_prints_diff(self, legacy_workspace, capsys):
+        """--dry-run 输出 unified diff，不修改文件"""
+        import argparse
+
+        from scripts.context_manager import cmd_migrate
+
+        before = {p: p.read_bytes() for p in legacy_workspace.glob("*/.claude/context.md")}
+        cmd_migrate(argparse.Namespace(all=True, dry_run=True, jobs=2))
+        out = capsys.readouterr().out
+
+        assert "--- a/project-0/.claude/context.md\n+++ b/project-0/.claude/context.md\n" in out
+        assert "+status: active" in out
+        assert "project-3/.claude" not in out
+        assert "将迁移 3 个文件 | 已是融合版 1 个 | 失败 0 个" in out
+        assert {p: p.read_bytes() for p in before} == before
+
+    def test_parallel_migrate(self, legacy_workspace, capsys):
+        """并发迁移、报告进度，迁移结果不会被再次迁移"""
+        from scripts.context_manager import migrate_all, needs_migration, parse_context_file
+
+        calls = []
+        result = migrate_all(jobs=4, progress=lambda done, total: calls.append((done, total)))
+
+        migrated = [path for path, _, _ in result["migrated"]]
+        assert migrated == ["project-0", "project-1", "project-2"]
+        assert (result["current"], result["failed"]) == (1, [])
+        assert sorted(calls) == [(1, 3), (2, 3), (3, 3)]
+        for i in range(3):
+            context_file = legacy_workspace / f"project-{i}" / ".claude" / "context.md"
+            info = parse_context_file(context_file)
+            assert not needs_migration(info)
+            assert info["todos"] == [f"任务 {i}"]
+            assert context_file.read_text(encoding="utf-8").endswith(f"### 2024-01-0{i + 1}\n")
+        assert list(legacy_workspace.glob("*/.claude/*.tmp")) == []
+
+        assert migrate_all(jobs=4)["migrated"] == []
+
+
+class TestProfile:
+    """测试 --profile / CTX_PROFILE 剖析模式"""
+
+    def test_extract_profile_args(self, monkeypatch):
+        """--profile 可出现在任意位置，环境变量作为默认值"""
+        from scripts.context_manager import _extract_profile_args
+
+        monkeypatch.delenv("CTX_PROFILE", raising=False)
+        monkeypatch.delenv("CTX_PROFILE_MEMORY", raising=False)
+        assert _extract_profile_args(["ls", "--jobs", "4"]) == (["ls", "--jobs", "4"], None, False)
+        assert _extract_profile_args(["ls", "--profile"]) == (["ls"], "1", False)
+        args = ["--profile=a.pstats", "status"]
+        assert _extract_profile_args(args) == (["status"], "a.pstats", False)
+        assert _extract_profile_args(["--profile-memory"]) == ([], "1", True)
+        monkeypatch.setenv("CTX_PROFILE", "b.pstats")
+        assert _extract_profile_args(["ls", "--profile"]) == (["ls"], "b.pstats", False)
+
+    def test_phase_report(self, temp_workspace, monkeypatch, capsys):
+        """ctx ls --profile 在 stderr 输出各阶段耗时和文件数，stdout 不受影响"""
+        from scripts import context_manager as cm
+
+        monkeypatch.chdir(temp_workspace)
+        monkeypatch.setenv("CTX_NO_DAEMON", "1")
+        monkeypatch.delenv("CTX_PROFILE", raising=False)
+        monkeypatch.setattr(cm.sys, "argv", ["ctx", "ls", "--profile"])
+        cm.main()
+        captured = capsys.readouterr()
+
+        assert "project-0" in captured.out and "剖析" not in captured.out
+        for line in ("discover", "index", "stat", "read", "parse", "render", "other"):
+            assert f"\n   {line}" in captured.err
+        assert "3 个文件" in captured.err
+        assert cm._PROFILE is None
+
+    def test_pstats_and_memory(self, temp_workspace, tmp_path, monkeypatch, capsys):
+        """CTX_PROFILE=<文件> 保存 cProfile 结果，--profile-memory 输出内存峰值"""
+        import pstats
+
+        from scripts import context_manager as cm
+
+        stats_file = tmp_path / "ctx.pstats"
+        monkeypatch.chdir(temp_workspace / "project-0")
+        monkeypatch.setenv("CTX_NO_CACHE", "1")
+        monkeypatch.setenv("CTX_PROFILE", str(stats_file))
+        monkeypatch.setattr(cm.sys, "argv", ["ctx", "status", "--profile-memory"])
+        cm.main()
+        err = capsys.readouterr().err
+
+        assert "内存峰值" in err and str(stats_file) in err
+        functions = {func for _, _, func in pstats.Stats(str(stats_file)).stats}
+        assert "parse_context_file" in functions
+
+
+class TestTelemetry:
+    """测试本地 JSONL 遥测"""
+
+    def test_records_invocations(self, temp_workspace, tmp_path, monkeypatch, capsys):
+        """每次调用追加一条记录：命令、耗时、项目数、缓存命中、最大文件"""
+        import json
+
+        from scripts import context_manager as cm
+
+        telemetry_file = tmp_path / "telemetry.jsonl"
+        monkeypatch.chdir(temp_workspace)
+        monkeypatch.setenv("CTX_NO_DAEMON", "1")
+        monkeypatch.setenv("CTX_TELEMETRY", "1")
+        monkeypatch.setenv("CTX_TELEMETRY_FILE", str(telemetry_file))
+        for argv in (["ls"], ["ls"], ["update", "owner=me"], ["telemetry"]):
+            monkeypatch.setattr(cm.sys, "argv", ["ctx", *argv])
+            cm.main()
+        capsys.readouterr()
+
+        records = [json.loads(line) for line in telemetry_file.read_text().splitlines()]
+        assert [r["cmd"] for r in records] == ["ls", "ls", "update"]
+        cold, warm = records[0], records[1]
+        assert (cold["projects"], cold["cache_hits"], cold["cache_misses"]) == (3, 0, 3)
+        assert (warm["cache_hits"], warm["cache_misses"]) == (3, 0)
+        largest = max(p.stat().st_size for p in temp_workspace.glob("*/.claude/context.md"))
+        assert cold["max_bytes"] == largest
+        assert cold["exit"] == 0 and cold["ms"] > 0 and cold["workspace"] == str(temp_workspace)
+        assert cm._TELEMETRY is None
+
+    def test_rotation(self, tmp_path, monkeypatch):
+        """超过大小上限时轮转，只保留 TELEMETRY_BACKUPS 个旧文件，读取时按从旧到新的顺序"""
+        from scripts.context_manager import TELEMETRY_BACKUPS, append_telemetry, load_telemetry
+
+        path = tmp_path / "telemetry.jsonl"
+        monkeypatch.setenv("CTX_TELEMETRY_MAX_BYTES", "60")
+        for n in range(10):
+            append_telemetry(path, {"cmd": "ls", "ms": float(n)})
+        with path.with_name("telemetry.jsonl.1").open("a") as fh:
+            fh.write("{broken\n")
+
+        assert sorted(p.name for p in tmp_path.iterdir()) == [
+            "telemetry.jsonl",
+            *(f"telemetry.jsonl.{n}" for n in range(1, TELEMETRY_BACKUPS + 1)),
+        ]
+        assert all(p.stat().st_size < 100 for p in tmp_path.iterdir())
+        latencies = [r["ms"] for r in load_telemetry(path)]
+        assert latencies == sorted(latencies) and latencies[-1] == 9.0
+
+    def test_summary_percentiles(self):
+        """按命令分组计算最近秩百分位数，按 p95 降序"""
+        from scripts.context_manager import summarize_telemetry
+
+        records = [{"cmd": "ls", "ms": float(ms), "projects": 5} for ms in range(100, 0, -1)]
+        records.append({"cmd": "status", "ms": 500.0, "cache_hits": 1, "cache_misses": 3})
+        rows = summarize_telemetry(records)
+
+        assert [row["key"] for row in rows] == ["status", "ls"]
+        assert (rows[1]["p50"], rows[1]["p95"], rows[1]["p99"]) == (50.0, 95.0, 99.0)
+        assert (rows[1]["count"], rows[1]["projects"], rows[1]["hit_rate"]) == (100, 5, None)
+        assert rows[0]["hit_rate"] == 0.25
+
+
+class TestSearch:
+    """测试全文搜索索引"""
+
+    def _write(self, workspace, name, body):
+        context_file = workspace / name / ".claude" / "context.md"
+        context_file.write_text(context_file.read_text() + body, encoding="utf-8")
+
+    def test_tokenize(self):
+        """ASCII 单词转小写，CJK 串切成二字组，单字保留"""
+        from scripts.context_manager import tokenize
+
+        assert tokenize("Fix the Daemon 缓存失效, 焦 v2") == [
+            "fix", "the", "daemon", "缓存", "存失", "失效", "焦", "v2",
+        ]  # fmt: skip
+
+    def test_finds_session_unit(self, temp_workspace):
+        """命中会话记录时返回会话标题作为章节名，frontmatter 注释不参与索引"""
+        from scripts.context_manager import (
+            open_search_index,
+            refresh_search_index,
+            search_index,
+            search_snippet,
+        )
+
+        self._write(
+            temp_workspace,
+            "project-1",
+            "\n## 📝 会话记录\n\n### 2024-02-01 - 排查\n\n- 修复守护进程的缓存失效问题\n",
+        )
+        conn = open_search_index(temp_workspace)
+        try:
+            assert refresh_search_index(conn, temp_workspace)["indexed"] == 3
+            hits = search_index(conn, "缓存失效")
+            assert [hit["path"] for hit in hits] == ["project-1"]
+            assert hits[0]["section"] == "2024-02-01 - 排查"
+            assert "缓存失效" in search_snippet(hits[0]["text"], hits[0]["terms"])
+            assert search_index(conn, "paused active")[0]["section"] == "frontmatter"
+        finally:
+            conn.close()
+
+    def test_incremental_refresh(self, temp_workspace):
+        """只重新索引改动过的文件，删除的项目从索引中移除"""
+        import shutil
+
+        from scripts.context_manager import open_search_index, refresh_search_index, search_index
+
+        conn = open_search_index(temp_workspace)
+        try:
+            refresh_search_index(conn, temp_workspace)
+            assert refresh_search_index(conn, temp_workspace) == {
+                "indexed": 0,
+                "unchanged": 3,
+                "removed": 0,
+            }
+
+            self._write(temp_workspace, "project-0", "\n## 笔记\n\nzebra\n")
+            shutil.rmtree(temp_workspace / "project-2")
+            assert refresh_search_index(conn, temp_workspace) == {
+                "indexed": 1,
+                "unchanged": 1,
+                "removed": 1,
+            }
+            assert [hit["section"] for hit in search_index(conn, "zebra")] == ["笔记"]
+            assert all(hit["path"] != "project-2" for hit in search_index(conn, "project"))
+        finally:
+            conn.close()
+
+    def test_bm25_ranking(self, temp_workspace):
+        """出现次数更多的单元排在前面；稀有词的权重高于常见词"""
+        from scripts.context_manager import open_search_index, refresh_search_index, search_index
+
+        self._write(temp_workspace, "project-0", "\n## 笔记\n\nkafka\n")
+        self._write(temp_workspace, "project-1", "\n## 笔记\n\nkafka kafka kafka\n")
+        self._write(temp_workspace, "project-2", "\n## 笔记\n\nredis kafka\n")
+        conn = open_search_index(temp_workspace)
+        try:
+            refresh_search_index(conn, temp_workspace)
+            assert [hit["path"] for hit in search_index(conn, "kafka")][0] == "project-1"
+            assert search_index(conn, "kafka redis")[0]["path"] == "project-2"
+            assert len(search_index(conn, "kafka", limit=2)) == 2
+        finally:
+            conn.close()
+
+
+    def test_cmd_search_trusts_index(self, temp_workspace, monkeypatch, capsys):
+        """索引未过期时不扫描工作区；没有结果或命中的文件已改动时才刷新"""
+        import argparse
+
+        from scripts import context_manager as cm
+
+        monkeypatch.chdir(temp_workspace)
+
+        def search(*terms, **kwargs):
+            args = argparse.Namespace(terms=list(terms), limit=10, rebuild=False, **kwargs)
+            cm.cmd_search(args)
+            return capsys.readouterr().out
+
+        assert "project-0" in search("project")
+        discover = cm.discover_projects
+        scans = []
+        monkeypatch.setattr(
+            cm, "discover_projects", lambda *a, **k: scans.append(1) or discover(*a, **k)
+        )
+        assert "project-1" in search("project")
+        assert scans == []
+
+        self._write(temp_workspace, "project-2", "\n## 笔记\n\nzebra\n")
+        assert "project-2" in search("zebra")
+        assert len(scans) == 1
+
+        context_file = temp_workspace / "project-2" / ".claude" / "context.md"
+        context_file.write_text(context_file.read_text().replace("zebra", "okapi"))
+        assert "没有找到" in search("zebra")
+        assert len(scans) == 2
+        search("project", refresh=True)
+        assert len(scans) == 3
+
+        conn = cm.open_search_index(temp_workspace)
+        try:
+            stored = dict(conn.execute("SELECT term, df FROM terms WHERE df > 0"))
+            counted = dict(conn.execute("SELECT term, COUNT(*) FROM postings GROUP BY term"))
+        finally:
+            conn.close()
+        assert stored == counted
+
+
+class TestTodos:
+    """测试跨项目待办汇总"""
+
+    CONTENT = """---
+project: alpha
+status: active
+last_session: 2026-10-01
+---
+
+## 📋 待办事项
+
+- [ ] 无优先级项
+
+### P0 [本周]
+- [ ] 修复 kafka 延迟，这是一条超过六十个字符的很长很长很长很长很长很长很长很长很长很长很长很长的待办
+- [x] 已完成的
+
+### P1 [本月]
+- [ ] 写文档
+
+## 📝 会话记录
+
+### 2026-10-01
+- [ ] 会话中的复选框不是待办
+"""
+
+    def test_parse_todos(self):
+        """结构化记录：优先级、完整文本、行号、完成状态；只收集待办区"""
+        import io
+
+        from scripts.context_manager import parse_todos
+
+        todos = parse_todos(io.StringIO(self.CONTENT))
+        assert [(t["priority"], t["line"], t["done"]) for t in todos] == [
+            ("", 9, False),
+            ("P0", 12, False),
+            ("P0", 13, True),
+            ("P1", 16, False),
+        ]
+        assert todos[1]["text"].endswith("的待办")
+        lines = self.CONTENT.split("\n")
+        assert all(t["text"] in lines[t["line"] - 1] for t in todos)
+
+    def test_index_skips_unchanged_files(self, temp_workspace, monkeypatch):
+        """第二次汇总只 stat，不重新解析；修改或删除项目后索引随之更新"""
+        import json
+        import shutil
+
+        from scripts import context_manager as cm
+
+        monkeypatch.chdir(temp_workspace)
+        (temp_workspace / "project-0" / ".claude" / "context.md").write_text(self.CONTENT)
+        parsed = []
+        original = cm.parse_todos
+        monkeypatch.setattr(cm, "parse_todos", lambda fh: parsed.append(1) or original(fh))
+
+        assert len(cm.load_todos()) == 4
+        assert len(parsed) == 3
+        assert len(cm.load_todos()) == 4
+        assert len(parsed) == 3
+
+        shutil.rmtree(temp_workspace / "project-0")
+        (temp_workspace / "project-1" / ".claude" / "context.md").write_text(
+            "---\nproject: beta\nstatus: active\n---\n\n## 待办\n- [ ] beta\n"
+        )
+        todos = cm.load_todos()
+        assert [(t["project"], t["text"]) for t in todos] == [("beta", "beta")]
+        assert len(parsed) == 4
+        index = json.loads(cm.get_todos_index_file(temp_workspace).read_text())
+        assert sorted(index["entries"]) == ["project-1", "project-2"]
+
+    def test_status_and_prompt_match_todos(self, temp_workspace, monkeypatch, capsys):
+        """ctx status、--format=shell 和提示符的待办数与 ctx todos 一致（只计未完成项）"""
+        from scripts import context_manager as cm
+
+        project = temp_workspace / "project-0"
+        context_file = project / ".claude" / "context.md"
+        context_file.write_text(self.CONTENT, encoding="utf-8")
+        monkeypatch.chdir(project)
+        expected = sum(t["path"] == "project-0" for t in cm.filter_todos(cm.load_todos()))
+        assert expected == 3
+
+        cm.show_status()
+        assert f"待办: {expected} 项" in capsys.readouterr().out
+        shell = cm.format_shell(cm.load_context(context_file)).split("\n")
+        assert [line for line in shell if line.startswith("ctx_todo_count=")] == [
+            f"ctx_todo_count={expected}"
+        ]
+        assert cm.refresh_prompt(project).endswith(f"📋{expected}")
+
+    def test_filters_and_next(self):
+        """按优先级和项目状态筛选；ctx next 只取进行中项目，按优先级和最近工作时间选出前 N 项"""
+        from scripts.context_manager import filter_todos, next_todos
+
+        def todo(path, priority, line, status="active", last="2026-10-01", done=False):
+            return {
+                "project": path,
+                "path": path,
+                "status": status,
+                "last_session": last,
+                "priority": priority,
+                "text": f"{path}:{line}",
+                "line": line,
+                "done": done,
+            }
+
+        todos = [
+            todo("a", "P1", 3),
+            todo("a", "", 1),
+            todo("a", "P0", 5, done=True),
+            todo("b", "P0", 9, last="2026-10-10"),
+            todo("c", "P0", 2, status="paused"),
+            todo("d", "P0", 4),
+        ]
+        assert [t["text"] for t in filter_todos(todos, ["P0"], ["active"])] == ["b:9", "d:4"]
+        assert len(filter_todos(todos, ["p0", "-"], done=True)) == 5
+        assert [t["text"] for t in next_todos(todos, 3)] == ["b:9", "d:4", "a:3"]
+        assert len(next_todos(todos, 10)) == 4
+
+
+class TestFuzzySwitch:
+    """测试 ctx switch 的三字组模糊匹配"""
+
+    @pytest.fixture
+    def workspace(self, tmp_path, monkeypatch):
+        workspace = tmp_path / "workspace"
+        projects = {
+            "podcast-app": ("podcast-app", "播客客户端"),
+            "podcast-web": ("podcast-web", "播客网站"),
+            "audio-engine": ("sonic", "音频引擎"),
+            "clients/acme-portal": ("acme-portal", "请用一句话描述这个项目的目标"),
+        }
+        for path, (project, brief) in projects.items():
+            claude_dir = workspace / path / ".claude"
+            claude_dir.mkdir(parents=True)
+            (claude_dir / "context.md").write_text(
+                f'---\nproject: {project}\nstatus: active\nbrief: "{brief}"\n---\n'
+            )
+        monkeypatch.chdir(workspace)
+        monkeypatch.delenv("CTX_NO_INDEX", raising=False)
+        return workspace
+
+    def test_trigrams(self):
+        """小写、两侧补空格，短名称也有三字组"""
+        from scripts.context_manager import trigrams
+
+        assert trigrams("Ab") == {"  a", " ab", "ab "}
+        assert trigrams("  ") == set()
+
+    def test_resolve(self, workspace):
+        """拼写错误、前缀、project 字段、子目录和 brief 都能匹配；模板 brief 不参与"""
+        from scripts.context_manager import get_trigram_file, resolve_project
+
+        assert resolve_project("podcast-ap", workspace)[0] == "podcast-app"
+        assert resolve_project("Podcast App", workspace)[0] == "podcast-app"
+        assert resolve_project("sonic", workspace)[0] == "audio-engine"
+        assert resolve_project("acme", workspace)[0] == "clients/acme-portal"
+        assert resolve_project("音频", workspace)[0] == "audio-engine"
+        assert resolve_project("描述", workspace) == (None, [])
+        assert get_trigram_file(workspace).exists()
+
+    def test_ambiguous_query_returns_candidates(self, workspace):
+        """得分接近时不自动选择，返回按得分排序的候选"""
+        from scripts.context_manager import resolve_project
+
+        match, ranked = resolve_project("podcast", workspace)
+        assert match is None
+        assert [path for _score, path in ranked] == ["podcast-app", "podcast-web"]
+
+    def test_new_project_refreshes_index(self, workspace):
+        """索引中没有候选时刷新工作区索引，三字组索引随之重建"""
+        from scripts.context_manager import resolve_project
+
+        assert resolve_project("engine", workspace)[0] == "audio-engine"
+        claude_dir = workspace / "billing-service" / ".claude"
+        claude_dir.mkdir(parents=True)
+        (claude_dir / "context.md").write_text("---\nproject: billing-service\n---\n")
+        assert resolve_project("billing", workspace)[0] == "billing-service"
+
+    def test_cmd_switch(self, workspace, capsys):
+        """cmd_switch 对模糊名称给出匹配结果，歧义时列出候选"""
+        import argparse
+
+        from scripts.context_manager import cmd_switch
+
+        cmd_switch(argparse.Namespace(project="acme"))
+        output = capsys.readouterr().out
+        assert "模糊匹配: acme → clients/acme-portal" in output
+        assert "切换到项目: clients/acme-portal" in output
+
+        cmd_switch(argparse.Namespace(project="podcast"))
+        output = capsys.readouterr().out
+        assert "匹配到多个项目" in output
+        assert output.index("podcast-app") < output.index("podcast-web")
+
+
+class TestFrecency:
+    """测试访问频率（frecency）记录"""
+
+    @pytest.fixture(autouse=True)
+    def cache_dir(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+        return tmp_path / "cache" / "ctx"
+
+    def test_score_decays(self, tmp_path):
+        """每次访问 +1，按半衰期衰减；乱序记录按发生时间折算"""
+        from scripts.context_manager import FRECENCY_HALF_LIFE, load_frecency, record_visit
+
+        t0 = 1_700_000_000
+        record_visit(tmp_path / "a", now=t0)
+        record_visit(tmp_path / "a", now=t0 + FRECENCY_HALF_LIFE)
+        record_visit(tmp_path / "b", now=t0 + 2 * FRECENCY_HALF_LIFE)
+        record_visit(tmp_path / "b", now=t0 + FRECENCY_HALF_LIFE)
+
+        scores = load_frecency(now=t0 + 2 * FRECENCY_HALF_LIFE)
+        assert scores[str(tmp_path / "a")] == pytest.approx(0.75)
+        assert scores[str(tmp_path / "b")] == pytest.approx(1.5)
+
+    def test_compaction(self, tmp_path, cache_dir, monkeypatch):
+        """日志超过上限时合并进快照并删除，得分不变；衰减到阈值以下的路径被丢弃"""
+        from scripts import context_manager as cm
+
+        monkeypatch.setattr(cm, "FRECENCY_LOG_MAX_BYTES", 200)
+        t0 = 1_700_000_000
+        now = t0 + 100 * cm.FRECENCY_HALF_LIFE
+        cm.record_visit(tmp_path / "stale", now=t0)
+        for n in range(10):
+            cm.record_visit(tmp_path / "hot", now=now - n)
+
+        before = cm.load_frecency(now=now)
+        assert not (cache_dir / cm.FRECENCY_LOG_NAME).exists()
+        assert sorted(before) == [str(tmp_path / "hot")]
+        assert before[str(tmp_path / "hot")] == pytest.approx(10, rel=1e-3)
+
+        cm.record_visit(tmp_path / "hot", now=now)
+        after = cm.load_frecency(now=now)
+        assert after[str(tmp_path / "hot")] == pytest.approx(11, rel=1e-3)
+        assert (cache_dir / cm.FRECENCY_LOG_NAME).stat().st_size < 200
+
+    def test_failed_compaction_keeps_visits(self, tmp_path, cache_dir, monkeypatch):
+        """快照写入失败时改名的日志被追加回当前日志，访问记录不丢失"""
+        from scripts import context_manager as cm
+
+        monkeypatch.setattr(cm, "FRECENCY_LOG_MAX_BYTES", 100)
+        now = 1_700_000_000
+        for n in range(5):
+            cm.record_visit(tmp_path / "hot", now=now - n)
+
+        def fail(*_args):
+            raise OSError("disk full")
+
+        write_json_atomic = cm._write_json_atomic
+        monkeypatch.setattr(cm, "_write_json_atomic", fail)
+        assert cm.load_frecency(now=now)[str(tmp_path / "hot")] == pytest.approx(5, rel=1e-3)
+        assert sorted(p.name for p in cache_dir.iterdir()) == [cm.FRECENCY_LOG_NAME]
+
+        monkeypatch.setattr(cm, "_write_json_atomic", write_json_atomic)
+        cm.record_visit(tmp_path / "hot", now=now)
+        assert cm.load_frecency(now=now)[str(tmp_path / "hot")] == pytest.approx(6, rel=1e-3)
+
+    def test_symlinked_workspace_merges_visits(self, temp_workspace, tmp_path):
+        """经由符号链接和真实路径记录的访问算作同一个项目"""
+        from scripts.context_manager import rank_recent_projects, record_visit
+
+        link = tmp_path / "link"
+        link.symlink_to(temp_workspace)
+        now = 1_700_000_000
+        record_visit(temp_workspace / "project-0", now=now)
+        record_visit(link / "project-0", now=now)
+
+        assert rank_recent_projects(link, now=now) == [(pytest.approx(2), "project-0")]
+        assert rank_recent_projects(temp_workspace, now=now) == [(pytest.approx(2), "project-0")]
+
+    def test_switch_and_ls_recent(self, temp_workspace, monkeypatch, capsys):
+        """ctx switch 记录访问；不带参数和 ctx ls --recent 按 frecency 排序"""
+        import argparse
+
+        from scripts.context_manager import cmd_ls, cmd_switch
+
+        for name in ("project-2", "project-2", "project-0"):
+            monkeypatch.chdir(temp_workspace)
+            cmd_switch(argparse.Namespace(project=name))
+        monkeypatch.chdir(temp_workspace)
+        capsys.readouterr()
+
+        cmd_switch(argparse.Namespace(project=None))
+        output = capsys.readouterr().out
+        assert "1. project-2" in output and "2. project-0" in output
+        assert "project-1" not in output
+
+        cmd_ls(argparse.Namespace(recent=True))
+        output = capsys.readouterr().out
+        positions = [output.index(f"project-{n}") for n in (2, 0, 1)]
+        assert positions == sorted(positions)
+
+
+class TestGitInfo:
+    """测试不启动 git 进程的分支和提交时间检测"""
+
+    SHA = "a" * 40
+
+    @pytest.fixture(autouse=True)
+    def enable_git(self, monkeypatch):
+        monkeypatch.delenv("CTX_NO_GIT", raising=False)
+
+    def _make_repo(self, project, branch="main", reflog_time=1_700_000_000):
+        git_dir = project / ".git"
+        ref = git_dir / "refs" / "heads" / branch
+        ref.parent.mkdir(parents=True)
+        (git_dir / "HEAD").write_text(f"ref: refs/heads/{branch}\n")
+        ref.write_text(f"{self.SHA}\n")
+        if reflog_time:
+            log = git_dir / "logs" / "refs" / "heads" / branch
+            log.parent.mkdir(parents=True)
+            log.write_text(
+                f"{'0' * 40} {self.SHA} A <a@b> {reflog_time - 100} +0800\tcommit (initial)\n"
+                f"{self.SHA} {self.SHA} A <a@b> {reflog_time} +0800\tcommit: 修复\n"
+            )
+        return git_dir
+
+    def test_branch_and_reflog(self, tmp_path):
+        """HEAD 指向的分支、松散引用和分支 reflog 的最后一条时间"""
+        from scripts.context_manager import read_git_info
+
+        self._make_repo(tmp_path, branch="feature/x")
+        info = read_git_info(tmp_path)
+        assert (info["branch"], info["detached"], info["commit"]) == ("feature/x", False, self.SHA)
+        assert info["last_commit"] == 1_700_000_000
+        assert read_git_info(tmp_path / "missing") is None
+
+    def test_packed_refs_and_loose_object(self, tmp_path):
+        """分支只在 packed-refs 中、没有 reflog 时，从松散提交对象读取提交时间"""
+        import zlib
+
+        from scripts.context_manager import read_git_info
+
+        git_dir = self._make_repo(tmp_path, reflog_time=None)
+        (git_dir / "refs" / "heads" / "main").unlink()
+        (git_dir / "packed-refs").write_text(f"# pack-refs\n{self.SHA} refs/heads/main\n")
+        body = b"tree %s\nauthor A <a@b> 1 +0000\ncommitter A <a@b> 1234567890 +0000\n" % (
+            b"b" * 40
+        )
+        obj = git_dir / "objects" / self.SHA[:2] / self.SHA[2:]
+        obj.parent.mkdir(parents=True)
+        obj.write_bytes(zlib.compress(b"commit %d\0" % len(body) + body))
+
+        info = read_git_info(tmp_path)
+        assert (info["commit"], info["last_commit"]) == (self.SHA, 1234567890)
+
+    def test_worktree_and_detached(self, tmp_path):
+        """.git 文件（gitdir:）跳转到 worktree 目录，分支引用从 commondir 读取；分离 HEAD 显示短哈希"""
+        from scripts.context_manager import read_git_info
+
+        main_git = self._make_repo(tmp_path / "main")
+        worktree_git = main_git / "worktrees" / "wt"
+        worktree_git.mkdir(parents=True)
+        (worktree_git / "commondir").write_text("../..\n")
+        (worktree_git / "HEAD").write_text("ref: refs/heads/main\n")
+        (tmp_path / "wt").mkdir()
+        (tmp_path / "wt" / ".git").write_text(f"gitdir: {worktree_git}\n")
+
+        info = read_git_info(tmp_path / "wt")
+        assert (info["branch"], info["commit"]) == ("main", self.SHA)
+        assert info["last_commit"] == 1_700_000_000
+
+        (worktree_git / "HEAD").write_text(f"{self.SHA}\n")
+        info = read_git_info(tmp_path / "wt")
+        assert (info["branch"], info["detached"]) == (self.SHA[:7], True)
+
+    def test_cache_and_ls(self, temp_workspace, monkeypatch, capsys):
+        """ctx ls 显示实时分支；文件未变化时使用缓存，切换分支后失效；--sync-branch 写回"""
+        import argparse
+
+        from scripts import context_manager as cm
+
+        monkeypatch.chdir(temp_workspace)
+        monkeypatch.setenv("CTX_NO_DAEMON", "1")
+        git_dir = self._make_repo(temp_workspace / "project-0")
+        calls = []
+        original = cm.read_git_info
+        monkeypatch.setattr(cm, "read_git_info", lambda p: calls.append(p) or original(p))
+
+        cm.cmd_ls(argparse.Namespace())
+        assert "⎇ main" in capsys.readouterr().out
+        assert len(calls) == 3
+        cm.cmd_ls(argparse.Namespace())
+        assert len(calls) == 3
+
+        (git_dir / "refs" / "heads" / "dev").write_text(f"{self.SHA}\n")
+        (git_dir / "HEAD").write_text("ref: refs/heads/dev\n")
+        os.utime(git_dir / "HEAD", ns=(1, 1))
+        cm.cmd_ls(argparse.Namespace(sync_branch=True))
+        assert "⎇ dev" in capsys.readouterr().out
+        assert len(calls) == 4
+        context = (temp_workspace / "project-0" / ".claude" / "context.md").read_text()
+        assert "branch: dev" in context
+
+    def test_project_outside_workspace_skips_cache(self, tmp_path, isolate_home):
+        """工作区外的项目照常检测分支，但不在工作区写入缓存"""
+        from scripts.context_manager import get_git_cache_file, project_git_info
+
+        workspace = isolate_home / "workspace"
+        workspace.mkdir()
+        self._make_repo(tmp_path / "elsewhere", branch="dev")
+        context_file = tmp_path / "elsewhere" / ".claude" / "context.md"
+
+        info = project_git_info({"branch": "main"}, context_file, workspace)
+        assert info["branch"] == "dev"
+        assert not get_git_cache_file(workspace).exists()